@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from corsheaders.defaults import default_headers
-from mongoengine import connect
 import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # sampled per-request SQL/Mongo/render timings (see REQUEST_METRICS below)
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,13 +92,24 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', '@@2017@@'),
         'HOST': os.getenv('DB_HOST', '127.0.0.1'),  # 'mysql' in Docker
         'PORT': os.getenv('DB_PORT', '3306'),
-        'OPTIONS': {
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-            'charset': 'utf8mb4',
-        }
+        # seconds a connection stays open across requests; 0 (Django's
+        # default) closes it after each request. Only the gunicorn gthread
+        # profile raises it (DB_CONN_MAX_AGE in docker-compose.yml): under
+        # ASGI every thread of the sync-to-async pool would keep its own.
+        # Reused connections are checked first, so one dropped by the server
+        # is replaced instead of failing the request.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
     }
 }
 
+# MySQL-only connection options (SQLite rejects them, e.g. for local benchmarks)
+if DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+        'charset': 'utf8mb4',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -141,14 +153,77 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# ============================================================================
+# CACHES
+# ============================================================================
+# "membership" holds the (team, user) -> role lookups from api/membership_cache.py.
+# "credentials" holds verified Basic auth credentials (HMACs, no passwords) from
+# api/auth.py; its TIMEOUT is how long a password is trusted without rehashing.
+# "responses" holds versioned team payloads from api/response_cache.py.
+#
+# Every alias defaults to LocMemCache, which is private to one process: with
+# more than one worker, point them at a shared server, e.g.
+# <PREFIX>_BACKEND=django.core.cache.backends.redis.RedisCache and
+# <PREFIX>_LOCATION=redis://redis:6379/1 (the production compose profile does).
+# MAX_ENTRIES only applies to LocMemCache and FileBasedCache, which cull
+# themselves; Redis and Memcached evict on their own.
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CULLED_CACHES = {LOCMEM_CACHE, 'django.core.cache.backends.filebased.FileBasedCache'}
+
+
+def cache_setting(prefix, location, timeout=None, max_entries=None):
+    """CACHES entry configured by the <prefix>_BACKEND/_LOCATION/_TTL/_MAX_ENTRIES variables"""
+    backend = os.getenv(f'{prefix}_BACKEND', LOCMEM_CACHE)
+    config = {'BACKEND': backend, 'LOCATION': os.getenv(f'{prefix}_LOCATION', location)}
+    if timeout is not None:
+        config['TIMEOUT'] = int(os.getenv(f'{prefix}_TTL', str(timeout)))
+    if max_entries is not None and backend in CULLED_CACHES:
+        config['OPTIONS'] = {
+            'MAX_ENTRIES': int(os.getenv(f'{prefix}_MAX_ENTRIES', str(max_entries))),
+        }
+    return config
+
+
+CACHES = {
+    'default': cache_setting('CACHE', 'default'),
+    'membership': cache_setting('MEMBERSHIP_CACHE', 'team-membership', timeout=300, max_entries=10000),
+    'credentials': cache_setting('CREDENTIALS_CACHE', 'basic-credentials', timeout=60, max_entries=10000),
+    # e.g. RESPONSE_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+    # with RESPONSE_CACHE_LOCATION=/var/tmp/task-responses for one host
+    'responses': cache_setting('RESPONSE_CACHE', 'team-responses', timeout=600, max_entries=5000),
+}
+MEMBERSHIP_CACHE_ALIAS = 'membership'
+CREDENTIALS_CACHE_ALIAS = 'credentials'
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'api.auth.ClaimsJWTAuthentication',
+        'api.auth.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ]
 }
 
+# ============================================================================
+# JWT CLAIMS AUTHENTICATION (api/auth.py)
+# ============================================================================
+# Access tokens carry the user's name, flags and team roles; a request with an
+# up-to-date token is authenticated without a User or membership query.
+# VERSION_TTL: seconds a worker trusts its cached token version of a user; a
+#   change to the user or their teams made in another worker is noticed at
+#   most this late (in the same worker at once)
+# MAX_TEAMS: members of more teams get tokens without roles (looked up instead)
+CLAIMS_AUTH = {
+    'VERSION_TTL': float(os.getenv('CLAIMS_AUTH_VERSION_TTL', '30')),
+    'MAX_TEAMS': int(os.getenv('CLAIMS_AUTH_MAX_TEAMS', '100')),
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'api.auth.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.auth.ClaimsTokenRefreshSerializer',
+}
+
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -173,5 +248,133 @@ MONGO_URI = os.getenv(
 )
 MONGO_DB = os.getenv('MONGO_DB', 'logs_db')
 
-# Connect to MongoDB Atlas using MongoEngine
-connect(db=MONGO_DB, host=MONGO_URI, alias='default')
+# The connection is opened lazily on the first log read or write
+# (api/logs/connection.py), not here, so booting never waits on MongoDB.
+# MAX_POOL_SIZE / MIN_POOL_SIZE: connections per process
+# CONNECT_TIMEOUT_MS: TCP connect timeout
+# SERVER_SELECTION_TIMEOUT_MS: how long an operation waits for a reachable
+#   server before failing
+# SOCKET_TIMEOUT_MS: how long a single command may take
+MONGO = {
+    'MAX_POOL_SIZE': int(os.getenv('MONGO_MAX_POOL_SIZE', '100')),
+    'MIN_POOL_SIZE': int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+    'CONNECT_TIMEOUT_MS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    'SERVER_SELECTION_TIMEOUT_MS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    'SOCKET_TIMEOUT_MS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '10000')),
+}
+
+# ============================================================================
+# ACTIVITY LOG STORAGE (api/logs/backends/)
+# ============================================================================
+# ENGINE: api.logs.backends.mongo.MongoLogBackend (MongoDB, see MONGO above)
+#   or api.logs.backends.local.FileLogBackend (files on local disk, no
+#   external service: edge deployments, CI)
+# FileLogBackend OPTIONS:
+#   PATH - directory of the segment files, shared by all workers of a host
+#   MAX_SEGMENT_BYTES - size at which a new segment file is started
+#   INDEX_INTERVAL_BYTES - bytes per sparse index entry (smaller: faster
+#     time-range reads, larger index)
+#   FSYNC - fsync every (group) commit; 0 keeps entries in the OS page cache
+#     until it writes them out
+ACTIVITY_LOG_BACKEND = {
+    'ENGINE': os.getenv('ACTIVITY_LOG_BACKEND', 'api.logs.backends.mongo.MongoLogBackend'),
+    'OPTIONS': {
+        'PATH': os.getenv('ACTIVITY_LOG_PATH', str(BASE_DIR / 'activity_logs')),
+        'MAX_SEGMENT_BYTES': int(os.getenv('ACTIVITY_LOG_MAX_SEGMENT_BYTES', str(64 * 1024 * 1024))),
+        'INDEX_INTERVAL_BYTES': int(os.getenv('ACTIVITY_LOG_INDEX_INTERVAL_BYTES', str(64 * 1024))),
+        'FSYNC': os.getenv('ACTIVITY_LOG_FSYNC', '1') == '1',
+    },
+}
+
+# ============================================================================
+# ACTIVITY LOG RETENTION (`archive_activity_logs`, run daily)
+# ============================================================================
+# HOT_DAYS: entries older than this move from the log store to gzipped
+#   partitions under ARCHIVE_PATH; logs/ still lists them
+# TTL_DAYS: the log store drops entries older than this by itself (MongoDB TTL
+#   index), a bound for when archiving does not run; 0 = never. Keep it above
+#   HOT_DAYS or entries expire before they are archived
+# COMPACT_AFTER_DAYS: daily partitions of months older than this are merged
+#   into one file per month
+# ARCHIVE_DAYS: archived partitions older than this are deleted; 0 = never
+ACTIVITY_LOG_RETENTION = {
+    'HOT_DAYS': int(os.getenv('ACTIVITY_LOG_HOT_DAYS', '30')),
+    'TTL_DAYS': int(os.getenv('ACTIVITY_LOG_TTL_DAYS', '45')),
+    'ARCHIVE_PATH': os.getenv('ACTIVITY_LOG_ARCHIVE_PATH', str(BASE_DIR / 'activity_log_archive')),
+    'COMPACT_AFTER_DAYS': int(os.getenv('ACTIVITY_LOG_COMPACT_AFTER_DAYS', '90')),
+    'ARCHIVE_DAYS': int(os.getenv('ACTIVITY_LOG_ARCHIVE_DAYS', '0')),
+}
+
+# ============================================================================
+# ACTIVITY LOG WRITER (batched background writes to the log backend)
+# ============================================================================
+# OVERFLOW_POLICY: what to do when the queue is full
+#   drop_oldest - discard the oldest waiting entry to make room
+#   drop_newest - discard the entry being logged
+#   block       - wait up to BLOCK_TIMEOUT seconds for room, then drop it
+ACTIVITY_LOG_WRITER = {
+    'ASYNC': os.getenv('ACTIVITY_LOG_ASYNC', '1') == '1',
+    'MAX_QUEUE_SIZE': int(os.getenv('ACTIVITY_LOG_MAX_QUEUE_SIZE', '10000')),
+    'BATCH_SIZE': int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', '500')),
+    'FLUSH_INTERVAL': float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', '1.0')),
+    'OVERFLOW_POLICY': os.getenv('ACTIVITY_LOG_OVERFLOW_POLICY', 'drop_oldest'),
+    'BLOCK_TIMEOUT': float(os.getenv('ACTIVITY_LOG_BLOCK_TIMEOUT', '0.5')),
+}
+
+
+# ============================================================================
+# TASK CHANGE FEED (tasks/changes/ delta sync)
+# ============================================================================
+# RETENTION_DAYS: changes older than this are removed by `prune_task_changes`;
+#   older cursors are rejected and the client reloads its lists
+# SETTLE_SECONDS: the cursor does not advance past changes younger than this,
+#   so changes from transactions that commit late are not skipped
+TASK_CHANGES = {
+    'RETENTION_DAYS': int(os.getenv('TASK_CHANGES_RETENTION_DAYS', '30')),
+    'SETTLE_SECONDS': int(os.getenv('TASK_CHANGES_SETTLE_SECONDS', '5')),
+}
+
+
+# ============================================================================
+# LIVE TEAM EVENTS (teams/<id>/events/ Server-Sent Events, ASGI only)
+# ============================================================================
+# ENABLED: set when teams/<id>/events/ is routed to an ASGI worker; without
+#   it no stream tickets are issued and the frontend does not connect
+# HEARTBEAT_SECONDS: idle interval after which a comment line is sent
+# QUEUE_SIZE: events buffered per subscriber before it is dropped with an
+#   "overflow" event
+# TICKET_SECONDS: how long a one-time stream ticket can be redeemed; used
+#   tickets are remembered in the TICKET_CACHE_ALIAS cache, which must be
+#   shared if tickets are redeemed by more than one process
+# CHANNEL_URL: Redis URL of the pub/sub channel that carries events between
+#   processes; required with more than one server process (api/events.py)
+# STREAM_URL: base URL (ending in /api/) of the ASGI server, when the streams
+#   are served from another origin than the rest of the API
+EVENT_STREAM = {
+    'ENABLED': os.getenv('EVENT_STREAM_ENABLED', '0') == '1',
+    'HEARTBEAT_SECONDS': int(os.getenv('EVENT_STREAM_HEARTBEAT_SECONDS', '15')),
+    'QUEUE_SIZE': int(os.getenv('EVENT_STREAM_QUEUE_SIZE', '100')),
+    'TICKET_SECONDS': int(os.getenv('EVENT_STREAM_TICKET_SECONDS', '30')),
+    'TICKET_CACHE_ALIAS': 'default',
+    'CHANNEL_URL': os.getenv('EVENT_STREAM_CHANNEL_URL', ''),
+    'STREAM_URL': os.getenv('EVENT_STREAM_URL', ''),
+}
+
+
+# ============================================================================
+# REQUEST METRICS (api/middleware.py, served at api/metrics/)
+# ============================================================================
+# SAMPLE_RATE: fraction of requests instrumented (0 disables, 1 = all)
+# SERVER_TIMING: add a Server-Timing header to sampled responses
+# TOKEN: bearer token the metrics endpoint requires; without one the
+#   endpoint is only served when DEBUG is on
+# MULTIPROCESS_DIR: directory where each worker process writes a snapshot of
+#   its metrics every SNAPSHOT_SECONDS, so that the endpoint serves the sum
+#   over all workers; empty = each worker serves only its own
+REQUEST_METRICS = {
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', '0')),
+    'SERVER_TIMING': os.getenv('REQUEST_METRICS_SERVER_TIMING', '1') == '1',
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+    'MULTIPROCESS_DIR': os.getenv('METRICS_MULTIPROCESS_DIR', ''),
+    'SNAPSHOT_SECONDS': int(os.getenv('METRICS_SNAPSHOT_SECONDS', '5')),
+}
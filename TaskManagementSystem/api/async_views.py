@@ -0,0 +1,134 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import membership_cache
+from .conditional import add_validators
+from .models import Task, Team, TeamMembership
+from .views import (lookup_team_response, my_team_tasks_data, my_teams_data, store_team_response,
+                    team_details_data, team_members_data, token_user)
+
+# -----------------------------
+# Async read path for the team endpoints
+# -----------------------------
+# Plain async Django views (DRF views are synchronous) returning the same
+# payloads as their sync counterparts in views.py, built by the same
+# functions, for deployments under ASGI: only the queries live here.
+# Authentication is JWT only (Authorization: Bearer ...).
+#
+# Django's async ORM methods (aget, async for, ...) run every query of a
+# request on one shared thread, one after another. Queries that do not
+# depend on each other are instead run with run_query(), each in a worker
+# thread with its own database connection, so they overlap.
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    # DRF's encoder, so dates are formatted exactly like the sync views
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+def error_response(message, status_code):
+    return json_response({"error": message}, status_code)
+
+
+async def run_query(queryset):
+    """Evaluate `queryset` in a worker thread of its own"""
+    def fetch():
+        try:
+            return list(queryset)
+        finally:
+            # worker threads never see request_finished; honour CONN_MAX_AGE here
+            close_old_connections()
+    return await sync_to_async(fetch, thread_sensitive=False)()
+
+
+async def team_for_member(request, team_id):
+    """Return (user, team, role, None) or (None, None, None, error response)"""
+    user = await sync_to_async(token_user)(request)
+    if user is None:
+        return None, None, None, error_response(
+            "Authentication credentials were not provided or are invalid",
+            status.HTTP_401_UNAUTHORIZED)
+    try:
+        team = await Team.objects.aget(id=team_id)  # pylint: disable=no-member
+    except Team.DoesNotExist:  # pylint: disable=no-member
+        return None, None, None, error_response("Team not found", status.HTTP_404_NOT_FOUND)
+
+    role = await sync_to_async(membership_cache.role_of)(user, team.id)
+    if not role:
+        return None, None, None, error_response(
+            "You are not a member of this team", status.HTTP_403_FORBIDDEN)
+    return user, team, role, None
+
+
+async def cached_team_response(request, user, team, endpoint, build):
+    """Async counterpart of views.cached_team_response (same keys and ETags)"""
+    etag, key, entry, cached = await sync_to_async(lookup_team_response)(
+        request, user, team, endpoint)
+    if cached is not None:
+        return cached
+    if entry is None:
+        entry = await sync_to_async(store_team_response)(key, *await build())
+    return add_validators(json_response(entry["data"]), etag, entry["last_modified"])
+
+
+@require_GET
+async def my_teams(request):
+    """Async MyTeamsView.get"""
+    user = await sync_to_async(token_user)(request)
+    if user is None:
+        return error_response("Authentication credentials were not provided or are invalid",
+                              status.HTTP_401_UNAUTHORIZED)
+    teams = Team.objects.filter(memberships__user=user)  # pylint: disable=no-member
+    return json_response(my_teams_data([team async for team in teams]))
+
+
+@require_GET
+async def team_details(request, team_id):
+    """Async get_team_details: members and tasks are fetched concurrently"""
+    user, team, user_role, error = await team_for_member(request, team_id)
+    if error is not None:
+        return error
+
+    async def build():
+        members, team_tasks = await asyncio.gather(
+            run_query(TeamMembership.objects.filter(  # pylint: disable=no-member
+                team=team).select_related('user')),
+            run_query(Task.objects.filter(for_team=team).select_related(  # pylint: disable=no-member
+                'created_by', 'assigned_to').order_by('-created_at')),
+        )
+        return team_details_data(team, user, user_role, members, team_tasks)
+
+    return await cached_team_response(request, user, team, "team-details", build)
+
+
+@require_GET
+async def team_members(request, team_id):
+    """Async get_team_members"""
+    _, team, _, error = await team_for_member(request, team_id)
+    if error is not None:
+        return error
+    members = [membership async for membership in TeamMembership.objects.filter(  # pylint: disable=no-member
+        team=team).select_related('user')]
+    return json_response(team_members_data(team, members))
+
+
+@require_GET
+async def my_team_tasks(request, team_id):
+    """Async get_my_team_tasks"""
+    user, team, _, error = await team_for_member(request, team_id)
+    if error is not None:
+        return error
+
+    async def build():
+        my_tasks = [task async for task in Task.objects.filter(  # pylint: disable=no-member
+            for_team=team, assigned_to=user
+        ).select_related('created_by').order_by('-created_at')]
+        return my_team_tasks_data(team, my_tasks)
+
+    return await cached_team_response(request, user, team, "my-team-tasks", build)
@@ -0,0 +1,225 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import ClaimsUser, Profile, TeamMembership, User
+
+# -----------------------------
+# JWT claims authentication
+# -----------------------------
+# Access tokens issued by api/login/ and api/token/refresh/ carry the user's
+# name, email, staff/superuser flags and team roles, plus the user's token
+# version. A request whose token version matches the current one is
+# authenticated from the claims alone: no User query, and role checks
+# (membership_cache.role_of) read the roles from the token.
+#
+# Any change to the user or their memberships bumps Profile.token_version.
+# Older tokens still work, but they are authenticated the usual way (User
+# query, cached role lookups) until the client refreshes its token. Each
+# worker caches versions for CLAIMS_AUTH['VERSION_TTL'] seconds, so a change
+# made in another worker is noticed at most that late.
+
+VERSION_CLAIM = "ver"
+TEAMS_CLAIM = "teams"
+
+MAX_CACHED_VERSIONS = 10000
+
+# str(user id) -> (token version or None, monotonic time read); the user_id
+# claim may be a string
+_versions = {}
+_versions_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_basic_stats = {"hits": 0, "misses": 0}
+
+
+def _setting(name, default):
+    return getattr(settings, "CLAIMS_AUTH", {}).get(name, default)
+
+
+def _read_version(user_id):
+    return Profile.objects.filter(  # pylint: disable=no-member
+        user_id=user_id).values_list("token_version", flat=True).first()
+
+
+def current_version(user_id):
+    """The user's token version (None without a profile), cached in this process"""
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(str(user_id))
+        if cached is not None and now - cached[1] < _setting("VERSION_TTL", 30):
+            _stats["hits"] += 1
+            return cached[0]
+        _stats["misses"] += 1
+
+    version = _read_version(user_id)
+    with _versions_lock:
+        if len(_versions) >= MAX_CACHED_VERSIONS:
+            _versions.clear()
+        _versions[str(user_id)] = (version, now)
+    return version
+
+
+def forget_version(user_id):
+    with _versions_lock:
+        _versions.pop(str(user_id), None)
+
+
+def bump_token_version(user_id):
+    """Stop trusting the claims of the user's current tokens"""
+    Profile.objects.filter(user_id=user_id).update(  # pylint: disable=no-member
+        token_version=F("token_version") + 1)
+    # after commit, or a concurrent request could cache the old version again
+    transaction.on_commit(lambda: forget_version(user_id))
+
+
+def stats():
+    with _versions_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
+
+
+def add_claims(token, user):
+    # the version is read first: a change made after it bumps the version,
+    # so the token can never carry newer roles under an older version
+    token[VERSION_CLAIM] = _read_version(user.id)
+    token["username"] = user.username
+    token["email"] = user.email
+    token["is_staff"] = user.is_staff
+    token["is_superuser"] = user.is_superuser
+    max_teams = _setting("MAX_TEAMS", 100)
+    roles = list(TeamMembership.objects.filter(  # pylint: disable=no-member
+        user_id=user.id).values_list("team_id", "role_in_team")[:max_teams + 1])
+    # members of too many teams get no roles in the token: they are looked up
+    if len(roles) <= max_teams:
+        token[TEAMS_CLAIM] = {str(team_id): role for team_id, role in roles}
+    elif TEAMS_CLAIM in token:
+        del token[TEAMS_CLAIM]
+    return token
+
+
+def claims_user(token):
+    user = ClaimsUser(
+        # simplejwt stores the id as a string: compared with foreign keys
+        # (task.assigned_to_id, ...) it must be the primary key's type
+        id=User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM]),  # pylint: disable=protected-access
+        username=token["username"],
+        email=token["email"],
+        is_staff=token["is_staff"],
+        is_superuser=token["is_superuser"],
+        is_active=True,
+    )
+    # an existing row, for related lookups (user.profile, ...)
+    user._state.adding = False  # pylint: disable=protected-access
+    user._state.db = DEFAULT_DB_ALIAS  # pylint: disable=protected-access
+    user.team_roles = token.get(TEAMS_CLAIM)
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the claims of up-to-date tokens"""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        version = validated_token.get(VERSION_CLAIM)
+        if user_id is None or version is None or version != current_version(user_id):
+            # no claims (a token from before they were added), or claims
+            # older than a change to the user: load the user
+            return super().get_user(validated_token)
+        return claims_user(validated_token)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # claims of the refresh token are copied into its access tokens
+        return add_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # the claims copied from the refresh token are as old as the login:
+        # read them again, so a refresh picks up new roles and the version
+        access = AccessToken(data["access"])
+        user = User.objects.filter(id=access[api_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            data["access"] = str(add_claims(access, user))
+        return data
+
+
+# -----------------------------
+# Basic authentication credential cache
+# -----------------------------
+# Checking a password runs the password hasher (PBKDF2, hundreds of
+# milliseconds of CPU by design), and Basic clients send their password on
+# every request. Once a password is verified, an HMAC of the credentials
+# (keyed with SECRET_KEY, never the password itself) maps to the user's id
+# and a fingerprint of their username and password hash, for the cache
+# alias TIMEOUT. A cached entry costs one User query instead of a hash.
+# Changing the password or username changes the fingerprint, which ends the
+# entry on its next use; failed attempts are never cached.
+
+
+def _credentials_cache():
+    return caches[getattr(settings, "CREDENTIALS_CACHE_ALIAS", "credentials")]
+
+
+def _credentials_key(userid, password):
+    return "basic-auth:" + salted_hmac("api.auth.credentials", f"{userid}\n{password}").hexdigest()
+
+
+def _fingerprint(user):
+    return salted_hmac("api.auth.fingerprint", f"{user.username}\n{user.password}").hexdigest()
+
+
+def _count_basic(counter):
+    with _versions_lock:
+        _basic_stats[counter] += 1
+
+
+def credentials_stats():
+    with _versions_lock:
+        hits, misses = _basic_stats["hits"], _basic_stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """BasicAuthentication that verifies each password once per cache TIMEOUT"""
+
+    def authenticate_credentials(self, userid, password, request=None):
+        cache = _credentials_cache()
+        key = _credentials_key(userid, password)
+        cached = cache.get(key)
+        if cached is not None:
+            user_id, fingerprint = cached
+            user = User.objects.filter(id=user_id).first()
+            if (user is not None and user.is_active
+                    and constant_time_compare(fingerprint, _fingerprint(user))):
+                _count_basic("hits")
+                return (user, None)
+            cache.delete(key)
+
+        _count_basic("misses")
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache.set(key, (user.id, _fingerprint(user)))
+        return (user, auth)
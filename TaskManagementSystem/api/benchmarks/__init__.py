@@ -0,0 +1 @@
+# Benchmark helpers (synthetic data generation) used by the bench_* management commands
@@ -0,0 +1,184 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..logs.backends import get_backend
+from ..logs.utils import TASK_CREATED, TASK_DELETED, TASK_STATUS_CHANGED, TASK_UPDATED
+from ..models import Profile, Task, Team, TeamMembership
+
+# -----------------------------
+# Synthetic dataset for benchmarks
+# -----------------------------
+# Rows are written with bulk_create (tasks with a plain executemany), which
+# sends no model signals: the create_profile receiver is skipped and profiles
+# are inserted explicitly, and the task counters and search index have to be
+# rebuilt afterwards (api.counters.rebuild_counters, api.search.rebuild_index).
+
+USERNAME_PREFIX = "bench_user_"
+
+# task text is drawn from a small vocabulary with a skewed distribution, so
+# search terms have realistic (Zipf-like) document frequencies
+VERBS = ["fix", "write", "review", "update", "deploy", "test", "design", "refactor",
+         "document", "migrate", "investigate", "plan"]
+NOUNS = ["login", "dashboard", "api", "report", "database", "invoice", "search",
+         "profile", "payment", "notification", "export", "onboarding", "cache",
+         "sidebar", "release", "backup", "permissions", "analytics", "email", "upload"]
+FILLER = ["customer", "mobile", "page", "flow", "error", "slow", "feedback", "ticket",
+          "sprint", "client", "legacy", "timeout", "metrics", "checkout", "settings"]
+
+
+def _insert(model, columns, rows):
+    """INSERT rows of database-ready values without building model instances
+
+    bulk_create spends most of its time compiling each value through the
+    field; for millions of rows a plain executemany is several times faster.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(model._meta.db_table),  # pylint: disable=protected-access
+        ", ".join(quote(model._meta.get_field(column).column)  # pylint: disable=protected-access
+                  for column in columns),
+        ", ".join(["%s"] * len(columns)))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _ids(queryset):
+    # bulk_create does not return primary keys on every backend (MySQL),
+    # so read them back instead
+    return list(queryset.order_by("id").values_list("id", flat=True))
+
+
+def seed_dataset(users=1000, teams=50, members_per_team=20, tasks=100000,
+                 seed=42, batch_size=5000, password=None):
+    """Insert a random but reproducible dataset and return the generated ids
+
+    Every user gets `password` (None: unusable), hashed once and shared, so
+    there is no per-user PBKDF2 cost.
+    """
+    with transaction.atomic():
+        return _seed_dataset(users, teams, members_per_team, tasks,
+                             random.Random(seed), batch_size, make_password(password))
+
+
+def _seed_dataset(users, teams, members_per_team, tasks, rng, batch_size, password):
+
+    User.objects.bulk_create(
+        [User(username=f"{USERNAME_PREFIX}{i}", email=f"{USERNAME_PREFIX}{i}@example.com",
+              password=password) for i in range(users)],
+        batch_size=batch_size)
+    user_ids = _ids(User.objects.filter(username__startswith=USERNAME_PREFIX))
+    Profile.objects.bulk_create(  # pylint: disable=no-member
+        [Profile(user_id=user_id) for user_id in user_ids], batch_size=batch_size)
+
+    Team.objects.bulk_create(  # pylint: disable=no-member
+        [Team(name=f"Bench team {i}") for i in range(teams)], batch_size=batch_size)
+    team_ids = _ids(Team.objects.filter(  # pylint: disable=no-member
+        name__startswith="Bench team "))
+
+    team_members = {}
+    memberships = []
+    for team_id in team_ids:
+        members = rng.sample(user_ids, min(members_per_team, len(user_ids)))
+        team_members[team_id] = members
+        memberships.extend(
+            TeamMembership(team_id=team_id, user_id=user_id,
+                           role_in_team="owner" if position == 0 else "member")
+            for position, user_id in enumerate(members))
+    TeamMembership.objects.bulk_create(  # pylint: disable=no-member
+        memberships, batch_size=batch_size)
+
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+    # a few power users own most of the personal tasks
+    owner_weights = list(accumulate(1 / (rank + 1) for rank in range(len(user_ids))))
+    noun_weights = list(accumulate(1 / (rank + 1) for rank in range(len(NOUNS))))
+    # database-ready values, converted once instead of once per row
+    today = timezone.now().date()
+    due_dates = [connection.ops.adapt_datefield_value(today + timedelta(days=offset))
+                 for offset in range(-60, 61)]
+    # one task a minute, the newest created now; naive UTC as stored, which
+    # skips the timezone conversion in adapt_datetimefield_value
+    first_created = timezone.make_naive(
+        timezone.now() - timedelta(minutes=tasks), dt_timezone.utc)
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    verbs = [verb.capitalize() for verb in VERBS]
+    # descriptions are a noun appended to one of a fixed pool of filler phrases
+    phrases = [" ".join(rng.choices(FILLER, k=rng.randint(0, 12))) for _ in range(1000)]
+
+    columns = ["title", "description", "created_by_id", "assigned_to_id", "for_team_id",
+               "status", "priority", "due_date", "created_at", "updated_at"]
+    for start in range(0, tasks, batch_size):
+        count = min(batch_size, tasks - start)
+        # draw whole columns per batch: one random.choices call per column
+        # instead of one per row
+        nouns = rng.choices(NOUNS, cum_weights=noun_weights, k=count)
+        task_statuses = rng.choices(statuses, weights=[5, 3, 2], k=count)
+        task_priorities = rng.choices(priorities, weights=[3, 5, 2], k=count)
+        owners = rng.choices(user_ids, cum_weights=owner_weights, k=count)
+        rows = []
+        for offset in range(count):
+            i = start + offset
+            if team_ids and rng.random() < 0.6:
+                team_id = rng.choice(team_ids)
+                members = team_members[team_id]
+                owner_id, assignee_id = members[0], rng.choice(members)
+            else:
+                team_id, assignee_id, owner_id = None, None, owners[offset]
+            noun = nouns[offset]
+            created = adapt_datetime(first_created + timedelta(minutes=i + 1))
+            rows.append((
+                f"{rng.choice(verbs)} {noun} {i}",
+                f"{rng.choice(phrases)} {noun}".lstrip(),
+                owner_id,
+                assignee_id,
+                team_id,
+                task_statuses[offset],
+                task_priorities[offset],
+                rng.choice(due_dates),
+                created,
+                created,
+            ))
+        _insert(Task, columns, rows)
+
+    return {
+        "user_ids": user_ids,
+        "team_ids": team_ids,
+        "team_members": team_members,
+    }
+
+
+def seed_activity_logs(usernames, tasks, count=10000, seed=42, batch_size=5000):
+    """Write `count` activity log entries spread over the last 30 days
+
+    tasks: (task id, team id or None) pairs the entries refer to
+    """
+    rng = random.Random(seed)
+    # log entries carry naive UTC timestamps
+    now = datetime.utcnow()
+    actions = [("created task", TASK_CREATED), ("updated task", TASK_UPDATED),
+               ("deleted task", TASK_DELETED), ("updated task status", TASK_STATUS_CHANGED)]
+    backend = get_backend()
+    batch = []
+    for _ in range(count):
+        action, code = rng.choice(actions)
+        task_id, team_id = rng.choice(tasks) if tasks else ("", None)
+        batch.append({
+            "user": rng.choice(usernames),
+            "action": action,
+            "code": code,
+            "task_id": str(task_id),
+            "team_id": str(team_id) if team_id is not None else None,
+            "timestamp": now - timedelta(seconds=rng.randint(0, 30 * 24 * 3600)),
+        })
+        if len(batch) >= batch_size:
+            backend.write(batch)
+            batch = []
+    backend.write(batch)
@@ -0,0 +1,167 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Task, TaskChange, TeamMembership
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# -----------------------------
+# Task change feed (delta sync)
+# -----------------------------
+# Every task write appends TaskChange rows (signals.py). A client keeps the
+# cursor of the last change it applied and asks for everything after it, so
+# a sync costs O(changes) instead of re-reading its task lists.
+#
+# A change is visible to the task's owner and to the members of the team the
+# task belonged to at the time. Moving a task to another team writes a
+# tombstone for the old team followed by an upsert for the new one.
+#
+# Leaving a team (or being removed) writes a LEAVE row for the user. The
+# team's rows are no longer read for them, so a sync that reaches the LEAVE
+# row returns tombstones for every task the team held or lost since the
+# cursor, unless the user can still see it.
+#
+# `seq` values are assigned at insert time but become visible at commit, so
+# a change can appear below a seq that was already read. The cursor therefore
+# never moves past changes younger than TASK_CHANGES["SETTLE_SECONDS"]; those
+# are delivered again on the next sync, which is harmless because applying a
+# change is idempotent.
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, "TASK_CHANGES", {}).get(name, default)
+
+
+def change_rows(created=(), updated=(), deleted=()):
+    """Unsaved TaskChange rows for tasks that were just created, updated or deleted"""
+    rows = []
+    for task in created:
+        rows.append(TaskChange(task_id=task.pk, owner_id=task.created_by_id,
+                               team_id=task.for_team_id, op=TaskChange.UPSERT))
+    for task in updated:
+        previous_team = getattr(task, "_loaded_values", {}).get(
+            "for_team_id", task.for_team_id)
+        if previous_team is not None and previous_team != task.for_team_id:
+            rows.append(TaskChange(task_id=task.pk, owner_id=task.created_by_id,
+                                   team_id=previous_team, op=TaskChange.DELETE))
+        rows.append(TaskChange(task_id=task.pk, owner_id=task.created_by_id,
+                               team_id=task.for_team_id, op=TaskChange.UPSERT))
+    for task in deleted:
+        rows.append(TaskChange(task_id=task.pk, owner_id=task.created_by_id,
+                               team_id=task.for_team_id, op=TaskChange.DELETE))
+    return rows
+
+
+def record_changes(created=(), updated=(), deleted=()):
+    rows = change_rows(created, updated, deleted)
+    if rows:
+        TaskChange.objects.bulk_create(rows)  # pylint: disable=no-member
+
+
+def record_left_team(user_id, team_id):
+    TaskChange.objects.create(  # pylint: disable=no-member
+        task_id=None, owner_id=user_id, team_id=team_id, op=TaskChange.LEAVE)
+
+
+def _left_team_task_ids(team_ids, after):
+    """Ids of the tasks the teams hold now, or held at some point after `after`"""
+    task_ids = set(Task.objects.filter(  # pylint: disable=no-member
+        for_team_id__in=team_ids).values_list("id", flat=True))
+    task_ids.update(TaskChange.objects.filter(  # pylint: disable=no-member
+        team_id__in=team_ids, seq__gt=after, task_id__isnull=False
+    ).values_list("task_id", flat=True))
+    return task_ids
+
+
+def head_cursor():
+    """Cursor positioned after the latest change, for a client that just loaded its lists"""
+    head = TaskChange.objects.aggregate(  # pylint: disable=no-member
+        head=Max("seq"))["head"] or 0
+    return encode_cursor(["changes", head, timezone.now().isoformat()])
+
+
+def parse_cursor(cursor):
+    """Return (seq, issued_at); raises InvalidCursor or CursorExpired"""
+    try:
+        kind, seq, issued = decode_cursor(cursor)
+        issued_at = parse_datetime(issued)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if kind != "changes" or not isinstance(seq, int) or issued_at is None:
+        raise InvalidCursor("Invalid cursor")
+
+    retention = timedelta(days=_setting("RETENTION_DAYS", 30))
+    if issued_at < timezone.now() - retention:
+        # changes after this cursor may already have been pruned
+        raise CursorExpired("Cursor expired, reload the task lists")
+    return seq, issued_at
+
+
+def changes_since(user, cursor, limit):
+    """Return (tasks, deleted_ids, next_cursor, has_more) for `user` after `cursor`"""
+    after, issued_at = parse_cursor(cursor)
+    team_ids = list(TeamMembership.objects.filter(  # pylint: disable=no-member
+        user=user).values_list("team_id", flat=True))
+
+    rows = list(TaskChange.objects.filter(  # pylint: disable=no-member
+        Q(owner_id=user.id) | Q(team_id__in=team_ids), seq__gt=after
+    ).order_by("seq").values("seq", "task_id", "team_id", "op", "changed_at")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # only the latest change of each task matters
+    latest, left = {}, set()
+    for row in rows:
+        if row["op"] == TaskChange.LEAVE:
+            # other members' LEAVE rows of the caller's teams are read too
+            if row["team_id"] not in team_ids:
+                left.add(row["team_id"])
+        else:
+            latest[row["task_id"]] = row["op"]
+
+    upserted = [task_id for task_id, op in latest.items() if op == TaskChange.UPSERT]
+    tasks = list(Task.objects.filter(  # pylint: disable=no-member
+        Q(created_by=user) | Q(for_team_id__in=team_ids), id__in=upserted
+    ).order_by("id"))
+    # upserted tasks that are gone or no longer visible are tombstones too
+    found = {task.id for task in tasks}
+    deleted = {task_id for task_id, op in latest.items()
+               if op == TaskChange.DELETE or task_id not in found}
+
+    if left:
+        lost = _left_team_task_ids(list(left), after) - found
+        still_visible = set(Task.objects.filter(  # pylint: disable=no-member
+            Q(created_by=user) | Q(for_team_id__in=team_ids), id__in=lost
+        ).values_list("id", flat=True))
+        deleted |= lost - still_visible
+    deleted_ids = sorted(deleted)
+
+    settled_before = timezone.now() - timedelta(
+        seconds=_setting("SETTLE_SECONDS", 5))
+    next_seq = after
+    for row in rows:
+        if row["changed_at"] > settled_before:
+            break
+        next_seq, issued_at = row["seq"], row["changed_at"]
+    if next_seq == after:
+        # nothing settled yet; keep the cursor but let it age with the client
+        issued_at = max(issued_at, settled_before)
+    next_cursor = encode_cursor(["changes", next_seq, issued_at.isoformat()])
+    return tasks, deleted_ids, next_cursor, has_more and next_seq != after
+
+
+def prune_changes(days=None):
+    """Delete changes older than the retention period; returns the number deleted"""
+    if days is None:
+        days = _setting("RETENTION_DAYS", 30)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = TaskChange.objects.filter(  # pylint: disable=no-member
+        changed_at__lt=cutoff).delete()
+    return deleted
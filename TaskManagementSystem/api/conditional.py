@@ -0,0 +1,60 @@
+import hashlib
+
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Profile
+
+# -----------------------------
+# Conditional GET (ETag / Last-Modified)
+# -----------------------------
+# Validators are derived from versions that every relevant write bumps in
+# its own transaction (Team.data_version, Profile.tasks_version), so they
+# cost one indexed row read instead of an aggregate over the listed rows.
+# Views compute them before serializing and return 304 Not Modified straight
+# away when the client's copy is current.
+
+
+def bump_tasks_versions(user_ids):
+    """Bump the task list versions of the tasks' owners, in the current transaction"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        Profile.objects.filter(user_id__in=user_ids).update(  # pylint: disable=no-member
+            tasks_version=F("tasks_version") + 1)
+
+
+def tasks_version(user_id):
+    """Return the user's task list version, or None if they have no profile"""
+    return Profile.objects.filter(  # pylint: disable=no-member
+        user_id=user_id).values_list("tasks_version", flat=True).first()
+
+
+def make_etag(*parts):
+    raw = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def latest_of(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 response if the request's validators still match, else None"""
+    last_modified_ts = int(
+        last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified_ts)
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    # let clients keep the body but always revalidate it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
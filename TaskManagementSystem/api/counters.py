@@ -0,0 +1,100 @@
+from collections import Counter
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+
+from .models import Task, Team, TeamTaskCounter
+
+# -----------------------------
+# Incremental maintenance of TeamTaskCounter
+# -----------------------------
+# A task contributes 1 to the counter row keyed by
+# (for_team, assigned_to, status, priority); tasks without a team are not
+# counted. Every write turns into +1/-1 deltas on those keys, applied in the
+# transaction of the write itself.
+
+
+def counter_key(values):
+    """Counter key for a dict of Task attnames, or None for tasks without a team"""
+    if not values or values.get("for_team_id") is None:
+        return None
+    return (values["for_team_id"], values.get("assigned_to_id"),
+            values["status"], values["priority"])
+
+
+def current_key(task):
+    return counter_key({field: getattr(task, field) for field in Task.tracked_fields})
+
+
+def loaded_key(task):
+    """Key of the task as it was stored before the current write"""
+    return counter_key(getattr(task, "_loaded_values", None))
+
+
+def task_deltas(created=(), updated=(), deleted=()):
+    """Counter deltas for tasks that were just created, updated or deleted"""
+    deltas = Counter()
+    for task in created:
+        deltas[current_key(task)] += 1
+    for task in updated:
+        deltas[loaded_key(task)] -= 1
+        deltas[current_key(task)] += 1
+    for task in deleted:
+        key = loaded_key(task) if task.has_loaded_values() else current_key(task)
+        deltas[key] -= 1
+    deltas.pop(None, None)
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def apply_deltas(deltas):
+    if not deltas:
+        return
+    with transaction.atomic():
+        # lock the teams involved so concurrent writers cannot both create
+        # the same counter row (the unique constraint cannot cover the NULL
+        # assignee rows on every backend)
+        team_ids = sorted({key[0] for key in deltas})
+        list(Team.objects.select_for_update().filter(  # pylint: disable=no-member
+            id__in=team_ids).values_list("id", flat=True))
+
+        for (team_id, assignee_id, task_status, priority), delta in deltas.items():
+            key = {"team_id": team_id, "assigned_to_id": assignee_id,
+                   "status": task_status, "priority": priority}
+            updated = TeamTaskCounter.objects.filter(  # pylint: disable=no-member
+                **key).update(count=F("count") + delta)
+            if updated or delta < 0:
+                # a missing row with a negative delta was removed with its
+                # team/assignee; rebuild_counters() reconciles such cases
+                continue
+            try:
+                with transaction.atomic():
+                    TeamTaskCounter.objects.create(  # pylint: disable=no-member
+                        count=delta, **key)
+            except IntegrityError:
+                TeamTaskCounter.objects.filter(  # pylint: disable=no-member
+                    **key).update(count=F("count") + delta)
+
+
+def rebuild_counters(team_ids=None):
+    """Recompute counter rows from the Task table (all teams, or only `team_ids`)"""
+    tasks = Task.objects.filter(for_team__isnull=False)  # pylint: disable=no-member
+    counters = TeamTaskCounter.objects.all()  # pylint: disable=no-member
+    if team_ids is not None:
+        tasks = tasks.filter(for_team_id__in=team_ids)
+        counters = counters.filter(team_id__in=team_ids)
+
+    # SELECT team, assignee, status, priority, COUNT(*) ... GROUP BY ...,
+    # inserted by the database itself: no rows travel through Python
+    groups = tasks.values("for_team_id", "assigned_to_id", "status", "priority").annotate(
+        total=Count("id")).order_by()
+    select_sql, params = groups.query.sql_with_params()
+    meta = TeamTaskCounter._meta  # pylint: disable=protected-access
+    columns = ", ".join(connection.ops.quote_name(meta.get_field(name).column)
+                        for name in ("team", "assigned_to", "status", "priority", "count"))
+
+    with transaction.atomic():
+        counters.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(meta.db_table)} ({columns}) {select_sql}",
+                params)
@@ -0,0 +1,319 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# In-process pub/sub for team task events
+# -----------------------------
+# Write paths publish (after commit) from whatever thread they run in;
+# subscribers are SSE streams running on the ASGI event loop. Each
+# subscriber owns a bounded asyncio.Queue that is only touched from its
+# loop (via call_soon_threadsafe). A subscriber that falls behind is not
+# allowed to buffer without limit: when its queue is full it is closed
+# with an "overflow" event and the client resyncs (tasks/changes/).
+#
+# The broker only reaches subscribers of its own process. Writes happen in
+# every server process (the WSGI workers included), so with more than one
+# process events go through a shared channel (see below).
+
+OVERFLOW = "overflow"
+
+
+def _setting(name, default):
+    return getattr(settings, "EVENT_STREAM", {}).get(name, default)
+
+
+def streaming_enabled():
+    """Whether this deployment serves teams/<id>/events/ from an ASGI server"""
+    return _setting("ENABLED", False)
+
+
+class Subscription:
+    def __init__(self, team_id, loop, max_queue_size):
+        self.team_id = team_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.closed = False
+
+    def _deliver(self, event):
+        # runs on self.loop
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._overflow()
+
+    def _overflow(self):
+        # runs on self.loop
+        if self.closed:
+            return
+        self.closed = True
+        # make room for the final event so the stream can tell the client
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": OVERFLOW})
+
+    async def get(self, timeout):
+        """Next event, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._stats = {"published": 0, "delivered": 0, "overflowed": 0}
+
+    def subscribe(self, team_id):
+        """Register a subscriber; must be called from the loop that will read it"""
+        listener.ensure_started()
+        subscription = Subscription(
+            team_id, asyncio.get_running_loop(), _setting("QUEUE_SIZE", 100))
+        with self._lock:
+            self._subscribers.setdefault(team_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.team_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.team_id, None)
+            if subscription.closed:
+                self._stats["overflowed"] += 1
+
+    def publish(self, team_id, event):
+        """Send `event` to every subscriber of `team_id`; safe from any thread"""
+        event = dict(event, id=next(self._ids), team_id=team_id)
+        with self._lock:
+            subscribers = list(self._subscribers.get(team_id, ()))
+            self._stats["published"] += 1
+            self._stats["delivered"] += len(subscribers)
+        for subscription in subscribers:
+            self._call(subscription, subscription._deliver, event)  # pylint: disable=protected-access
+
+    def overflow_all(self):
+        """End every stream with an overflow event: its client resyncs"""
+        with self._lock:
+            subscribers = [subscription for subscribers in self._subscribers.values()
+                           for subscription in subscribers]
+        for subscription in subscribers:
+            self._call(subscription, subscription._overflow)  # pylint: disable=protected-access
+
+    def _call(self, subscription, method, *args):
+        try:
+            subscription.loop.call_soon_threadsafe(method, *args)
+        except RuntimeError:
+            # the subscriber's loop has been closed
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, subscribers=sum(
+                len(subscribers) for subscribers in self._subscribers.values()))
+
+
+broker = EventBroker()
+
+
+def format_sse(event):
+    lines = [f"id: {event['id']}"] if "id" in event else []
+    lines += [f"event: {event['type']}", f"data: {json.dumps(event, default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def task_event(event_type, task, team_id):
+    return {
+        "type": event_type,
+        "team_id": team_id,
+        "task_id": task.pk,
+        "title": task.title,
+        "status": task.status,
+        "assigned_to": task.assigned_to_id,
+    }
+
+
+def task_events(created=(), updated=(), deleted=()):
+    """(team_id, event) pairs for tasks that were just written"""
+    events = []
+    for task in created:
+        if task.for_team_id is not None:
+            events.append((task.for_team_id, task_event("created", task, task.for_team_id)))
+    for task in updated:
+        loaded = getattr(task, "_loaded_values", {})
+        previous_team = loaded.get("for_team_id", task.for_team_id)
+        if previous_team != task.for_team_id:
+            # moving between teams: gone from one, new in the other
+            if previous_team is not None:
+                events.append((previous_team, task_event("deleted", task, previous_team)))
+            if task.for_team_id is not None:
+                events.append((task.for_team_id, task_event("created", task, task.for_team_id)))
+            continue
+        if task.for_team_id is None:
+            continue
+        if loaded.get("status", task.status) != task.status:
+            events.append((task.for_team_id, task_event("status_changed", task, task.for_team_id)))
+        if loaded.get("assigned_to_id", task.assigned_to_id) != task.assigned_to_id:
+            events.append((task.for_team_id, task_event("assigned", task, task.for_team_id)))
+    for task in deleted:
+        if task.for_team_id is not None:
+            events.append((task.for_team_id, task_event("deleted", task, task.for_team_id)))
+    return events
+
+
+def publish_on_commit(events):
+    if events:
+        transaction.on_commit(lambda: publish(events))
+
+
+# -----------------------------
+# Shared channel
+# -----------------------------
+# With CHANNEL_URL (a Redis URL) set, publish() sends events to a Redis
+# pub/sub channel instead of the local broker, and every process that serves
+# streams runs one listener thread feeding the channel into its broker: a
+# write in any worker, WSGI or ASGI, reaches the streams of all of them.
+# Events are best effort. A publish that fails is logged and dropped (the
+# write has committed already); while a listener reconnects its streams are
+# ended with an overflow event, so their clients resync.
+
+CHANNEL = "task-events"
+MAX_RECONNECT_DELAY = 30
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def _channel_url():
+    return _setting("CHANNEL_URL", "")
+
+
+def _redis():
+    import redis  # pylint: disable=import-outside-toplevel
+    return redis.Redis.from_url(_channel_url())
+
+
+def _publisher_client():
+    global _publisher  # pylint: disable=global-statement
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = _redis()
+    return _publisher
+
+
+def publish(events):
+    """Send (team_id, event) pairs to every process's streams"""
+    if not _channel_url():
+        for team_id, event in events:
+            broker.publish(team_id, event)
+        return
+    try:
+        pipeline = _publisher_client().pipeline(transaction=False)
+        for team_id, event in events:
+            pipeline.publish(CHANNEL, json.dumps([team_id, event], default=str))
+        pipeline.execute()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Failed to publish %d team events", len(events))
+
+
+class ChannelListener:
+    """One thread per process feeding the shared channel into the broker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.delay = 1
+
+    def ensure_started(self):
+        if not _channel_url():
+            return
+        # a thread does not survive fork(): start one in each process
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="team-events-listener", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.listen(_redis())
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Team event channel lost, reconnecting in %ss", self.delay,
+                               exc_info=True)
+            # whatever was published meanwhile is lost to the open streams
+            broker.overflow_all()
+            time.sleep(self.delay)
+            self.delay = min(self.delay * 2, MAX_RECONNECT_DELAY)
+
+    def listen(self, client):
+        """Deliver the channel's events until the connection ends"""
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        self.delay = 1
+        for message in pubsub.listen():
+            try:
+                team_id, event = json.loads(message["data"])
+            except (ValueError, TypeError):
+                logger.warning("Ignoring a malformed team event: %r", message["data"])
+                continue
+            broker.publish(team_id, event)
+
+
+listener = ChannelListener()
+
+
+# -----------------------------
+# Stream tickets
+# -----------------------------
+# EventSource cannot send an Authorization header, and an access token in
+# the query string would end up in access logs. Clients first fetch a ticket
+# from teams/<id>/events/ticket/ (an ordinary authenticated request): a
+# signed (user, team, nonce) that is valid for TICKET_SECONDS and can open
+# one stream. A reconnect needs a new ticket.
+
+TICKET_SALT = "api.events.ticket"
+
+
+def issue_ticket(user_id, team_id):
+    return signing.dumps([user_id, team_id, secrets.token_hex(8)], salt=TICKET_SALT)
+
+
+def redeem_ticket(ticket, team_id):
+    """The id of the user the ticket was issued to, or None if it is invalid,
+    expired, already used or for another team"""
+    max_age = _setting("TICKET_SECONDS", 30)
+    try:
+        user_id, ticket_team_id, nonce = signing.loads(ticket, salt=TICKET_SALT, max_age=max_age)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if ticket_team_id != team_id:
+        return None
+    # the nonce only needs remembering until the ticket expires anyway
+    used = caches[_setting("TICKET_CACHE_ALIAS", "default")]
+    if not used.add(f"event-ticket:{nonce}", True, timeout=max_age):
+        return None
+    return user_id
@@ -0,0 +1,356 @@
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: concurrent archive runs are not prevented
+    fcntl = None
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .backends import LogStoreUnavailable, get_backend
+
+# -----------------------------
+# Activity log archive
+# -----------------------------
+# Entries older than HOT_DAYS leave the log store for gzipped NDJSON
+# partitions: one file per day (daily/2026-09-14.ndjson.gz), merged into one
+# file per month (monthly/2026-09.ndjson.gz) once the month is older than
+# COMPACT_AFTER_DAYS, and deleted after ARCHIVE_DAYS. Partitions cover
+# disjoint time ranges, read from their names, so a time-range query opens
+# only the partitions it overlaps.
+#
+# Every partition is sorted by (timestamp, id) and holds each id once:
+# writing to a partition rewrites it (to a temporary file, renamed over it)
+# with the old and new entries merged, so archiving a batch again after a
+# crash (before the store deleted it) is harmless. Partitions are streamed,
+# never loaded whole: a write merges sorted streams, a read keeps at most a
+# page of entries.
+#
+# Compaction renames the complete monthly partition into place before it
+# removes the dailies. Until they are gone (a crash in between), dailies of
+# a month that has a monthly partition are ignored by readers and merged in
+# again, without duplicates, by the next compaction.
+
+DAILY_NAME = re.compile(r"^(\d{4})-(\d{2})-(\d{2})\.ndjson\.gz$")
+MONTHLY_NAME = re.compile(r"^(\d{4})-(\d{2})\.ndjson\.gz$")
+
+# entries held in memory before the touched partitions are written
+FLUSH_ENTRIES = 50000
+
+
+def _timestamp(value):
+    return value.isoformat(timespec="microseconds")
+
+
+def _key(entry):
+    return (entry["timestamp"], entry["id"])
+
+
+def _next_month(value):
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class Partition:
+    def __init__(self, path, start, end):
+        self.path = path
+        # [start, end) as naive UTC datetimes
+        self.start = start
+        self.end = end
+
+    @property
+    def monthly(self):
+        return bool(MONTHLY_NAME.match(os.path.basename(self.path)))
+
+    def entries(self):
+        """Entries oldest first, timestamps as ISO strings, read as they are needed"""
+        try:
+            with gzip.open(self.path, "rb") as partition_file:
+                for line in partition_file:
+                    yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def write(self, *sources):
+        """Replace the partition with its entries merged with `sources`
+
+        Each source is an iterable of entries sorted by (timestamp, id); an
+        entry found more than once is written once.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = self.path + ".tmp"
+        written, previous = 0, None
+        with open(temporary, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as partition_file:
+                for entry in heapq.merge(self.entries(), *sources, key=_key):
+                    if _key(entry) == previous:
+                        continue
+                    previous = _key(entry)
+                    partition_file.write(json.dumps(entry, separators=(",", ":")).encode() + b"\n")
+                    written += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temporary, self.path)
+        return written
+
+
+class LogArchive:
+    def __init__(self, path):
+        self.path = path
+
+    def partitions(self, covered=False):
+        """Every partition, oldest first
+
+        Dailies of a month that has a monthly partition (left by an
+        interrupted compaction) are only included with `covered`.
+        """
+        found = []
+        for kind, pattern in (("daily", DAILY_NAME), ("monthly", MONTHLY_NAME)):
+            directory = os.path.join(self.path, kind)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                match = pattern.match(name)
+                if match is None:
+                    continue
+                parts = [int(part) for part in match.groups()]
+                if kind == "daily":
+                    start = datetime(*parts)
+                    end = start + timedelta(days=1)
+                else:
+                    start = datetime(parts[0], parts[1], 1)
+                    end = _next_month(start)
+                found.append(Partition(os.path.join(directory, name), start, end))
+        if not covered:
+            months = {partition.start for partition in found if partition.monthly}
+            found = [partition for partition in found if partition.monthly
+                     or partition.start.replace(day=1) not in months]
+        return sorted(found, key=lambda partition: partition.start)
+
+    def partition_for(self, timestamp):
+        month = os.path.join(self.path, "monthly", f"{timestamp:%Y-%m}.ndjson.gz")
+        if os.path.exists(month):
+            start = datetime(timestamp.year, timestamp.month, 1)
+            return Partition(month, start, _next_month(start))
+        start = datetime(timestamp.year, timestamp.month, timestamp.day)
+        return Partition(os.path.join(self.path, "daily", f"{timestamp:%Y-%m-%d}.ndjson.gz"),
+                         start, start + timedelta(days=1))
+
+    def newest(self):
+        """End of the newest partition: every archived entry is older"""
+        partitions = self.partitions()
+        return max(partition.end for partition in partitions) if partitions else None
+
+    # -----------------------------
+    # Maintenance
+    # -----------------------------
+
+    @contextmanager
+    def lock(self):
+        """Exclusive across processes: one archive run at a time"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "a", encoding="utf-8") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def add(self, entries):
+        """Write entries (timestamps as datetimes) into their partitions"""
+        by_partition = defaultdict(list)
+        partitions = {}
+        for entry in entries:
+            partition = self.partition_for(entry["timestamp"])
+            partitions[partition.path] = partition
+            by_partition[partition.path].append(dict(entry, timestamp=_timestamp(entry["timestamp"])))
+        for path, rows in by_partition.items():
+            partitions[path].write(sorted(rows, key=_key))
+        return len(by_partition)
+
+    def compact(self, before):
+        """Merge the daily partitions of months ending before `before` into monthly ones"""
+        months = defaultdict(list)
+        for partition in self.partitions(covered=True):
+            if not partition.monthly and _next_month(partition.start) <= before:
+                months[(partition.start.year, partition.start.month)].append(partition)
+        for (year, month), dailies in months.items():
+            start = datetime(year, month, 1)
+            monthly = Partition(os.path.join(self.path, "monthly", f"{start:%Y-%m}.ndjson.gz"),
+                                start, _next_month(start))
+            # in place (renamed) before any daily goes: see the module notes
+            monthly.write(*(daily.entries() for daily in dailies))
+            for daily in dailies:
+                os.remove(daily.path)
+        return len(months)
+
+    def drop(self, before):
+        """Delete partitions whose entries are all older than `before`"""
+        dropped = 0
+        for partition in self.partitions(covered=True):
+            if partition.end <= before:
+                os.remove(partition.path)
+                dropped += 1
+        return dropped
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+
+    def query(self, filters, since=None, until=None, before=None, limit=50):
+        """Same contract as LogBackend.query, over the archived partitions"""
+        since_key = _timestamp(since) if since is not None else None
+        until_key = _timestamp(until) if until is not None else None
+        before_key = (_timestamp(before[0]), before[1]) if before is not None else None
+
+        results = []
+        # partitions are disjoint: reading them newest first, each newest
+        # entry first, the first `limit` matches are the answer
+        for partition in reversed(self.partitions()):
+            if len(results) >= limit or (since is not None and partition.end <= since):
+                break
+            if ((until is not None and partition.start >= until)
+                    or (before is not None and partition.start > before[0])):
+                continue
+            # the partition's newest matches: stream it oldest first, keeping
+            # only as many as the page still needs
+            newest = deque(maxlen=limit - len(results))
+            for entry in partition.entries():
+                key = _key(entry)
+                if ((until_key is not None and key[0] >= until_key)
+                        or (before_key is not None and key >= before_key)):
+                    break
+                if ((since_key is not None and key[0] < since_key)
+                        or any(entry.get(field) != value for field, value in filters.items())):
+                    continue
+                newest.append(entry)
+            results.extend(reversed(newest))
+
+        for entry in results:
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+        return results
+
+    def aggregate(self, group_by, filters, since=None, until=None):
+        """Same contract as LogBackend.aggregate, over the archived partitions"""
+        since_key = _timestamp(since) if since is not None else None
+        until_key = _timestamp(until) if until is not None else None
+        counts = Counter()
+        for partition in self.partitions():
+            if ((since is not None and partition.end <= since)
+                    or (until is not None and partition.start >= until)):
+                continue
+            for entry in partition.entries():
+                if until_key is not None and entry["timestamp"] >= until_key:
+                    break
+                if ((since_key is not None and entry["timestamp"] < since_key)
+                        or any(entry.get(field) != value for field, value in filters.items())):
+                    continue
+                counts[entry["timestamp"][:10] if group_by == "day" else entry.get(group_by)] += 1
+        return counts
+
+
+def retention():
+    config = getattr(settings, "ACTIVITY_LOG_RETENTION", {})
+    return {
+        "HOT_DAYS": config.get("HOT_DAYS", 30),
+        "TTL_DAYS": config.get("TTL_DAYS", 0),
+        "ARCHIVE_PATH": config.get("ARCHIVE_PATH", "activity_log_archive"),
+        "COMPACT_AFTER_DAYS": config.get("COMPACT_AFTER_DAYS", 90),
+        "ARCHIVE_DAYS": config.get("ARCHIVE_DAYS", 0),
+    }
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    global _archive  # pylint: disable=global-statement
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = LogArchive(retention()["ARCHIVE_PATH"])
+    return _archive
+
+
+@receiver(setting_changed)
+def reset_archive(setting, **kwargs):
+    global _archive  # pylint: disable=global-statement
+    if setting == "ACTIVITY_LOG_RETENTION":
+        _archive = None
+
+
+def query_logs(filters, since=None, until=None, before=None, limit=50):
+    """LogBackend.query over the log store and the archive together"""
+    hot = get_backend().query(filters, since=since, until=until, before=before, limit=limit)
+    archive = get_archive()
+    try:
+        newest_archived = archive.newest()
+        if newest_archived is None or (len(hot) >= limit and hot[-1]["timestamp"] >= newest_archived):
+            # the page is complete and everything archived is older
+            return hot
+        archived = archive.query(filters, since=since, until=until, before=before, limit=limit)
+    except OSError as exc:
+        raise LogStoreUnavailable(str(exc)) from exc
+    # an entry can be in both for a moment (archived, not deleted yet)
+    merged = {entry["id"]: entry for entry in archived}
+    merged.update((entry["id"], entry) for entry in hot)
+    return sorted(merged.values(), key=lambda entry: (entry["timestamp"], entry["id"]),
+                  reverse=True)[:limit]
+
+
+def aggregate_logs(group_by, filters, since=None, until=None):
+    """LogBackend.aggregate over the log store and the archive together"""
+    counts = Counter(get_backend().aggregate(group_by, filters, since=since, until=until))
+    archive = get_archive()
+    try:
+        newest_archived = archive.newest()
+        if newest_archived is not None and (since is None or since < newest_archived):
+            counts.update(archive.aggregate(group_by, filters, since=since, until=until))
+    except OSError as exc:
+        raise LogStoreUnavailable(str(exc)) from exc
+    return dict(counts)
+
+
+def run_retention(config=None, now=None):
+    """Archive expired entries, apply the TTL, compact and drop old partitions"""
+    config = config or retention()
+    now = now or datetime.utcnow()
+    backend = get_backend()
+    archive = LogArchive(config["ARCHIVE_PATH"])
+    result = {"archived": 0, "partitions_written": 0, "compacted_months": 0,
+              "dropped_partitions": 0}
+
+    with archive.lock():
+        pending, deletes = [], []
+        for entries, delete in backend.expired_batches(now - timedelta(days=config["HOT_DAYS"])):
+            pending.extend(entries)
+            deletes.append(delete)
+            if len(pending) >= FLUSH_ENTRIES:
+                result["partitions_written"] += archive.add(pending)
+                result["archived"] += len(pending)
+                # only once the partitions are on disk
+                for delete_batch in deletes:
+                    delete_batch()
+                pending, deletes = [], []
+        if pending or deletes:
+            result["partitions_written"] += archive.add(pending)
+            result["archived"] += len(pending)
+            for delete_batch in deletes:
+                delete_batch()
+        # after archiving: a first run must not let the store drop a backlog
+        # older than the TTL before it is archived
+        backend.apply_ttl(timedelta(days=config["TTL_DAYS"]) if config["TTL_DAYS"] else None)
+
+        result["compacted_months"] = archive.compact(
+            now - timedelta(days=config["COMPACT_AFTER_DAYS"]))
+        if config["ARCHIVE_DAYS"]:
+            result["dropped_partitions"] = archive.drop(now - timedelta(days=config["ARCHIVE_DAYS"]))
+    return result
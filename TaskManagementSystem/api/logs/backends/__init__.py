@@ -0,0 +1,41 @@
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .base import GROUP_FIELDS, LogBackend, LogStoreUnavailable  # noqa: F401
+
+# -----------------------------
+# Activity log storage backends
+# -----------------------------
+# settings.ACTIVITY_LOG_BACKEND names the backend class (ENGINE) and its
+# OPTIONS, like DATABASES or CACHES:
+#   api.logs.backends.mongo.MongoLogBackend  MongoDB through mongoengine
+#   api.logs.backends.local.FileLogBackend   segmented NDJSON files on disk
+
+DEFAULT_BACKEND = "api.logs.backends.mongo.MongoLogBackend"
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide log backend configured in settings"""
+    global _backend  # pylint: disable=global-statement
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, "ACTIVITY_LOG_BACKEND", {})
+                backend_class = import_string(config.get("ENGINE", DEFAULT_BACKEND))
+                _backend = backend_class(config.get("OPTIONS", {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    # override_settings(ACTIVITY_LOG_BACKEND=...) in tests and benchmarks
+    global _backend  # pylint: disable=global-statement
+    if setting == "ACTIVITY_LOG_BACKEND":
+        _backend = None
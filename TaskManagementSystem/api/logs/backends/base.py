@@ -0,0 +1,62 @@
+class LogStoreUnavailable(Exception):
+    """The log store could not be reached (network, disk); retrying may help"""
+
+
+# what LogBackend.aggregate can group by, besides "day"
+GROUP_FIELDS = ("user", "action", "code", "task_id", "team_id")
+
+
+class LogBackend:
+    """Where activity log entries are stored and how they are listed
+
+    An entry is a dict with the keys `user` (username), `action`, `code`
+    (structured action or None), `task_id` and `team_id` (strings, team_id
+    None for personal tasks) and `timestamp` (naive UTC datetime). Listings are newest
+    first and ordered by (timestamp, id), where `id` is a string assigned by
+    the backend; a page ends where the next one starts with `before`.
+    """
+
+    def __init__(self, options):
+        self.options = options
+
+    def write(self, entries):
+        """Store a batch of entries; raises LogStoreUnavailable on failure"""
+        raise NotImplementedError
+
+    def query(self, filters, since=None, until=None, before=None, limit=50):
+        """Return up to `limit` entries newest first, each with its `id`
+
+        filters: field -> value equality filters (user, task_id, team_id,
+            action, code)
+        since / until: naive UTC datetimes, inclusive / exclusive
+        before: (timestamp, id) of the last entry of the previous page;
+            raises ValueError if the id is not one this backend issues
+        """
+        raise NotImplementedError
+
+    def aggregate(self, group_by, filters, since=None, until=None):
+        """Count entries per group, in the store: {group: count}
+
+        group_by: an entry field (GROUP_FIELDS) or "day" (UTC, YYYY-MM-DD)
+        """
+        raise NotImplementedError
+
+    def expired_batches(self, cutoff, batch_size=5000):
+        """Yield (entries, delete) for entries older than `cutoff`
+
+        The caller archives each batch and then calls delete() to remove it
+        from the store. A backend may hold back entries it cannot remove
+        separately yet (the file engine removes whole segments).
+        """
+        raise NotImplementedError
+
+    def apply_ttl(self, ttl):
+        """Let the store drop entries older than `ttl` (a timedelta, None: keep)
+
+        A safety net bounding the store when archiving does not run.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """Counters exported by the metrics endpoint"""
+        return {}
@@ -0,0 +1,481 @@
+import heapq
+import json
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: only threads of one process are serialized
+    fcntl = None
+
+from .base import LogBackend, LogStoreUnavailable
+
+# -----------------------------
+# Local append-only log store
+# -----------------------------
+# Entries are appended as NDJSON lines to numbered segment files
+# (segment-00000001.ndjson, ...). A new segment is started once the current
+# one reaches MAX_SEGMENT_BYTES. An entry's id is "<segment>-<byte offset>",
+# fixed width, so ids sort in write order and need no counter.
+#
+# Group commit: concurrent write() calls in a process are gathered; one
+# thread appends the whole group with a single write() and fsync() while the
+# others wait for it, so the fsync cost is shared. Writers in other processes
+# (server workers) are serialized with flock on a lock file.
+#
+# Sparse index: each segment has a sidecar .idx file with one line per block
+# of about INDEX_INTERVAL_BYTES: {"start", "end", "min", "max"} (byte range
+# and timestamp range). Range reads only open blocks whose timestamp range
+# overlaps the query. The index is derived data: the bytes after the last
+# indexed block are scanned instead, so a lost or torn index tail costs time,
+# not entries, and is not fsynced.
+#
+# Rollups: each index line also carries the block's entry counts per
+# (user, code, team_id, day), computed once when the block is indexed.
+# aggregate() adds up the rollups of the blocks that lie wholly inside the
+# requested time range and reads only the blocks at its edges and the
+# unindexed tail. Grouping or filtering by another field (action, task_id)
+# reads the blocks. Blocks indexed without rollups are read too.
+
+SEGMENT_NAME = re.compile(r"^segment-(\d{8})\.ndjson$")
+ENTRY_ID = re.compile(r"^\d{8}-\d{12}$")
+
+# the fields counted by the block rollups, besides the day
+ROLLUP_FIELDS = ("user", "code", "team_id")
+
+
+def _timestamp(value):
+    return value.isoformat(timespec="microseconds")
+
+
+def _rollup(entries):
+    """[user, code, team_id, day, count] rows counting `entries`"""
+    counts = Counter((*(entry.get(field) for field in ROLLUP_FIELDS), entry["timestamp"][:10])
+                     for entry in entries)
+    return [[*key, count] for key, count in counts.items()]
+
+
+class Segment:
+    """What is known about one segment file: its size and its index blocks"""
+
+    def __init__(self, number, directory):
+        self.number = number
+        self.path = os.path.join(directory, f"segment-{number:08d}.ndjson")
+        self.index_path = os.path.join(directory, f"segment-{number:08d}.idx")
+        self.size = 0
+        # indexed blocks: (start, end, min timestamp, max timestamp)
+        self.blocks = []
+        # bytes after the last indexed block, not indexed yet
+        self.tail_min = None
+        self.tail_max = None
+
+    @property
+    def tail_start(self):
+        return self.blocks[-1][1] if self.blocks else 0
+
+    def load(self):
+        """Read the index and scan the unindexed tail"""
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.blocks = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as index_file:
+                for line in index_file:
+                    try:
+                        block = json.loads(line)
+                        block = (block["start"], block["end"], block["min"], block["max"])
+                    except (ValueError, KeyError):
+                        break  # torn last line
+                    if block[0] != self.tail_start or block[1] > self.size:
+                        break
+                    self.blocks.append(block)
+        self.tail_min = self.tail_max = None
+        for entry in self.read(self.tail_start, self.size):
+            self.extend_tail(entry["timestamp"])
+
+    def extend_tail(self, timestamp):
+        if self.tail_min is None or timestamp < self.tail_min:
+            self.tail_min = timestamp
+        if self.tail_max is None or timestamp > self.tail_max:
+            self.tail_max = timestamp
+
+    @property
+    def newest(self):
+        blocks = self.candidate_blocks()
+        return max(block[3] for block in blocks) if blocks else None
+
+    def candidate_blocks(self):
+        blocks = list(self.blocks)
+        if self.size > self.tail_start and self.tail_min is not None:
+            blocks.append((self.tail_start, self.size, self.tail_min, self.tail_max))
+        return blocks
+
+    def rollups(self):
+        """Block start -> rollup rows, for the loaded blocks indexed with them"""
+        blocks = {block[0]: block[1] for block in self.blocks}
+        rollups = {}
+        try:
+            with open(self.index_path, "rb") as index_file:
+                for line in index_file:
+                    try:
+                        block = json.loads(line)
+                    except ValueError:
+                        break
+                    if blocks.get(block.get("start")) == block.get("end") and "rollup" in block:
+                        rollups[block["start"]] = block["rollup"]
+        except FileNotFoundError:
+            pass
+        return rollups
+
+    def read(self, start, end):
+        """Entries stored in the byte range [start, end)"""
+        if end <= start:
+            return []
+        try:
+            with open(self.path, "rb") as segment_file:
+                segment_file.seek(start)
+                data = segment_file.read(end - start)
+        except FileNotFoundError:
+            return []  # archived in the meantime
+        entries = []
+        for line in data.split(b"\n"):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # empty, or a line still being appended by another process
+        return entries
+
+
+class WriteGroup:
+    def __init__(self):
+        self.entries = []
+        self.done = False
+        self.error = None
+
+
+class FileLogBackend(LogBackend):
+    """Append-only NDJSON segments with a sparse timestamp index per segment
+
+    OPTIONS: PATH (directory), MAX_SEGMENT_BYTES, INDEX_INTERVAL_BYTES,
+    FSYNC (fsync every group commit; off trades durability for speed).
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.directory = options.get("PATH", "activity_logs")
+        self.max_segment_bytes = options.get("MAX_SEGMENT_BYTES", 64 * 1024 * 1024)
+        self.index_interval = options.get("INDEX_INTERVAL_BYTES", 64 * 1024)
+        self.fsync = options.get("FSYNC", True)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._segments = {}
+        self._segments_lock = threading.Lock()
+        self._group = None
+        self._committing = False
+        self._commit_cond = threading.Condition()
+        self._lock_file = None
+        self._lock_pid = None
+
+        self.commits = 0
+        self.entries_written = 0
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+
+    def write(self, entries):
+        if not entries:
+            return
+        with self._commit_cond:
+            if self._group is None:
+                self._group = WriteGroup()
+            group = self._group
+            group.entries.extend(entries)
+            while not group.done:
+                if self._committing:
+                    self._commit_cond.wait()
+                    continue
+                # lead: commit everything gathered so far, including this group
+                self._committing = True
+                leading, self._group = self._group, None
+                self._commit_cond.release()
+                try:
+                    self._commit(leading.entries)
+                except Exception as exc:  # pylint: disable=broad-except
+                    # every writer of the group sees the failure
+                    leading.error = exc
+                finally:
+                    self._commit_cond.acquire()
+                    leading.done = True
+                    self._committing = False
+                    self._commit_cond.notify_all()
+        if isinstance(group.error, OSError):
+            raise LogStoreUnavailable(str(group.error)) from group.error
+        if group.error is not None:
+            raise group.error
+
+    def _commit(self, entries):
+        # readers wait for the commit: they must not reload the segment
+        # while it is half written
+        with self._process_lock(), self._segments_lock:
+            segment = self._writable_segment()
+            data = bytearray()
+            for entry in entries:
+                record = {
+                    "id": f"{segment.number:08d}-{segment.size + len(data):012d}",
+                    **entry,
+                    "timestamp": _timestamp(entry["timestamp"]),
+                }
+                data += json.dumps(record, separators=(",", ":")).encode() + b"\n"
+                segment.extend_tail(record["timestamp"])
+
+            try:
+                fd = os.open(segment.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(fd, view):]
+                    if self.fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                # what reached the file is unknown: reload the segment next time
+                self._segments.pop(segment.number, None)
+                raise
+            segment.size += len(data)
+            if segment.size - segment.tail_start >= self.index_interval:
+                self._index_tail(segment)
+            self.commits += 1
+            self.entries_written += len(entries)
+
+    def _writable_segment(self):
+        """The last segment, reloaded if another process wrote to it; rotates when full"""
+        numbers = self._segment_numbers()
+        segment = self._segment(numbers[-1] if numbers else 1, repair=True)
+        if segment.size >= self.max_segment_bytes:
+            self._index_tail(segment)
+            number = segment.number + 1
+            segment = self._segments[number] = Segment(number, self.directory)
+        return segment
+
+    def _segment(self, number, repair=False):
+        """Cached state of a segment, reloaded when the file size changed"""
+        segment = self._segments.get(number)
+        if segment is None or segment.size != self._file_size(segment.path):
+            segment = self._segments[number] = Segment(number, self.directory)
+            if repair:
+                self._repair(segment)
+            segment.load()
+        return segment
+
+    def _repair(self, segment):
+        # a crash in the middle of an append leaves a partial last line
+        if not os.path.exists(segment.path):
+            return
+        with open(segment.path, "rb+") as segment_file:
+            size = segment_file.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            segment_file.seek(max(0, size - 64 * 1024))
+            data = segment_file.read()
+            if data.endswith(b"\n"):
+                return
+            keep = size - len(data) + data.rfind(b"\n") + 1
+            segment_file.truncate(keep)
+
+    def _index_tail(self, segment):
+        if segment.size <= segment.tail_start or segment.tail_min is None:
+            return
+        block = (segment.tail_start, segment.size, segment.tail_min, segment.tail_max)
+        line = json.dumps({"start": block[0], "end": block[1], "min": block[2], "max": block[3],
+                           "rollup": _rollup(segment.read(block[0], block[1]))},
+                          separators=(",", ":"))
+        with open(segment.index_path, "a", encoding="utf-8") as index_file:
+            index_file.write(line + "\n")
+        segment.blocks.append(block)
+        segment.tail_min = segment.tail_max = None
+
+    @contextmanager
+    def _process_lock(self):
+        if fcntl is None:
+            yield
+            return
+        # flock locks belong to the open file, which a forked child shares
+        # with its parent: open the lock file once per process
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(  # pylint: disable=consider-using-with
+                os.path.join(self.directory, ".lock"), "a", encoding="utf-8")
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+
+    def query(self, filters, since=None, until=None, before=None, limit=50):
+        since = _timestamp(since) if since is not None else None
+        until = _timestamp(until) if until is not None else None
+        if before is not None:
+            if not isinstance(before[1], str) or not ENTRY_ID.match(before[1]):
+                raise ValueError("Invalid cursor")
+            before = (_timestamp(before[0]), before[1])
+
+        try:
+            blocks = [(block, segment) for segment in self._readable_segments()
+                      for block in segment.candidate_blocks()]
+        except OSError as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+        # blocks with the newest entries first; once `limit` entries are
+        # found, a block whose newest entry is older than all of them ends
+        # the search
+        blocks.sort(key=lambda item: item[0][3], reverse=True)
+
+        newest = []  # min-heap of (timestamp, id, entry), at most `limit`
+        for (start, end, oldest_in_block, newest_in_block), segment in blocks:
+            if len(newest) == limit and newest_in_block < newest[0][0]:
+                break
+            if ((until is not None and oldest_in_block >= until)
+                    or (since is not None and newest_in_block < since)
+                    or (before is not None and oldest_in_block > before[0])):
+                continue
+            for entry in segment.read(start, end):
+                key = (entry["timestamp"], entry["id"])
+                if ((until is not None and key[0] >= until)
+                        or (since is not None and key[0] < since)
+                        or (before is not None and key >= before)
+                        or any(entry.get(field) != value for field, value in filters.items())):
+                    continue
+                if len(newest) < limit:
+                    heapq.heappush(newest, (*key, entry))
+                elif key > newest[0][:2]:
+                    heapq.heapreplace(newest, (*key, entry))
+
+        results = [entry for _, _, entry in sorted(newest, key=lambda item: item[:2], reverse=True)]
+        for entry in results:
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+        return results
+
+    def aggregate(self, group_by, filters, since=None, until=None):
+        since = _timestamp(since) if since is not None else None
+        until = _timestamp(until) if until is not None else None
+        by_rollup = group_by in (*ROLLUP_FIELDS, "day") and set(filters) <= set(ROLLUP_FIELDS)
+        try:
+            segments = self._readable_segments()
+            rollups = {segment.number: segment.rollups() if by_rollup else {}
+                       for segment in segments}
+        except OSError as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+
+        counts = Counter()
+        for segment in segments:
+            for start, end, oldest_in_block, newest_in_block in segment.candidate_blocks():
+                if ((until is not None and oldest_in_block >= until)
+                        or (since is not None and newest_in_block < since)):
+                    continue
+                rollup = rollups[segment.number].get(start)
+                if (rollup is not None and (since is None or oldest_in_block >= since)
+                        and (until is None or newest_in_block < until)):
+                    # the whole block is in the range: its counts will do
+                    for row in rollup:
+                        group = dict(zip((*ROLLUP_FIELDS, "day"), row))
+                        if all(group[field] == value for field, value in filters.items()):
+                            counts[group[group_by]] += row[-1]
+                    continue
+                for entry in segment.read(start, end):
+                    if ((until is not None and entry["timestamp"] >= until)
+                            or (since is not None and entry["timestamp"] < since)
+                            or any(entry.get(field) != value for field, value in filters.items())):
+                        continue
+                    # timestamps are ISO strings: the day is the first 10 characters
+                    counts[entry["timestamp"][:10] if group_by == "day" else entry.get(group_by)] += 1
+        return dict(counts)
+
+    def _readable_segments(self):
+        with self._segments_lock:
+            return [self._segment(number) for number in self._segment_numbers()]
+
+    # -----------------------------
+    # Retention
+    # -----------------------------
+    # Entries leave the store a whole segment at a time: a segment is expired
+    # once its newest entry is older than the cutoff.
+
+    def expired_batches(self, cutoff, batch_size=5000):
+        for segment in self._expired_segments(_timestamp(cutoff)):
+            entries = segment.read(0, segment.size)
+            if not entries:
+                self._remove(segment)
+                continue
+            for start in range(0, len(entries), batch_size):
+                batch = entries[start:start + batch_size]
+                for entry in batch:
+                    entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+                # the segment goes once its last batch is archived
+                last = start + batch_size >= len(entries)
+                yield batch, (lambda segment=segment: self._remove(segment)) if last else (lambda: None)
+
+    def apply_ttl(self, ttl):
+        if ttl is None:
+            return
+        for segment in self._expired_segments(_timestamp(datetime.utcnow() - ttl)):
+            self._remove(segment)
+
+    def _expired_segments(self, cutoff):
+        try:
+            with self._process_lock(), self._segments_lock:
+                numbers = self._segment_numbers()
+                if numbers:
+                    last = self._segment(numbers[-1], repair=True)
+                    if last.newest is not None and last.newest < cutoff:
+                        # the segment being written to expired as a whole:
+                        # start the next one, so segment numbers (and ids)
+                        # are never reused
+                        number = numbers[-1] + 1
+                        open(Segment(number, self.directory).path, "ab").close()  # pylint: disable=consider-using-with
+                        numbers.append(number)
+                segments = [self._segment(number) for number in numbers[:-1]]
+        except OSError as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+        return [segment for segment in segments
+                if segment.newest is None or segment.newest < cutoff]
+
+    def _remove(self, segment):
+        with self._process_lock(), self._segments_lock:
+            for path in (segment.path, segment.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    raise LogStoreUnavailable(str(exc)) from exc
+            self._segments.pop(segment.number, None)
+
+    def _segment_names(self):
+        return sorted(name for name in os.listdir(self.directory) if SEGMENT_NAME.match(name))
+
+    def _segment_numbers(self):
+        return [int(SEGMENT_NAME.match(name).group(1)) for name in self._segment_names()]
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def stats(self):
+        names = self._segment_names()
+        return {
+            "commits_total": self.commits,
+            "entries_written_total": self.entries_written,
+            "segments": len(names),
+            "bytes": sum(self._file_size(os.path.join(self.directory, name)) for name in names),
+        }
@@ -0,0 +1,129 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.connection import ConnectionFailure
+from mongoengine.queryset.visitor import Q
+from pymongo.errors import PyMongoError
+
+from ..models import ActivityLog
+from .base import LogBackend, LogStoreUnavailable
+
+
+TTL_INDEX = "timestamp_ttl"
+
+
+def _entry(document):
+    document["id"] = str(document.pop("_id"))
+    return document
+
+
+class MongoLogBackend(LogBackend):
+    """Entries are ActivityLog documents; ids are ObjectId hex strings"""
+
+    def write(self, entries):
+        # insert_many adds _id to the dicts it is given, so pass copies
+        documents = [dict(entry) for entry in entries]
+        if not documents:
+            return
+        try:
+            ActivityLog._get_collection().insert_many(  # pylint: disable=protected-access
+                documents, ordered=False)
+        except (PyMongoError, ConnectionFailure) as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+
+    def query(self, filters, since=None, until=None, before=None, limit=50):
+        conditions = Q(**filters)
+        if since is not None:
+            conditions &= Q(timestamp__gte=since)
+        if until is not None:
+            conditions &= Q(timestamp__lt=until)
+        if before is not None:
+            before_time, before_id = before
+            try:
+                before_id = ObjectId(before_id)
+            except (InvalidId, TypeError) as exc:
+                raise ValueError("Invalid cursor") from exc
+            conditions &= (Q(timestamp__lt=before_time) |
+                           Q(timestamp=before_time, id__lt=before_id))
+
+        try:
+            # every index ends with (timestamp, id): a range scan in this order
+            logs = list(ActivityLog.objects(conditions).order_by(  # pylint: disable=no-member
+                '-timestamp', '-id').limit(limit).as_pymongo())
+        except (PyMongoError, ConnectionFailure) as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+        return [_entry(log) for log in logs]
+
+    def aggregate(self, group_by, filters, since=None, until=None):
+        match = dict(filters)
+        if since is not None or until is not None:
+            match["timestamp"] = {}
+            if since is not None:
+                match["timestamp"]["$gte"] = since
+            if until is not None:
+                match["timestamp"]["$lt"] = until
+        if group_by == "day":
+            key = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+        else:
+            key = f"${group_by}"
+        # $match uses the same (field, timestamp) indexes as query()
+        pipeline = [{"$match": match}, {"$group": {"_id": key, "count": {"$sum": 1}}}]
+        try:
+            groups = ActivityLog._get_collection().aggregate(pipeline)  # pylint: disable=protected-access
+            return {group["_id"]: group["count"] for group in groups}
+        except (PyMongoError, ConnectionFailure) as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+
+    def expired_batches(self, cutoff, batch_size=5000):
+        try:
+            collection = ActivityLog._get_collection()  # pylint: disable=protected-access
+        except (PyMongoError, ConnectionFailure) as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+        expired = {"timestamp": {"$lt": cutoff}}
+        last = None
+        while True:
+            query = expired
+            if last is not None:
+                # keyset: continue after the last entry of the previous batch
+                query = {"$and": [expired, {"$or": [
+                    {"timestamp": {"$gt": last["timestamp"]}},
+                    {"timestamp": last["timestamp"], "_id": {"$gt": last["_id"]}},
+                ]}]}
+            try:
+                documents = list(collection.find(query).sort(
+                    [("timestamp", 1), ("_id", 1)]).limit(batch_size))
+            except (PyMongoError, ConnectionFailure) as exc:
+                raise LogStoreUnavailable(str(exc)) from exc
+            if not documents:
+                return
+            last = dict(documents[-1])
+            ids = [document["_id"] for document in documents]
+            yield [_entry(document) for document in documents], (
+                lambda ids=ids: self._delete(collection, ids))
+
+    @staticmethod
+    def _delete(collection, ids):
+        try:
+            collection.delete_many({"_id": {"$in": ids}})
+        except (PyMongoError, ConnectionFailure) as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
+
+    def apply_ttl(self, ttl):
+        # a TTL index: the server deletes expired documents about once a minute
+        try:
+            collection = ActivityLog._get_collection()  # pylint: disable=protected-access
+            existing = collection.index_information().get(TTL_INDEX)
+            if ttl is None:
+                if existing is not None:
+                    collection.drop_index(TTL_INDEX)
+                return
+            seconds = int(ttl.total_seconds())
+            if existing is None:
+                collection.create_index([("timestamp", 1)], name=TTL_INDEX,
+                                        expireAfterSeconds=seconds)
+            elif existing.get("expireAfterSeconds") != seconds:
+                # changes the expiry in place instead of rebuilding the index
+                collection.database.command(
+                    "collMod", collection.name,
+                    index={"name": TTL_INDEX, "expireAfterSeconds": seconds})
+        except (PyMongoError, ConnectionFailure) as exc:
+            raise LogStoreUnavailable(str(exc)) from exc
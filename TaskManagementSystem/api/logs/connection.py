@@ -0,0 +1,47 @@
+import threading
+
+from django.conf import settings
+from mongoengine import connect
+from mongoengine.connection import DEFAULT_CONNECTION_NAME, _connection_settings
+
+from ..metrics import mongo_command_listener
+
+# -----------------------------
+# Lazy MongoDB connection for the activity log store
+# -----------------------------
+# Nothing touches MongoDB at startup: the connection is registered on the
+# first log read or write (see ActivityLog._get_db), so management commands
+# and workers boot without resolving the mongodb+srv record, and the app
+# starts while the log store is unreachable. pymongo then connects in the
+# background and each operation waits at most SERVER_SELECTION_TIMEOUT_MS.
+
+_lock = threading.Lock()
+
+
+def client_options():
+    """MongoClient keyword arguments built from settings.MONGO"""
+    config = getattr(settings, "MONGO", {})
+    return {
+        "maxPoolSize": config.get("MAX_POOL_SIZE", 100),
+        "minPoolSize": config.get("MIN_POOL_SIZE", 0),
+        "connectTimeoutMS": config.get("CONNECT_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": config.get("SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": config.get("SOCKET_TIMEOUT_MS", 10000),
+        # times every command for the request metrics (api/metrics.py);
+        # pymongo only accepts listeners when the client is created
+        "event_listeners": [mongo_command_listener],
+    }
+
+
+def ensure_connection(alias=DEFAULT_CONNECTION_NAME):
+    """Register the log store connection unless it already is
+
+    A connection registered elsewhere first (tests, benchmarks using
+    mongomock) is left alone.
+    """
+    if alias in _connection_settings:
+        return
+    with _lock:
+        if alias not in _connection_settings:
+            connect(db=settings.MONGO_DB, host=settings.MONGO_URI, alias=alias,
+                    **client_options())
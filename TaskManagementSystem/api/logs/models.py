@@ -1,9 +1,35 @@
 from mongoengine import Document, StringField, DateTimeField
 from datetime import datetime
 
+from .connection import ensure_connection
+
 
 class ActivityLog(Document):
     user = StringField(required=True)
     action = StringField(required=True)
     task_id = StringField(required=True)
+    # the task's team, None for personal tasks
+    team_id = StringField(null=True)
+    # structured action, e.g. "task.created" (utils.py); `action` is the text
+    code = StringField(null=True)
     timestamp = DateTimeField(default=datetime.utcnow)
+
+    # every index ends with (timestamp, id) so that a filtered listing is
+    # served in keyset order straight from the index
+    meta = {
+        'ordering': ['-timestamp', '-id'],
+        'indexes': [
+            ('-timestamp', '-id'),
+            ('user', '-timestamp', '-id'),
+            ('task_id', '-timestamp', '-id'),
+            ('action', '-timestamp', '-id'),
+            ('team_id', '-timestamp', '-id'),
+            ('code', '-timestamp', '-id'),
+        ],
+    }
+
+    @classmethod
+    def _get_db(cls):
+        # every query, save and insert goes through here: connect on first use
+        ensure_connection(cls._meta.get('db_alias', 'default'))
+        return super()._get_db()
@@ -1,38 +1,270 @@
-from .models import ActivityLog
+from datetime import datetime, timezone
 
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import api_view, permission_classes
 
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor, get_page_size, split_page
+from ..membership_cache import role_of
+from ..models import Task, Team
+from .archive import aggregate_logs, query_logs
+from .backends import GROUP_FIELDS, LogStoreUnavailable, get_backend
+from .writer import get_writer
+
 # Utility function to log activity
+# entries are handed to the background writer so the request never waits on
+# the log store (settings.ACTIVITY_LOG_BACKEND)
+
+# structured action codes: timelines and aggregations filter and group by
+# these, `action` stays the human-readable text
+TASK_CREATED = "task.created"
+TASK_UPDATED = "task.updated"
+TASK_STATUS_CHANGED = "task.status_changed"
+TASK_DELETED = "task.deleted"
+
+
+def make_entry(user, action, task_id, code=None, team_id=None):
+    # naive UTC, the form every backend stores
+    return {
+        "user": user.username,
+        "action": action,
+        "code": code,
+        "task_id": str(task_id),
+        "team_id": str(team_id) if team_id is not None else None,
+        "timestamp": datetime.utcnow(),
+    }
+
+
+def log_activity(user, action, task_id, code=None, team_id=None):
+    entry = make_entry(user, action, task_id, code, team_id)
+    writer = get_writer()
+    if writer is None:
+        get_backend().write([entry])
+        return
+    writer.enqueue(entry)
+
+
+def log_activities(user, action, tasks, code=None):
+    """Log the same action for many tasks as one batch (e.g. bulk endpoints)"""
+    entries = [make_entry(user, action, task.id, code, task.for_team_id) for task in tasks]
+    if not entries:
+        return
+    writer = get_writer()
+    if writer is None:
+        get_backend().write(entries)
+        return
+    for entry in entries:
+        writer.enqueue(entry)
+
+
+def parse_log_time(value):
+    """Parse an ISO datetime into the naive UTC form the logs are stored in"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid datetime '{value}'")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def request_filters(request, fields):
+    """field -> value for the given fields present in the query string"""
+    filters = {}
+    for field in fields:
+        value = request.query_params.get(field)
+        if value:
+            filters[field] = value
+    return filters
+
+
+def unavailable():
+    return Response({"error": "The activity log store is unavailable"},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+def list_logs(request, filters):
+    """A page of logs matching `filters`, newest first, by (timestamp, id) cursor
+
+    Query params: since, until (ISO datetimes), limit and cursor (the
+    next_cursor of the previous page).
+    """
+    limit = get_page_size(request)
+    try:
+        since = request.query_params.get("since")
+        until = request.query_params.get("until")
+        before = None
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            cursor_time, cursor_id = decode_cursor(cursor)
+            before = (datetime.fromisoformat(cursor_time), cursor_id)
+        # entries past ACTIVITY_LOG_RETENTION['HOT_DAYS'] come from the archive
+        logs = query_logs(
+            filters,
+            since=parse_log_time(since) if since else None,
+            until=parse_log_time(until) if until else None,
+            before=before,
+            limit=limit + 1,
+        )
+    except (ValueError, TypeError, InvalidCursor) as exc:
+        return Response({"error": str(exc) or "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+    except LogStoreUnavailable:
+        return unavailable()
+    logs, has_more = split_page(logs, limit)
+
+    data = [
+        {
+            "id": log["id"],
+            "user": log["user"],
+            "action": log["action"],
+            # entries written before codes and teams were recorded lack them
+            "code": log.get("code"),
+            "task_id": log["task_id"],
+            "team_id": log.get("team_id"),
+            "timestamp": log["timestamp"].isoformat()
+        }
+        for log in logs
+    ]
+
+    next_cursor = None
+    if has_more:
+        last = logs[-1]
+        next_cursor = encode_cursor(
+            [last["timestamp"].isoformat(), last["id"]])
+
+    return Response({
+        "results": data,
+        "next_cursor": next_cursor,
+    })
 
 
-def log_activity(user, action, task_id):
-    ActivityLog(
-        user=user.username,
-        action=action,
-        task_id=str(task_id)
-    ).save()
+def count_logs(request, filters):
+    """Number of logs matching `filters` per group, counted by the log store
+
+    Query params: group_by (user, code, action, task_id, team_id or day; days
+    are UTC), since, until (ISO datetimes).
+    """
+    group_by = request.query_params.get("group_by", "day")
+    if group_by not in GROUP_FIELDS and group_by != "day":
+        return Response(
+            {"error": f"Invalid group_by. Must be one of: {', '.join((*GROUP_FIELDS, 'day'))}"},
+            status=status.HTTP_400_BAD_REQUEST)
+    try:
+        since = request.query_params.get("since")
+        until = request.query_params.get("until")
+        counts = aggregate_logs(
+            group_by, filters,
+            since=parse_log_time(since) if since else None,
+            until=parse_log_time(until) if until else None,
+        )
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    except LogStoreUnavailable:
+        return unavailable()
+
+    if group_by == "day":
+        # a timeline: oldest day first
+        groups = sorted(counts.items(), key=lambda item: item[0])
+    else:
+        groups = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+    return Response({
+        "group_by": group_by,
+        "results": [{"key": key, "count": count} for key, count in groups],
+        "total": sum(counts.values()),
+    })
 
 
 class ActivityLogView(APIView):
     # Only superusers can access
     permission_classes = [IsAuthenticated, IsAdminUser]
+    # filters that map one-to-one onto an ActivityLog field (and an index)
+    filter_fields = ["user", "task_id", "team_id", "action", "code"]
 
     def get(self, request):
-        logs = ActivityLog.objects.all()  # pylint: disable=no-member
-
-        data = [
-            {
-                "user": log.user,
-                "action": log.action,
-                "task_id": log.task_id,
-                "timestamp": log.timestamp.isoformat()
-            }
-            for log in logs
-        ]
-        return Response(data)
+        """List logs newest first; filters: user, task_id, team_id, action, code"""
+        return list_logs(request, request_filters(request, self.filter_fields))
+
+
+class ActivityLogStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    filter_fields = ActivityLogView.filter_fields
+
+    def get(self, request):
+        """Activity counts per user, day, ... across all logs"""
+        return count_logs(request, request_filters(request, self.filter_fields))
+
+
+class TaskActivityView(APIView):
+    permission_classes = [IsAuthenticated]
+    filter_fields = ["user", "code"]
+
+    def get(self, request, pk):
+        """Timeline of one task, for its creator, its assignee and its team's members
+
+        The timeline of a deleted task stays readable by whoever its log
+        entries show could see it: its creator and the members of its team.
+        """
+        task = Task.objects.filter(pk=pk).only(  # pylint: disable=no-member
+            "created_by_id", "assigned_to_id", "for_team_id").first()
+        user = request.user
+        if task is None:
+            try:
+                visible = user.is_superuser or self.deleted_task_visible(user, pk)
+            except LogStoreUnavailable:
+                return unavailable()
+        else:
+            visible = (user.is_superuser or user.id in (task.created_by_id, task.assigned_to_id)
+                       or (task.for_team_id and role_of(user, task.for_team_id)))
+        if not visible:
+            return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+        filters = request_filters(request, self.filter_fields)
+        filters["task_id"] = str(pk)
+        return list_logs(request, filters)
+
+    @staticmethod
+    def deleted_task_visible(user, pk):
+        # the newest entry (its deletion) names the task's last team, the
+        # creation entry its creator
+        newest = query_logs({"task_id": str(pk)}, limit=1)
+        if not newest:
+            return False
+        team_id = newest[0].get("team_id")
+        if team_id and role_of(user, int(team_id)):
+            return True
+        created = query_logs({"task_id": str(pk), "code": TASK_CREATED}, limit=1)
+        return bool(created) and created[0]["user"] == user.username
+
+
+class TeamActivityMixin:
+    permission_classes = [IsAuthenticated]
+    filter_fields = ["user", "task_id", "code"]
+
+    def team_filters(self, request, team_id):
+        """(filters, None) for a member, (None, error response) otherwise"""
+        if not Team.objects.filter(id=team_id).exists():  # pylint: disable=no-member
+            return None, Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not role_of(request.user, team_id):
+            return None, Response({"error": "You are not a member of this team"},
+                                  status=status.HTTP_403_FORBIDDEN)
+        filters = request_filters(request, self.filter_fields)
+        filters["team_id"] = str(team_id)
+        return filters, None
+
+
+class TeamActivityView(TeamActivityMixin, APIView):
+    def get(self, request, team_id):
+        """Timeline of a team's tasks; filters: user, task_id, code"""
+        filters, error = self.team_filters(request, team_id)
+        return error or list_logs(request, filters)
+
+
+class TeamActivityStatsView(TeamActivityMixin, APIView):
+    def get(self, request, team_id):
+        """Activity counts of a team per member (group_by=user), per day, ..."""
+        filters, error = self.team_filters(request, team_id)
+        return error or count_logs(request, filters)
 
 
 @api_view(['GET'])
@@ -0,0 +1,210 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from .backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+# queued by stop() to wake a worker waiting on an empty queue; never written
+_WAKE = object()
+
+
+def write_to_backend(entries):
+    """Default sink: hand the batch to the configured log backend in one call"""
+    get_backend().write(entries)
+
+
+class ActivityLogWriter:
+    """Bounded in-process queue drained by a worker thread in batches.
+
+    Entries are flushed when `batch_size` of them are waiting or when
+    `flush_interval` seconds have passed, whichever comes first.
+    """
+
+    def __init__(self, max_queue_size=10000, batch_size=500, flush_interval=1.0,
+                 overflow_policy="drop_oldest", block_timeout=0.5, sink=write_to_backend):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy '{overflow_policy}'. Must be one of: {', '.join(OVERFLOW_POLICIES)}")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.sink = sink
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+
+    def enqueue(self, entry):
+        """Queue one log document. Returns False if it was dropped"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            if not self._handle_overflow(entry):
+                self._count("dropped")
+                return False
+        self._count("queued")
+        return True
+
+    def _handle_overflow(self, entry):
+        if self.overflow_policy == "block":
+            try:
+                self._queue.put(entry, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                return False
+
+        if self.overflow_policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(entry)
+                return True
+            except queue.Full:
+                return False
+
+        return False
+
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self.queued,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "pending": self._queue.qsize(),
+            }
+
+    # -----------------------------
+    # Worker side
+    # -----------------------------
+
+    def _ensure_started(self):
+        # a worker thread does not survive fork(), so restart it in each
+        # process (e.g. pre-forked server workers)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="activity-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining > 0 and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if item is not _WAKE:
+                    batch.append(item)
+                batch.extend(self._drain(self.batch_size - len(batch)))
+                continue
+
+            self._flush(batch)
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+
+        # shutting down: write out everything that is still waiting
+        batch.extend(self._drain())
+        for start in range(0, len(batch), self.batch_size):
+            self._flush(batch[start:start + self.batch_size])
+
+    def _drain(self, limit=None):
+        items = []
+        while limit is None or len(items) < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _WAKE:
+                items.append(item)
+        return items
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self.sink(batch)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception(
+                "Failed to write %d activity log entries", len(batch))
+            self._count("failed", len(batch))
+        else:
+            self._count("flushed", len(batch))
+
+    def stop(self, timeout=5.0):
+        """Stop the worker and flush whatever is still queued"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            self._flush(self._drain())
+            return
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # a full queue: the worker is not waiting on it
+        thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide writer, or None when async logging is disabled"""
+    global _writer  # pylint: disable=global-statement
+    config = getattr(settings, "ACTIVITY_LOG_WRITER", {})
+    if not config.get("ASYNC", True):
+        return None
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ActivityLogWriter(
+                    max_queue_size=config.get("MAX_QUEUE_SIZE", 10000),
+                    batch_size=config.get("BATCH_SIZE", 500),
+                    flush_interval=config.get("FLUSH_INTERVAL", 1.0),
+                    overflow_policy=config.get(
+                        "OVERFLOW_POLICY", "drop_oldest"),
+                    block_timeout=config.get("BLOCK_TIMEOUT", 0.5),
+                )
+                atexit.register(_writer.stop)
+    return _writer
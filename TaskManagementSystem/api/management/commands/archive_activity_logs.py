@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.logs.archive import retention, run_retention
+from api.logs.backends import LogStoreUnavailable
+
+
+class Command(BaseCommand):
+    help = ("Move activity log entries older than ACTIVITY_LOG_RETENTION['HOT_DAYS'] "
+            "into the archive, then compact and expire archived partitions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hot-days", type=int,
+                            help="Override HOT_DAYS")
+        parser.add_argument("--ttl-days", type=int,
+                            help="Override TTL_DAYS (0: no TTL)")
+        parser.add_argument("--compact-after-days", type=int,
+                            help="Override COMPACT_AFTER_DAYS")
+        parser.add_argument("--archive-days", type=int,
+                            help="Override ARCHIVE_DAYS (0: keep)")
+
+    def handle(self, *args, **options):
+        config = retention()
+        for key in ("hot_days", "ttl_days", "compact_after_days", "archive_days"):
+            if options[key] is not None:
+                config[key.upper()] = options[key]
+        if config["TTL_DAYS"] and config["TTL_DAYS"] <= config["HOT_DAYS"]:
+            raise CommandError(
+                f"TTL_DAYS ({config['TTL_DAYS']}) must be above HOT_DAYS ({config['HOT_DAYS']}), "
+                "or entries expire before they are archived")
+
+        try:
+            result = run_retention(config)
+        except (LogStoreUnavailable, OSError) as exc:
+            # nothing is deleted from the store before it is archived: run again
+            raise CommandError(f"Retention stopped: {exc}") from exc
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['archived']} entries into {result['partitions_written']} partitions, "
+            f"compacted {result['compacted_months']} months, "
+            f"dropped {result['dropped_partitions']} partitions"))
@@ -0,0 +1,141 @@
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmarks.data import seed_dataset
+from api.models import User
+
+# sync path -> async path of the same endpoint; {team} is filled in per request
+ENDPOINTS = {
+    "my_teams": ("/api/teams/", "/api/async/teams/"),
+    "team_details": ("/api/teams/{team}/details/", "/api/async/teams/{team}/details/"),
+    "team_members": ("/api/teams/{team}/members/", "/api/async/teams/{team}/members/"),
+    "my_team_tasks": ("/api/teams/{team}/tasks/my-tasks/",
+                      "/api/async/teams/{team}/tasks/my-tasks/"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare throughput and latency of "
+        "the sync team read endpoints against their async versions under "
+        "concurrent load. Requests go through Django's request handlers in "
+        "process (test Client / AsyncClient), without a network or server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--teams", type=int, default=50)
+        parser.add_argument("--members-per-team", type=int, default=20)
+        parser.add_argument("--tasks", type=int, default=20000)
+        parser.add_argument("--requests", type=int, default=400,
+                            help="Requests per endpoint and mode")
+        parser.add_argument("--concurrency", type=int, default=16,
+                            help="Threads (sync) or in-flight tasks (async)")
+        parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS),
+                            help="Only benchmark this endpoint (repeatable)")
+        parser.add_argument("--response-cache", action="store_true",
+                            help="Keep the team response cache enabled (default: "
+                                 "disabled, so every request hits the database)")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        caches = dict(settings.CACHES)
+        if not options["response_cache"]:
+            caches[settings.RESPONSE_CACHE_ALIAS] = {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+
+        creation = connection.creation
+        old_name = connection.settings_dict["NAME"]
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+        try:
+            with override_settings(CACHES=caches):
+                self.run(options)
+        finally:
+            teardown_test_environment()
+            creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        self.stdout.write("Seeding dataset...")
+        dataset = seed_dataset(
+            users=options["users"], teams=options["teams"],
+            members_per_team=options["members_per_team"],
+            tasks=options["tasks"], seed=options["seed"])
+
+        # (team, member token) pairs to request as
+        rng = random.Random(options["seed"])
+        tokens = {}
+        plan = []
+        for _ in range(options["requests"]):
+            team_id = rng.choice(dataset["team_ids"])
+            user_id = rng.choice(dataset["team_members"][team_id])
+            if user_id not in tokens:
+                tokens[user_id] = str(AccessToken.for_user(User(id=user_id)))
+            plan.append((team_id, tokens[user_id]))
+
+        endpoints = options["endpoint"] or sorted(ENDPOINTS)
+        concurrency = options["concurrency"]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['requests']} requests per run, concurrency {concurrency}"))
+        for name in endpoints:
+            sync_path, async_path = ENDPOINTS[name]
+            # warm up connections and caches outside the measurement
+            self.run_sync(sync_path, plan[:concurrency], concurrency)
+            self.run_async(async_path, plan[:concurrency], concurrency)
+            for mode, result in (
+                    ("sync", self.run_sync(sync_path, plan, concurrency)),
+                    ("async", self.run_async(async_path, plan, concurrency))):
+                self.report(name, mode, *result)
+
+    def run_sync(self, path, plan, concurrency):
+        def call(item):
+            team_id, token = item
+            client = Client()
+            started = time.perf_counter()
+            response = client.get(path.format(team=team_id),
+                                  HTTP_AUTHORIZATION=f"Bearer {token}")
+            return (time.perf_counter() - started) * 1000, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(call, plan))
+        return time.perf_counter() - started, results
+
+    def run_async(self, path, plan, concurrency):
+        async def main():
+            client = AsyncClient()
+            limit = asyncio.Semaphore(concurrency)
+
+            async def call(item):
+                team_id, token = item
+                async with limit:
+                    started = time.perf_counter()
+                    response = await client.get(path.format(team=team_id),
+                                                headers={"Authorization": f"Bearer {token}"})
+                    return (time.perf_counter() - started) * 1000, response.status_code
+
+            started = time.perf_counter()
+            results = await asyncio.gather(*(call(item) for item in plan))
+            return time.perf_counter() - started, results
+
+        return asyncio.run(main())
+
+    def report(self, name, mode, elapsed, results):
+        timings = [timing for timing, _ in results]
+        failures = sum(1 for _, code in results if code != 200)
+        p99 = statistics.quantiles(timings, n=100)[-1] if len(timings) > 1 else timings[0]
+        line = (f"  {name:<14} {mode:<5} {len(results) / elapsed:>8.1f} req/s  "
+                f"p50 {statistics.median(timings):>8.2f} ms  p99 {p99:>8.2f} ms")
+        if failures:
+            line += self.style.ERROR(f"  ({failures} non-200 responses)")
+        self.stdout.write(line)
@@ -0,0 +1,346 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from api.auth import ClaimsTokenObtainPairSerializer
+from api.benchmarks.data import NOUNS, USERNAME_PREFIX, seed_activity_logs, seed_dataset
+from api.changes import head_cursor
+from api.counters import rebuild_counters
+from api.events import issue_ticket
+from api.models import Task, TeamMembership
+from api.search import rebuild_index
+
+SCALES = {
+    "small": {"users": 200, "teams": 20, "members_per_team": 10, "tasks": 5000, "logs": 5000},
+    "medium": {"users": 2000, "teams": 200, "members_per_team": 25, "tasks": 50000, "logs": 50000},
+    "large": {"users": 10000, "teams": 1000, "members_per_team": 25, "tasks": 200000,
+              "logs": 200000},
+}
+
+METRICS_TOKEN = "bench-metrics"
+SERVER_TIMING = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) \w+")?')
+
+
+# -----------------------------
+# Requests per route
+# -----------------------------
+# Each builder gets the scale context and the iteration number and returns
+# the request to time; anything it does itself (creating a task to delete,
+# say) is not timed. Keys are (url name, method).
+
+def _team(ctx, path):
+    return f"/api/teams/{ctx.team_id}/{path}"
+
+
+def _new_task(user, **fields):
+    return Task.objects.create(  # pylint: disable=no-member
+        title="Bench task", created_by=user, **fields)
+
+
+ROUTES = {
+    ("get_tasks", "GET"): lambda ctx, i: {"path": "/api/tasks/?limit=50"},
+    ("bulk_tasks", "POST"): lambda ctx, i: {
+        "path": "/api/tasks/bulk/",
+        "data": [{"title": f"Bulk {i} {n}", "priority": "low"} for n in range(20)]},
+    ("task_changes", "GET"): lambda ctx, i: {"path": f"/api/tasks/changes/?cursor={ctx.change_cursor}"},
+    ("search_tasks", "GET"): lambda ctx, i: {
+        "path": f"/api/tasks/search/?q={ctx.rng.choice(NOUNS)}&limit=20"},
+    ("create_task", "GET"): lambda ctx, i: {"path": f"/api/tasks/{ctx.rng.choice(ctx.own_task_ids)}/"},
+    ("create_task", "PATCH"): lambda ctx, i: {
+        "path": f"/api/tasks/{ctx.rng.choice(ctx.own_task_ids)}/",
+        "data": {"priority": ctx.rng.choice(["low", "medium", "high"])}},
+    ("create_task", "DELETE"): lambda ctx, i: {"path": f"/api/tasks/{_new_task(ctx.actor).id}/"},
+    ("task_activity", "GET"): lambda ctx, i: {
+        "path": f"/api/tasks/{ctx.rng.choice(ctx.own_task_ids)}/activity/?limit=50"},
+    # password hashing dominates registration, so it gets few iterations
+    ("register", "POST"): lambda ctx, i: {
+        "path": "/api/register/", "anonymous": True, "iterations": 5,
+        "data": {"username": f"bench_register_{ctx.scale}_{i}",
+                 "email": f"register{i}@example.com", "password": "bench-password-123"}},
+    ("user_profile", "GET"): lambda ctx, i: {"path": "/api/profile/"},
+    ("user_profile", "PATCH"): lambda ctx, i: {"path": "/api/profile/", "data": {"bio": f"bio {i}"}},
+    ("activity_logs", "GET"): lambda ctx, i: {"path": "/api/logs/?limit=50"},
+    ("activity_log_stats", "GET"): lambda ctx, i: {
+        "path": f"/api/logs/stats/?group_by={['user', 'day', 'code'][i % 3]}"},
+    ("check_superuser", "GET"): lambda ctx, i: {"path": "/api/check-superuser/"},
+    ("metrics", "GET"): lambda ctx, i: {
+        "path": "/api/metrics/", "anonymous": True,
+        "headers": {"Authorization": f"Bearer {METRICS_TOKEN}"}},
+    ("my_teams", "GET"): lambda ctx, i: {"path": "/api/teams/"},
+    ("create_team", "POST"): lambda ctx, i: {
+        "path": "/api/teams/create/", "data": {"name": f"Bench created {i}"}},
+    ("add_member_to_team", "POST"): lambda ctx, i: {
+        "path": _team(ctx, "add-member/"),
+        "data": {"username": ctx.candidates[i % len(ctx.candidates)]}},
+    ("available_users", "GET"): lambda ctx, i: {
+        "path": _team(ctx, f"available-users/?q={USERNAME_PREFIX}{ctx.rng.randint(0, 9)}")},
+    ("team_members", "GET"): lambda ctx, i: {"path": _team(ctx, "members/")},
+    ("team_details", "GET"): lambda ctx, i: {"path": _team(ctx, "details/")},
+    ("team_summary", "GET"): lambda ctx, i: {"path": _team(ctx, "summary/")},
+    ("team_tasks", "GET"): lambda ctx, i: {"path": _team(ctx, "tasks/?limit=50")},
+    ("create_team_task", "POST"): lambda ctx, i: {
+        "path": _team(ctx, "tasks/create/"),
+        "data": {"title": f"Team task {i}", "assigned_to": ctx.member.username}},
+    ("my_team_tasks", "GET"): lambda ctx, i: {"path": _team(ctx, "tasks/my-tasks/")},
+    ("update_team_task_status", "PATCH"): lambda ctx, i: {
+        "path": _team(ctx, f"tasks/{ctx.rng.choice(ctx.assigned_task_ids)}/update-status/"),
+        "data": {"status": ["pending", "in-progress", "completed"][i % 3]}},
+    ("delete_team_task", "DELETE"): lambda ctx, i: {
+        "path": _team(ctx, f"tasks/{_new_task(ctx.actor, for_team_id=ctx.team_id).id}/delete/")},
+    ("team_member_tasks", "GET"): lambda ctx, i: {"path": _team(ctx, f"members/{ctx.member.id}/tasks/")},
+    ("team_events_ticket", "POST"): lambda ctx, i: {"path": _team(ctx, "events/ticket/")},
+    # only served under ASGI: measures the time until the stream's first chunk
+    ("team_events", "GET"): lambda ctx, i: {
+        "path": _team(ctx, f"events/?ticket={issue_ticket(ctx.actor.id, ctx.team_id)}"),
+        "asgi": True},
+    ("team_activity", "GET"): lambda ctx, i: {"path": _team(ctx, "activity/?limit=50")},
+    ("team_activity_stats", "GET"): lambda ctx, i: {
+        "path": _team(ctx, f"activity/stats/?group_by={['user', 'day'][i % 2]}")},
+    ("async_my_teams", "GET"): lambda ctx, i: {"path": "/api/async/teams/"},
+    ("async_team_details", "GET"): lambda ctx, i: {"path": f"/api/async/teams/{ctx.team_id}/details/"},
+    ("async_team_members", "GET"): lambda ctx, i: {"path": f"/api/async/teams/{ctx.team_id}/members/"},
+    ("async_my_team_tasks", "GET"): lambda ctx, i: {
+        "path": f"/api/async/teams/{ctx.team_id}/tasks/my-tasks/"},
+}
+
+
+async def open_stream(path):
+    """GET a streaming route through the ASGI handler, up to its first chunk"""
+    response = await AsyncClient().get(path)
+    if response.streaming:
+        chunks = aiter(response.streaming_content)
+        await anext(chunks, None)
+        await chunks.aclose()
+    return response
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed throwaway test databases at one or more scales and measure latency "
+        "percentiles and SQL/Mongo command counts of every route in api/urls.py. "
+        "The Mongo log store is replaced by mongomock. Results are written as JSON "
+        "and can be compared with an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", action="append", choices=sorted(SCALES),
+                            help="Dataset size (repeatable; default: small)")
+        parser.add_argument("--iterations", type=int, default=30,
+                            help="Timed requests per route and scale")
+        parser.add_argument("--route", action="append",
+                            help="Only benchmark this url name (repeatable)")
+        parser.add_argument("--output", default="bench-results.json")
+        parser.add_argument("--compare", help="Earlier results file to compare against")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Relative p50 slowdown reported as a regression")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            import mongomock  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise CommandError("bench_endpoints needs mongomock: pip install mongomock") from exc
+
+        uncovered = sorted({pattern.name for pattern in api_urls.urlpatterns}
+                           - {name for name, _ in ROUTES})
+        if uncovered:
+            self.stderr.write(self.style.WARNING(
+                f"Routes without a benchmark request: {', '.join(uncovered)}"))
+
+        self.use_mongo_stand_in(mongomock)
+        results = {
+            "commit": self.git_commit(),
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "uncovered_routes": uncovered,
+            "scales": {},
+        }
+        overrides = {
+            # write activity logs inline, so their cost lands in the request
+            "ACTIVITY_LOG_WRITER": dict(settings.ACTIVITY_LOG_WRITER, ASYNC=False),
+            # every request reports its query counts through Server-Timing
+            "REQUEST_METRICS": {"SAMPLE_RATE": 1.0, "SERVER_TIMING": True,
+                                "TOKEN": METRICS_TOKEN},
+            # events stay in the process: no channel to publish to
+            "EVENT_STREAM": dict(settings.EVENT_STREAM, ENABLED=True, CHANNEL_URL=""),
+        }
+        setup_test_environment()
+        try:
+            with override_settings(**overrides):
+                for scale in options["scale"] or ["small"]:
+                    results["scales"][scale] = self.run_scale(scale, options)
+        finally:
+            teardown_test_environment()
+
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options["compare"]:
+            self.compare(options["compare"], results, options["threshold"])
+
+    @staticmethod
+    def use_mongo_stand_in(mongomock):
+        from mongoengine import connect, disconnect  # pylint: disable=import-outside-toplevel
+        disconnect(alias="default")
+        connect(db=settings.MONGO_DB, host="mongodb://localhost", alias="default",
+                mongo_client_class=mongomock.MongoClient)
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_scale(self, scale, options):
+        params = SCALES[scale]
+        creation = connection.creation
+        old_name = connection.settings_dict["NAME"]
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Scale {scale}: {params}"))
+            ctx = self.seed(scale, params, options["seed"])
+            routes = {}
+            for (name, method), build in ROUTES.items():
+                if options["route"] and name not in options["route"]:
+                    continue
+                result = self.measure(ctx, method, build, options["iterations"])
+                routes[f"{name} {method}"] = result
+                self.stdout.write(
+                    f"  {name + ' ' + method:<32} p50 {result['p50_ms']:>8.2f} ms  "
+                    f"p99 {result['p99_ms']:>8.2f} ms  queries {result['queries_median']:>4}  "
+                    f"mongo {result['mongo_median']:>3}  {result['status_codes']}")
+            return {"params": params, "routes": routes}
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, scale, params, seed):
+        started = time.perf_counter()
+        dataset = seed_dataset(users=params["users"], teams=params["teams"],
+                               members_per_team=params["members_per_team"],
+                               tasks=params["tasks"], seed=seed)
+        # bulk_create skips the signal receivers that maintain these
+        rebuild_counters()
+        rebuild_index()
+
+        team_id = dataset["team_ids"][0]
+        members = dataset["team_members"][team_id]
+        # the team owner acts in every request; admin rights cover the
+        # superuser-only routes
+        actor = User.objects.get(id=members[0])
+        actor.is_staff = actor.is_superuser = True
+        actor.save()
+        member = User.objects.get(id=members[1])
+
+        own_task_ids = list(Task.objects.filter(  # pylint: disable=no-member
+            created_by=actor).values_list("id", flat=True)[:200]) or [_new_task(actor).id]
+        assigned_task_ids = [_new_task(actor, for_team_id=team_id, assigned_to=actor).id
+                             for _ in range(10)]
+        member_ids = set(TeamMembership.objects.filter(  # pylint: disable=no-member
+            team_id=team_id).values_list("user_id", flat=True))
+        candidates = list(User.objects.filter(username__startswith=USERNAME_PREFIX).exclude(
+            id__in=member_ids).values_list("username", flat=True)[:500])
+
+        usernames = list(User.objects.values_list("username", flat=True))
+        tasks = list(Task.objects.values_list("id", "for_team_id")[:10000])  # pylint: disable=no-member
+        # the bench team gets its share of entries, like any other
+        tasks += list(Task.objects.filter(  # pylint: disable=no-member
+            for_team_id=team_id).values_list("id", "for_team_id")[:100])
+        seed_activity_logs(usernames, tasks, count=params["logs"], seed=seed)
+        self.stdout.write(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {ClaimsTokenObtainPairSerializer.get_token(actor).access_token}")
+        return SimpleNamespace(
+            scale=scale, rng=random.Random(seed), team_id=team_id, actor=actor, member=member,
+            client=client, anonymous=APIClient(), own_task_ids=own_task_ids,
+            assigned_task_ids=assigned_task_ids, candidates=candidates,
+            change_cursor=head_cursor(),
+        )
+
+    @staticmethod
+    def measure(ctx, method, build, iterations):
+        timings, queries, mongo, codes = [], [], [], {}
+        # the first request is a warm-up and is not recorded
+        for i in range(iterations + 1):
+            request = build(ctx, i)
+            if i > request.get("iterations", iterations):
+                break
+            client = ctx.anonymous if request.get("anonymous") else ctx.client
+            started = time.perf_counter()
+            if request.get("asgi"):
+                response = async_to_sync(open_stream)(request["path"])
+            else:
+                response = client.generic(
+                    method, request["path"],
+                    json.dumps(request["data"]) if "data" in request else "",
+                    content_type="application/json", headers=request.get("headers"))
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.streaming:
+                response.close()
+            if i == 0:
+                continue
+            timings.append(elapsed)
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+            # mongomock does not emit pymongo command events, so the Mongo
+            # count stays 0 unless the command is pointed at a real server
+            counts = {name: int(count or 0) for name, _, count in SERVER_TIMING.findall(
+                response.get("Server-Timing", ""))}
+            queries.append(counts.get("db", 0))
+            mongo.append(counts.get("mongo", 0))
+
+        ordered = sorted(timings)
+        return {
+            "method": method,
+            "iterations": len(timings),
+            "p50_ms": statistics.median(ordered),
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "mean_ms": statistics.fmean(ordered),
+            "queries_median": int(statistics.median(queries)),
+            "queries_max": max(queries),
+            "mongo_median": int(statistics.median(mongo)),
+            "status_codes": {str(code): count for code, count in sorted(codes.items())},
+        }
+
+    def compare(self, path, results, threshold):
+        with open(path, encoding="utf-8") as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {path} (commit {previous.get('commit')})"))
+        regressions = 0
+        for scale, scale_results in results["scales"].items():
+            before_routes = previous.get("scales", {}).get(scale, {}).get("routes", {})
+            for route, after in scale_results["routes"].items():
+                before = before_routes.get(route)
+                if before is None:
+                    continue
+                change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] else 0
+                more_queries = after["queries_median"] > before["queries_median"]
+                line = (f"  {scale:<7}{route:<34} p50 {before['p50_ms']:>8.2f} -> "
+                        f"{after['p50_ms']:>8.2f} ms ({change:+.0%})  queries "
+                        f"{before['queries_median']} -> {after['queries_median']}")
+                if change > threshold or more_queries:
+                    regressions += 1
+                    line = self.style.ERROR(line)
+                self.stdout.write(line)
+        self.stdout.write(f"{regressions} possible regressions")
+
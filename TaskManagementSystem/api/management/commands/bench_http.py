@@ -0,0 +1,53 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a running server over HTTP with concurrent GET requests and report "
+        "throughput and latency percentiles, to compare serving setups "
+        "(runserver, gunicorn workers, ASGI) against the same endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Full URL, e.g. http://127.0.0.1:8000/api/teams/1/details/")
+        parser.add_argument("--token", help="JWT access token sent as a Bearer header")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--warmup", type=int, default=50)
+
+    def handle(self, *args, **options):
+        headers = {"Authorization": f"Bearer {options['token']}"} if options["token"] else {}
+        errors = []
+        errors_lock = threading.Lock()
+
+        def call(_):
+            request = urllib.request.Request(options["url"], headers=headers)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError) as exc:
+                with errors_lock:
+                    errors.append(exc)
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(call, range(options["warmup"])))
+            if errors:
+                raise CommandError(f"Warm-up failed: {errors[0]}")
+            started = time.perf_counter()
+            timings = list(pool.map(call, range(options["requests"])))
+            elapsed = time.perf_counter() - started
+
+        p99 = statistics.quantiles(timings, n=100)[-1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f"{options['requests']} requests, concurrency {options['concurrency']}: "
+            f"{len(timings) / elapsed:.1f} req/s, p50 {statistics.median(timings):.2f} ms, "
+            f"p99 {p99:.2f} ms, {len(errors)} errors")
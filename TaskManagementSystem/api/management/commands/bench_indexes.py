@@ -0,0 +1,126 @@
+import random
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.benchmarks.data import seed_dataset
+from api.models import Task, TeamMembership
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare query plans and timings of "
+        "the hot Task/TeamMembership queries without and with their indexes."
+    )
+
+    # "without" is the schema as of this migration: only the single-column
+    # foreign key indexes; "with" is the fully migrated schema
+    baseline_migration = "0003_remove_profile_role"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--teams", type=int, default=200)
+        parser.add_argument("--members-per-team", type=int, default=25)
+        parser.add_argument("--tasks", type=int, default=200000)
+        parser.add_argument("--repeat", type=int, default=200,
+                            help="Executions of each query per phase")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        creation = connection.creation
+        old_name = connection.settings_dict["NAME"]
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command("migrate", "api", self.baseline_migration, verbosity=0)
+            self.stdout.write("Seeding dataset...")
+            started = time.perf_counter()
+            dataset = seed_dataset(
+                users=options["users"], teams=options["teams"],
+                members_per_team=options["members_per_team"],
+                tasks=options["tasks"], seed=options["seed"])
+            self.stdout.write(
+                f"Seeded {options['tasks']} tasks in {time.perf_counter() - started:.1f}s\n")
+
+            queries = self.build_queries(dataset)
+
+            self.analyze()
+            before = self.run_phase(
+                "WITHOUT indexes", queries, options["repeat"], options["seed"])
+            call_command("migrate", "api", verbosity=0)
+            self.analyze()
+            after = self.run_phase(
+                "WITH indexes", queries, options["repeat"], options["seed"])
+
+            self.stdout.write(self.style.MIGRATE_HEADING("Summary (median ms)"))
+            for name in queries:
+                speedup = before[name] / after[name] if after[name] else float("inf")
+                self.stdout.write(
+                    f"  {name:<22} {before[name]:>9.3f} -> {after[name]:>9.3f}  ({speedup:.1f}x)")
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
+
+    def build_queries(self, dataset):
+        """Each query takes a random.Random and returns a queryset to evaluate"""
+        user_ids = dataset["user_ids"]
+        team_members = dataset["team_members"]
+        team_ids = dataset["team_ids"]
+
+        def owner_status(rng):
+            return Task.objects.filter(  # pylint: disable=no-member
+                created_by_id=rng.choice(user_ids), status="pending")
+
+        def team_assignee(rng):
+            team_id = rng.choice(team_ids)
+            return Task.objects.filter(  # pylint: disable=no-member
+                for_team_id=team_id, assigned_to_id=rng.choice(team_members[team_id])
+            ).order_by("-created_at")
+
+        def team_recent(rng):
+            return Task.objects.filter(  # pylint: disable=no-member
+                for_team_id=rng.choice(team_ids)).order_by("-created_at")[:50]
+
+        def membership(rng):
+            team_id = rng.choice(team_ids)
+            return TeamMembership.objects.filter(  # pylint: disable=no-member
+                team_id=team_id, user_id=rng.choice(user_ids))
+
+        return {
+            "owner_status": owner_status,
+            "team_assignee": team_assignee,
+            "team_recent": team_recent,
+            "membership_lookup": membership,
+        }
+
+    def run_phase(self, label, queries, repeat, seed):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        medians = {}
+        for name, build in queries.items():
+            # same seed in both phases, so both time the same parameters
+            rng = random.Random(seed)
+            plan = build(random.Random(seed)).explain()
+            timings = []
+            for _ in range(repeat):
+                queryset = build(rng)
+                started = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - started) * 1000)
+            medians[name] = statistics.median(timings)
+            self.stdout.write(
+                f"  {name}: median {medians[name]:.3f} ms, "
+                f"p95 {statistics.quantiles(timings, n=20)[-1]:.3f} ms")
+            for line in plan.splitlines():
+                self.stdout.write(f"      {line}")
+        self.stdout.write("")
+        return medians
+
+    def analyze(self):
+        # refresh planner statistics so both phases are planned from current data
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+            elif connection.vendor == "mysql":
+                cursor.execute(f"ANALYZE TABLE {Task._meta.db_table}, "  # pylint: disable=protected-access
+                               f"{TeamMembership._meta.db_table}")  # pylint: disable=protected-access
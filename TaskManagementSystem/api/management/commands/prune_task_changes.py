@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete task change feed entries older than TASK_CHANGES['RETENTION_DAYS']."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int,
+                            help="Override the retention period")
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} task changes"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import rebuild_counters
+from api.models import TeamTaskCounter
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-team task counters (TeamTaskCounter) from the Task table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team", type=int, action="append", dest="team_ids",
+                            help="Only rebuild this team (repeatable)")
+
+    def handle(self, *args, **options):
+        rebuild_counters(options["team_ids"])
+        counters = TeamTaskCounter.objects.all()  # pylint: disable=no-member
+        if options["team_ids"]:
+            counters = counters.filter(team_id__in=options["team_ids"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counters.count()} counter rows"))
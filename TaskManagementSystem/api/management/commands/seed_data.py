@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarks.data import USERNAME_PREFIX, seed_dataset
+from api.counters import rebuild_counters
+from api.models import Task
+from api.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a large, reproducible synthetic dataset (users, "
+        "profiles, teams, memberships, tasks) for local testing at production "
+        "scale, then rebuild the task counters (and optionally the search index)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--teams", type=int, default=1000)
+        parser.add_argument("--members-per-team", type=int, default=20)
+        parser.add_argument("--tasks", type=int, default=1000000)
+        parser.add_argument("--seed", type=int, default=42,
+                            help="Same seed and sizes give the same dataset")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--password",
+                            help="Password of every seeded user (default: none, login disabled)")
+        parser.add_argument("--keep-indexes", action="store_true",
+                            help="Insert with the Task indexes in place instead of "
+                                 "dropping them and building them afterwards")
+        parser.add_argument("--search-index", action="store_true",
+                            help="Also rebuild the search index; several times slower than "
+                                 "the seeding itself (about 6 minutes per million tasks on SQLite)")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError(
+                f"Users named {USERNAME_PREFIX}* already exist; seed an empty database")
+
+        started = time.perf_counter()
+        # building an index once over the loaded table is much cheaper than
+        # updating it row by row
+        indexes = [] if options["keep_indexes"] else Task._meta.indexes  # pylint: disable=protected-access
+        self.alter_indexes("remove_index", indexes)
+        try:
+            seed_dataset(
+                users=options["users"], teams=options["teams"],
+                members_per_team=options["members_per_team"], tasks=options["tasks"],
+                seed=options["seed"], batch_size=options["batch_size"],
+                password=options["password"])
+            self.step("Inserted rows", started)
+
+            step_started = time.perf_counter()
+            # bulk inserts skip the signal receivers that maintain these
+            rebuild_counters()
+            self.step("Rebuilt task counters", step_started)
+        finally:
+            step_started = time.perf_counter()
+            self.alter_indexes("add_index", indexes)
+        if indexes:
+            self.step(f"Built {len(indexes)} task indexes", step_started)
+
+        if options["search_index"]:
+            step_started = time.perf_counter()
+            rebuild_index(options["batch_size"])
+            self.step("Rebuilt search index", step_started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['users']} users, {options['teams']} teams and "
+            f"{options['tasks']} tasks in {time.perf_counter() - started:.1f}s"))
+        if not options["search_index"]:
+            self.stdout.write(self.style.WARNING(
+                "The search index was not rebuilt; run `manage.py rebuild_search_index`"))
+
+    @staticmethod
+    def alter_indexes(operation, indexes):
+        if not indexes:
+            return
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                getattr(schema_editor, operation)(Task, index)
+
+    def step(self, message, started):
+        self.stdout.write(f"  {message} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,91 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import TeamMembership
+
+# -----------------------------
+# Team membership / role cache
+# -----------------------------
+# Maps (team_id, user_id) to the user's role_in_team. Non-members are cached
+# too, as NOT_A_MEMBER, so repeated "is this user in the team?" checks stay
+# off the database. Entries expire after the cache alias TIMEOUT and are
+# deleted by the TeamMembership post_save/post_delete receivers in signals.py.
+#
+# The default alias is an in-process LocMemCache (LRU once MAX_ENTRIES is
+# reached). With several worker processes, point MEMBERSHIP_CACHE at a shared
+# backend so an invalidation reaches every worker, not just the local one.
+# Either way, checks that guard a write pass fresh=True and read the
+# database: a removed member can never write through a stale entry, while
+# reads may see the old role for up to the cache TIMEOUT.
+
+NOT_A_MEMBER = ""
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, "MEMBERSHIP_CACHE_ALIAS", "membership")]
+
+
+def _key(team_id, user_id):
+    return f"team-membership:{team_id}:{user_id}"
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def get_role(team_id, user_id, fresh=False):
+    """Return the user's role in the team, or None if they are not a member
+
+    fresh: read the database (and refresh the cache) instead of trusting
+    the cached role
+    """
+    cache = _cache()
+    key = _key(team_id, user_id)
+    if not fresh:
+        role = cache.get(key)
+        if role is not None:
+            _count("hits")
+            return role or None
+
+    _count("misses")
+    role = TeamMembership.objects.filter(  # pylint: disable=no-member
+        team_id=team_id, user_id=user_id
+    ).values_list("role_in_team", flat=True).first()
+    cache.set(key, role or NOT_A_MEMBER)
+    return role
+
+
+def role_of(user, team_id, fresh=False):
+    """get_role for a request user; users authenticated from token claims
+    (api/auth.py) carry their roles, so the lookup is skipped unless fresh"""
+    roles = getattr(user, "team_roles", None)
+    if roles is not None and not fresh:
+        return roles.get(str(team_id))
+    return get_role(team_id, user.id, fresh)
+
+
+def invalidate(team_id, user_id):
+    _cache().delete(_key(team_id, user_id))
+
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats["hits"] = 0
+        _stats["misses"] = 0
@@ -0,0 +1,375 @@
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: concurrent folds of exited snapshots are not prevented
+    fcntl = None
+
+from django.conf import settings
+from pymongo import monitoring
+
+# -----------------------------
+# Request metrics
+# -----------------------------
+# RequestMetricsMiddleware (api/middleware.py) opens a RequestMetrics for a
+# sampled request and stores it in a context variable; the SQL execute
+# wrapper and the MongoDB command listener below add to whatever metrics are
+# current in their context, and do nothing else when there are none. Totals
+# are folded into per-route histograms exported by the `metrics/` endpoint.
+#
+# The Mongo listener is attached when the log store client is created
+# (api/logs/connection.py).
+#
+# Every process only sees its own requests. With
+# REQUEST_METRICS["MULTIPROCESS_DIR"] set to a directory shared by the
+# workers of one server (emptied when the server starts, see
+# gunicorn.conf.py), each worker writes a snapshot of its histograms and
+# counters there at most every SNAPSHOT_SECONDS, and `metrics/` serves the
+# sum of all snapshots, whichever worker answers the scrape. Snapshots of
+# exited workers (max_requests recycling) are folded into one file: their
+# counters and histograms keep counting, their gauges are dropped.
+
+current = contextvars.ContextVar("request_metrics", default=None)
+
+# seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestMetrics:
+    def __init__(self):
+        # async views run queries in several sync_to_async threads at once,
+        # all adding to the metrics of the same request
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.mongo_count = 0
+        self.mongo_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+
+    def add_sql(self, duration):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_time += duration
+
+    def add_mongo(self, duration):
+        with self._lock:
+            self.mongo_count += 1
+            self.mongo_time += duration
+
+
+class Histogram:
+    """Not locked itself: the Registry holding it serializes every access"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def snapshot(self):
+        return [[[list(pair) for pair in labels], counts, total]
+                for labels, (counts, total) in self._series.items()]
+
+    def render(self, series=None):
+        """This process's series, or `series` ({labels: [counts, total]}) merged from snapshots"""
+        series = self._series if series is None else series
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # callables returning [(name, help, "counter" or "gauge", value)]:
+        # per-process values (summed over workers), and values describing
+        # state every worker shares (read by whichever worker renders)
+        self._collectors = []
+        self._shared_collectors = []
+        self._snapshot_written = None
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Time to produce the response", DURATION_BUCKETS)
+        self.sql_queries = Histogram(
+            "http_request_sql_queries", "SQL queries per request", COUNT_BUCKETS)
+        self.sql_duration = Histogram(
+            "http_request_sql_duration_seconds", "SQL time per request", DURATION_BUCKETS)
+        self.mongo_commands = Histogram(
+            "http_request_mongo_commands", "MongoDB commands per request", COUNT_BUCKETS)
+        self.mongo_duration = Histogram(
+            "http_request_mongo_duration_seconds", "MongoDB time per request", DURATION_BUCKETS)
+        self.render_duration = Histogram(
+            "http_request_render_duration_seconds", "Response rendering (serialization) time",
+            DURATION_BUCKETS)
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size", SIZE_BUCKETS)
+        # every MongoDB command, including those of background threads such
+        # as the activity log writer
+        self.mongo_command_duration = Histogram(
+            "mongo_command_duration_seconds", "MongoDB command time", DURATION_BUCKETS)
+
+    @property
+    def request_histograms(self):
+        return [self.request_duration, self.sql_queries, self.sql_duration,
+                self.mongo_commands, self.mongo_duration, self.render_duration,
+                self.response_size]
+
+    def record_request(self, route, method, status_code, metrics, duration, size):
+        labels = (("route", route), ("method", method))
+        with self._lock:
+            self.request_duration.observe(
+                labels + (("status", str(status_code)[0] + "xx"),), duration)
+            self.sql_queries.observe(labels, metrics.sql_count)
+            self.sql_duration.observe(labels, metrics.sql_time)
+            self.mongo_commands.observe(labels, metrics.mongo_count)
+            self.mongo_duration.observe(labels, metrics.mongo_time)
+            self.render_duration.observe(labels, metrics.render_time)
+            if size is not None:
+                self.response_size.observe(labels, size)
+
+    def record_mongo_command(self, command, duration):
+        with self._lock:
+            self.mongo_command_duration.observe((("command", command),), duration)
+
+    @property
+    def histograms(self):
+        return self.request_histograms + [self.mongo_command_duration]
+
+    def add_collector(self, collector, shared=False):
+        collectors = self._shared_collectors if shared else self._collectors
+        if collector not in collectors:
+            collectors.append(collector)
+
+    def samples(self):
+        return [sample for collector in self._collectors for sample in collector()]
+
+    def shared_samples(self):
+        return [sample for collector in self._shared_collectors for sample in collector()]
+
+    def render(self):
+        """Prometheus text lines: this process's metrics, or every worker's
+        when a MULTIPROCESS_DIR is set"""
+        directory = _multiprocess_dir()
+        if directory:
+            self.write_snapshot(directory)
+            series, samples = merge_snapshots(directory)
+            lines = []
+            for histogram in self.histograms:
+                lines.extend(histogram.render(series.get(histogram.name, {})))
+        else:
+            with self._lock:
+                lines = []
+                for histogram in self.histograms:
+                    lines.extend(histogram.render())
+            samples = self.samples()
+        for name, help_text, metric_type, value in samples + self.shared_samples():
+            lines.extend(counter_lines(name, help_text, value, metric_type))
+        return lines
+
+    # -----------------------------
+    # Snapshots for several worker processes
+    # -----------------------------
+
+    def snapshot(self):
+        samples = self.samples()
+        with self._lock:
+            histograms = {histogram.name: histogram.snapshot() for histogram in self.histograms}
+        return {"histograms": histograms, "samples": samples}
+
+    def write_snapshot(self, directory):
+        if self._snapshot_written is None:
+            atexit.register(self._write_last_snapshot, directory)
+        self._snapshot_written = time.monotonic()
+        _write_json(os.path.join(directory, f"metrics-{os.getpid()}.json"), self.snapshot())
+
+    def _write_last_snapshot(self, directory):
+        # the counts of this worker's last seconds, once it exits
+        try:
+            self.write_snapshot(directory)
+        except OSError:
+            pass  # the directory went away with the server
+
+    def maybe_write_snapshot(self):
+        """Write this worker's snapshot if the last one is SNAPSHOT_SECONDS old"""
+        directory = _multiprocess_dir()
+        if not directory:
+            return
+        written = self._snapshot_written
+        if written is None or time.monotonic() - written >= _setting("SNAPSHOT_SECONDS", 5):
+            self.write_snapshot(directory)
+
+
+def _setting(name, default):
+    return getattr(settings, "REQUEST_METRICS", {}).get(name, default)
+
+
+def _multiprocess_dir():
+    return _setting("MULTIPROCESS_DIR", "")
+
+
+def _write_json(path, data):
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as snapshot_file:
+        json.dump(data, snapshot_file)
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+SNAPSHOT_NAME = re.compile(r"^metrics-(\d+)\.json$")
+EXITED_SNAPSHOT = "metrics-exited.json"
+
+
+def _add_snapshot(series, samples, snapshot, gauges=True):
+    """Add `snapshot` into `series` ({name: {labels: [counts, total]}}) and
+    `samples` ({name: [help, type, value]})"""
+    for name, rows in snapshot["histograms"].items():
+        merged = series.setdefault(name, {})
+        for labels, counts, total in rows:
+            key = tuple(tuple(pair) for pair in labels)
+            if key in merged:
+                merged_counts, merged_total = merged[key]
+                merged[key] = [[a + b for a, b in zip(merged_counts, counts)], merged_total + total]
+            else:
+                merged[key] = [list(counts), total]
+    for name, help_text, metric_type, value in snapshot["samples"]:
+        if metric_type == "gauge" and not gauges:
+            continue
+        samples.setdefault(name, [help_text, metric_type, 0])[2] += value
+
+
+@contextmanager
+def _directory_lock(directory):
+    with open(os.path.join(directory, ".lock"), "a", encoding="utf-8") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _fold_exited(directory, exited_pids):
+    """Fold the snapshots of exited workers into EXITED_SNAPSHOT (directory locked)"""
+    exited_path = os.path.join(directory, EXITED_SNAPSHOT)
+    series, samples = {}, {}
+    for path in [exited_path] + [os.path.join(directory, f"metrics-{pid}.json")
+                                 for pid in exited_pids]:
+        snapshot = _read_json(path)
+        if snapshot is not None:
+            _add_snapshot(series, samples, snapshot, gauges=False)
+    _write_json(exited_path, {
+        "histograms": {name: [[[list(pair) for pair in labels], counts, total]
+                              for labels, (counts, total) in rows.items()]
+                       for name, rows in series.items()},
+        "samples": [[name] + sample for name, sample in samples.items()],
+    })
+    for pid in exited_pids:
+        os.remove(os.path.join(directory, f"metrics-{pid}.json"))
+
+
+def merge_snapshots(directory):
+    """(histogram series by name, [(name, help, type, value)]) summed over every worker"""
+    # locked: a fold must not be seen half done, counting a worker twice
+    with _directory_lock(directory):
+        pids = [int(match.group(1)) for match in map(SNAPSHOT_NAME.match, os.listdir(directory))
+                if match is not None]
+        exited = [pid for pid in pids if not _alive(pid)]
+        if exited:
+            _fold_exited(directory, exited)
+
+        series, samples = {}, {}
+        for name in [EXITED_SNAPSHOT] + [f"metrics-{pid}.json" for pid in pids
+                                         if pid not in exited]:
+            snapshot = _read_json(os.path.join(directory, name))
+            if snapshot is not None:
+                _add_snapshot(series, samples, snapshot)
+    return series, [(name, help_text, metric_type, value)
+                    for name, (help_text, metric_type, value) in samples.items()]
+
+
+registry = Registry()
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrappers entry timing the queries of sampled requests"""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_sql(time.perf_counter() - started)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """pymongo listener; callbacks run in the thread that issued the command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        duration = event.duration_micros / 1_000_000
+        registry.record_mongo_command(event.command_name, duration)
+        metrics = current.get()
+        if metrics is not None:
+            metrics.add_mongo(duration)
+
+
+mongo_command_listener = MongoCommandTimer()
+
+
+def counter_lines(name, help_text, value, metric_type="counter"):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
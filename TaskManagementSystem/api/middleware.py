@@ -0,0 +1,109 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import RequestMetrics, current, registry, sql_execute_wrapper
+
+# -----------------------------
+# Per-request SQL / MongoDB / rendering instrumentation
+# -----------------------------
+# Enabled per request with probability REQUEST_METRICS["SAMPLE_RATE"]. An
+# unsampled request costs one random() call here and one context variable
+# lookup per SQL query; with a rate of 0 not even the random() call.
+# Sampled requests get a Server-Timing header and are added to the per-route
+# histograms served by `metrics/`. Metrics are per process; with
+# REQUEST_METRICS["MULTIPROCESS_DIR"] every request also checks whether this
+# worker's snapshot is due (see api/metrics.py).
+
+
+def _install_sql_wrapper(connection):
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_execute_wrapper)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # every connection of every thread (including the async views' worker
+    # threads) gets the wrapper; it is a no-op outside sampled requests
+    _install_sql_wrapper(connection)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, "REQUEST_METRICS", {})
+        self.sample_rate = config.get("SAMPLE_RATE", 0.0)
+        self.server_timing = config.get("SERVER_TIMING", True)
+        for connection in connections.all(initialized_only=True):
+            _install_sql_wrapper(connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        registry.maybe_write_snapshot()
+        if not self.sampled():
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        registry.maybe_write_snapshot()
+        if not self.sampled():
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook; time the render
+        metrics = current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: self.rendered(metrics))
+        return response
+
+    @staticmethod
+    def rendered(metrics):
+        if metrics.render_started is not None:
+            metrics.render_time += time.perf_counter() - metrics.render_started
+            metrics.render_started = None
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        size = None if response.streaming else len(response.content)
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        registry.record_request(route, request.method, response.status_code,
+                                metrics, duration, size)
+
+        if self.server_timing:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.sql_count} queries"',
+                f'mongo;dur={metrics.mongo_time * 1000:.2f};desc="{metrics.mongo_count} commands"',
+                f"render;dur={metrics.render_time * 1000:.2f}",
+                f"total;dur={duration * 1000:.2f}",
+            ])
+        return response
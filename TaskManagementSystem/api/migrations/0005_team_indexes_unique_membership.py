@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_memberships(apps, schema_editor):
+    """Keep the earliest membership of each (team, user) pair so the unique constraint can be added"""
+    TeamMembership = apps.get_model('api', 'TeamMembership')
+    duplicates = TeamMembership.objects.values('team_id', 'user_id').annotate(
+        first_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for row in duplicates:
+        TeamMembership.objects.filter(
+            team_id=row['team_id'], user_id=row['user_id']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_task_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['for_team', 'assigned_to', 'created_at'], name='task_team_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['for_team', 'created_at'], name='task_team_created_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_memberships,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='teammembership',
+            constraint=models.UniqueConstraint(fields=('team', 'user'), name='unique_team_membership'),
+        ),
+    ]
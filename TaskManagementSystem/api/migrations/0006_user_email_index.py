@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+# auth.User has no index on email; add one so the "add member" typeahead
+# can resolve email prefixes with an index range scan. It is created with
+# the schema editor directly because auth.User's model state belongs to
+# django.contrib.auth, not to this app.
+EMAIL_INDEX = models.Index(fields=['email'], name='auth_user_email_prefix_idx')
+
+
+def add_email_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), EMAIL_INDEX)
+
+
+def remove_email_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), EMAIL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_team_indexes_unique_membership'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_email_index, remove_email_index),
+    ]
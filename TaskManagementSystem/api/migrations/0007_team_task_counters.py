@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Task = apps.get_model('api', 'Task')
+    TeamTaskCounter = apps.get_model('api', 'TeamTaskCounter')
+    groups = Task.objects.filter(for_team__isnull=False).values(
+        'for_team_id', 'assigned_to_id', 'status', 'priority'
+    ).annotate(total=Count('id')).order_by()
+    TeamTaskCounter.objects.bulk_create([
+        TeamTaskCounter(team_id=group['for_team_id'], assigned_to_id=group['assigned_to_id'],
+                        status=group['status'], priority=group['priority'], count=group['total'])
+        for group in groups
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_user_email_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamTaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['for_team', 'due_date'], name='task_team_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='teamtaskcounter',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='teamtaskcounter',
+            name='team',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_counters', to='api.team'),
+        ),
+        migrations.AddConstraint(
+            model_name='teamtaskcounter',
+            constraint=models.UniqueConstraint(fields=('team', 'assigned_to', 'status', 'priority'), name='unique_team_task_counter'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_team_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('task_id', models.BigIntegerField()),
+                ('owner_id', models.IntegerField()),
+                ('team_id', models.BigIntegerField(blank=True, null=True)),
+                ('op', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner_id', 'seq'], name='task_change_owner_idx'), models.Index(fields=['team_id', 'seq'], name='task_change_team_idx'), models.Index(fields=['changed_at'], name='task_change_time_idx')],
+            },
+        ),
+    ]
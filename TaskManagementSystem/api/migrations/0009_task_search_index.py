@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# a copy of the tokenizer in api/search.py as of this migration: the index
+# it builds must not change when that module does
+
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+MIN_TERM_LENGTH = 2
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "was", "with",
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    terms = []
+    for word in _WORD.findall((text or "").lower()):
+        if len(word) >= MIN_TERM_LENGTH and word not in STOP_WORDS:
+            terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+def term_weights(title, description):
+    weights = Counter()
+    for term in tokenize(title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(description):
+        weights[term] += 1
+    return weights
+
+
+def populate_index(apps, schema_editor):
+    Task = apps.get_model('api', 'Task')
+    TaskSearchTerm = apps.get_model('api', 'TaskSearchTerm')
+    rows = []
+    for task in Task.objects.only('id', 'title', 'description').iterator(chunk_size=2000):
+        rows.extend(TaskSearchTerm(term=term, task_id=task.id, weight=weight)
+                    for term, weight in term_weights(task.title, task.description).items())
+        if len(rows) >= 5000:
+            TaskSearchTerm.objects.bulk_create(rows)
+            rows = []
+    TaskSearchTerm.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_task_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.IntegerField()),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='api.task')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('term', 'task'), name='unique_task_search_term')],
+            },
+        ),
+        migrations.RunPython(populate_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_profile_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='insert_batch',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_team_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskchange',
+            name='op',
+            field=models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted'), ('leave', 'Left the team')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='taskchange',
+            name='task_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_task_change_leave'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='task',
+            name='insert_batch',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_remove_task_insert_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='tasks_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
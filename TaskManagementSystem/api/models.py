@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 # -----------------------------
@@ -12,6 +12,23 @@ class Profile(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
     # avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # bumped when the user or their memberships change: access tokens
+    # carrying an older version are not trusted for their claims (api/auth.py)
+    token_version = models.PositiveIntegerField(default=0)
+    # bumped in the same transaction as every write to the user's own tasks;
+    # the task list's ETag is built from it (api/conditional.py)
+    tasks_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+
+class ClaimsUser(User):
+    """A User built from access token claims, without a query; never saved"""
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        # the claims lack most columns (password, ...): saving would wipe them
+        raise TypeError("ClaimsUser is built from token claims and cannot be saved")
 
 
 class Team(models.Model):
@@ -20,6 +37,19 @@ class Team(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # bumped in the same transaction as every write the team's cached
+    # payloads depend on (api/response_cache.py)
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # data_version only moves through bump_team_versions: saving an
+            # instance loaded before a bump must not write the old value back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'data_version']
+        super().save(*args, **kwargs)
+
 # -----------------------------
 # Task Model
 # -----------------------------
@@ -72,6 +102,66 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # fields whose previous values the Task signal receivers need
+    tracked_fields = ['for_team_id', 'assigned_to_id', 'status', 'priority',
+                      'title', 'description']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the values as loaded so signal receivers can tell what changed
+        instance._loaded_values = {
+            field: value for field, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not self.has_loaded_values():
+            # not loaded through the ORM (or loaded with .only()): read the stored values
+            self._loaded_values = Task.objects.filter(  # pylint: disable=no-member
+                pk=self.pk).values(*self.tracked_fields).first() or {}
+        # run the post_save receivers in the same transaction as the write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self.reset_loaded_values()
+
+    def has_loaded_values(self):
+        loaded = getattr(self, '_loaded_values', {})
+        return all(field in loaded for field in self.tracked_fields)
+
+    def reset_loaded_values(self):
+        self._loaded_values = {field: getattr(self, field)
+                               for field in self.tracked_fields}
+
+    class Meta:
+        # the task list filters by owner, then by at most one more column,
+        # and pages by (created_at, id) or (updated_at, id)
+        indexes = [
+            models.Index(fields=['created_by', 'created_at'],
+                         name='task_owner_created_idx'),
+            models.Index(fields=['created_by', 'updated_at'],
+                         name='task_owner_updated_idx'),
+            models.Index(fields=['created_by', 'status', 'created_at'],
+                         name='task_owner_status_idx'),
+            models.Index(fields=['created_by', 'priority', 'created_at'],
+                         name='task_owner_priority_idx'),
+            models.Index(fields=['created_by', 'for_team', 'created_at'],
+                         name='task_owner_team_idx'),
+            models.Index(fields=['created_by', 'assigned_to', 'created_at'],
+                         name='task_owner_assignee_idx'),
+            models.Index(fields=['created_by', 'due_date'],
+                         name='task_owner_due_idx'),
+            # team views: a member's tasks and the whole team, newest first
+            models.Index(fields=['for_team', 'assigned_to', 'created_at'],
+                         name='task_team_assignee_idx'),
+            models.Index(fields=['for_team', 'created_at'],
+                         name='task_team_created_idx'),
+            # overdue count for the team summary
+            models.Index(fields=['for_team', 'due_date'],
+                         name='task_team_due_idx'),
+        ]
+
 
 class TeamMembership(models.Model):
     team = models.ForeignKey(
@@ -80,3 +170,101 @@ class TeamMembership(models.Model):
         User, on_delete=models.CASCADE, related_name='team_memberships')
     role_in_team = models.CharField(max_length=50, default="member")
     joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['team', 'user'], name='unique_team_membership'),
+        ]
+
+
+# -----------------------------
+# Per-team task counters
+# -----------------------------
+# Materialized COUNT(*) of a team's tasks grouped by (assignee, status,
+# priority), kept up to date by the Task signal receivers in signals.py
+# (see api/counters.py) and rebuilt by `manage.py rebuild_task_counters`.
+
+
+class TeamTaskCounter(models.Model):
+    team = models.ForeignKey(
+        Team, on_delete=models.CASCADE, related_name='task_counters')
+    # null counts the team's unassigned tasks
+    assigned_to = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['team', 'assigned_to', 'status', 'priority'], name='unique_team_task_counter'),
+        ]
+
+
+# -----------------------------
+# Task change feed
+# -----------------------------
+# Append-only log of task writes, read by the `tasks/changes/` delta sync
+# endpoint. `seq` is the monotonic cursor; rows outlive their tasks so
+# deletions can be reported as tombstones. Plain integer columns (not
+# foreign keys) on purpose: the referenced rows may be gone.
+#
+# LEAVE rows are not about one task: owner_id lost access to team_id (left
+# the team or was removed), so the team's tasks must become tombstones.
+
+
+class TaskChange(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    LEAVE = 'leave'
+    OP_CHOICES = [
+        (UPSERT, 'Created or updated'),
+        (DELETE, 'Deleted'),
+        (LEAVE, 'Left the team'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    # null for LEAVE rows
+    task_id = models.BigIntegerField(null=True, blank=True)
+    owner_id = models.IntegerField()
+    # team the task belonged to when the change was made
+    team_id = models.BigIntegerField(null=True, blank=True)
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # the feed reads a caller's own changes and those of their teams
+        # in seq order; pruning deletes by age
+        indexes = [
+            models.Index(fields=['owner_id', 'seq'],
+                         name='task_change_owner_idx'),
+            models.Index(fields=['team_id', 'seq'],
+                         name='task_change_team_idx'),
+            models.Index(fields=['changed_at'],
+                         name='task_change_time_idx'),
+        ]
+
+
+# -----------------------------
+# Task search index
+# -----------------------------
+# Inverted index over Task.title and Task.description: one row per
+# (term, task) with the term's weight in that task. Maintained by the Task
+# signal receivers (see api/search.py) and rebuilt by
+# `manage.py rebuild_search_index`.
+
+
+class TaskSearchTerm(models.Model):
+    term = models.CharField(max_length=64)
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # also the index for exact and prefix term lookups
+            models.UniqueConstraint(
+                fields=['term', 'task'], name='unique_task_search_term'),
+        ]
@@ -0,0 +1,92 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# -----------------------------
+# Keyset (cursor) pagination helpers
+# -----------------------------
+# A cursor is an opaque, url-safe token holding the sort key of the last row
+# of the previous page, so the next page is a range scan on an index instead
+# of an OFFSET that has to skip every earlier row.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Read the `limit` query parameter, clamped to [1, maximum]"""
+    try:
+        limit = int(request.query_params.get("limit", default))
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def split_page(rows, limit):
+    """Split a list fetched with limit + 1 rows into (page, has_more)"""
+    return rows[:limit], len(rows) > limit
+
+
+def paginate_queryset(queryset, request, ordering):
+    """Return one keyset page of `queryset` as (rows, next_cursor)
+
+    `ordering` is a single model field, optionally prefixed with '-'; the
+    primary key breaks ties so the order is total. Raises InvalidCursor
+    for a malformed cursor or one issued for another ordering.
+    """
+    field = ordering.lstrip("-")
+    descending = ordering.startswith("-")
+    lookup = "lt" if descending else "gt"
+
+    cursor = request.query_params.get("cursor")
+    if cursor:
+        try:
+            cursor_ordering, value, pk = decode_cursor(cursor)
+            meta = queryset.model._meta  # pylint: disable=protected-access
+            value = meta.get_field(field).to_python(value)
+            pk = meta.pk.to_python(pk)
+            if value is None or pk is None:
+                raise InvalidCursor("Invalid cursor")
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor("Invalid cursor") from exc
+        if cursor_ordering != ordering:
+            raise InvalidCursor("Cursor does not match the requested ordering")
+        queryset = queryset.filter(
+            Q(**{f"{field}__{lookup}": value}) |
+            Q(**{field: value, f"pk__{lookup}": pk})
+        )
+
+    queryset = queryset.order_by(ordering, "-pk" if descending else "pk")
+    limit = get_page_size(request)
+    rows, has_more = split_page(list(queryset[:limit + 1]), limit)
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        value = getattr(last, field)
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        next_cursor = encode_cursor([ordering, value, last.pk])
+    return rows, next_cursor
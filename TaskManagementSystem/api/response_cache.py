@@ -0,0 +1,73 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import Team
+
+# -----------------------------
+# Versioned response cache for team endpoints
+# -----------------------------
+# Every team has a version, Team.data_version. Cached payloads and ETags are
+# keyed by (team_id, viewer_id, endpoint, version, ...), so bumping the
+# version makes all of a team's entries unreachable at once; nothing is ever
+# deleted explicitly and stale entries simply expire. Versions are bumped by
+# the Task/TeamMembership/Team/User receivers in signals.py.
+#
+# The version lives in the team row, not in the cache: the bump commits with
+# the write, and every worker reads it with the team row the endpoints load
+# anyway. A per-process cache then only costs hit rate; it can never answer
+# with a payload (or a 304) older than the committed version.
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "responses")]
+
+
+def bump_team_versions(team_ids):
+    """Bump the teams' versions, in the current transaction
+
+    A reader that loads the team before the write commits sees the old
+    version and the old rows (or newer ones: a harmless miss later).
+    """
+    team_ids = {team_id for team_id in team_ids if team_id is not None}
+    if team_ids:
+        Team.objects.filter(id__in=team_ids).update(  # pylint: disable=no-member
+            data_version=F("data_version") + 1)
+
+
+def response_key(team_id, viewer_id, endpoint, version, *args):
+    parts = [str(part) for part in (team_id, viewer_id, endpoint, version) + args]
+    return "team-response:" + ":".join(parts)
+
+
+def get_entry(key):
+    entry = _cache().get(key)
+    with _stats_lock:
+        _stats["hits" if entry is not None else "misses"] += 1
+    return entry
+
+
+def set_entry(key, entry):
+    _cache().set(key, entry)
+
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats["hits"] = 0
+        _stats["misses"] = 0
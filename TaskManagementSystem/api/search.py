@@ -0,0 +1,151 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Task, TaskSearchTerm, TeamMembership
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# -----------------------------
+# Task full-text search
+# -----------------------------
+# Text is split into lowercase word terms; a term found in the title counts
+# TITLE_WEIGHT per occurrence, in the description 1. A query matches tasks
+# containing every query term (the last one as a prefix, for search-as-you-
+# type) and ranks them by the summed weight of the matching terms. Both the
+# exact and the prefix lookups are range scans on the (term, task) unique
+# index, so no external search service is needed. The prefix is queried as
+# the range [prefix, prefix + MAX_CHAR) rather than with startswith, which
+# compiles to LIKE ... ESCAPE and is not always planned as a range.
+
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+MIN_TERM_LENGTH = 2
+MAX_QUERY_TERMS = 8
+# sorts after every character a term can continue with
+MAX_CHAR = chr(0x10FFFF)
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "was", "with",
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    terms = []
+    for word in _WORD.findall((text or "").lower()):
+        if len(word) >= MIN_TERM_LENGTH and word not in STOP_WORDS:
+            terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+def term_weights(title, description):
+    weights = Counter()
+    for term in tokenize(title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(description):
+        weights[term] += 1
+    return weights
+
+
+def _indexed_text_changed(task):
+    loaded = getattr(task, "_loaded_values", {})
+    return (loaded.get("title") != task.title
+            or loaded.get("description") != task.description)
+
+
+def index_tasks(tasks, replace=True):
+    """Write the index rows of `tasks`; `replace` drops their existing rows first"""
+    tasks = [task for task in tasks if task.pk is not None]
+    if not tasks:
+        return
+    rows = [
+        TaskSearchTerm(term=term, task_id=task.pk, weight=weight)
+        for task in tasks
+        for term, weight in term_weights(task.title, task.description).items()
+    ]
+    with transaction.atomic():
+        if replace:
+            TaskSearchTerm.objects.filter(  # pylint: disable=no-member
+                task_id__in=[task.pk for task in tasks]).delete()
+        TaskSearchTerm.objects.bulk_create(rows, batch_size=1000)  # pylint: disable=no-member
+
+
+def index_written_tasks(created=(), updated=()):
+    """Index new tasks and re-index updated ones whose text changed"""
+    index_tasks(created, replace=False)
+    index_tasks([task for task in updated if _indexed_text_changed(task)])
+
+
+def rebuild_index(batch_size=2000):
+    """Re-index every task; returns the number of tasks indexed"""
+    TaskSearchTerm.objects.all().delete()  # pylint: disable=no-member
+    total = 0
+    last_id = 0
+    while True:
+        batch = list(Task.objects.filter(  # pylint: disable=no-member
+            id__gt=last_id).order_by("id").only("id", "title", "description")[:batch_size])
+        if not batch:
+            return total
+        index_tasks(batch, replace=False)
+        total += len(batch)
+        last_id = batch[-1].id
+
+
+def search_tasks(user, query, limit, cursor=None):
+    """Return (tasks, next_cursor) for the caller's visible tasks matching `query`
+
+    Each task carries its rank in `task.score`. Raises InvalidCursor for a
+    malformed cursor or one issued for another query.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], None
+    exact, prefix = terms[:-1], terms[-1]
+
+    team_ids = TeamMembership.objects.filter(  # pylint: disable=no-member
+        user=user).values("team_id")
+    prefixed = Q(term__gte=prefix, term__lt=prefix + MAX_CHAR)
+    matches = TaskSearchTerm.objects.filter(  # pylint: disable=no-member
+        Q(task__created_by=user) | Q(task__for_team_id__in=team_ids),
+        Q(term__in=exact) | prefixed,
+    ).values("task_id").annotate(
+        score=Sum("weight"),
+        prefix_hits=Count("id", filter=prefixed),
+    ).filter(prefix_hits__gt=0)
+    if exact:
+        # every exact term must be present, not just some of them
+        matches = matches.annotate(
+            exact_hits=Count("term", filter=Q(term__in=exact), distinct=True)
+        ).filter(exact_hits=len(exact))
+
+    if cursor:
+        try:
+            cursor_query, score, task_id = decode_cursor(cursor)
+            score, task_id = int(score), int(task_id)
+        except (ValueError, TypeError) as exc:
+            raise InvalidCursor("Invalid cursor") from exc
+        if cursor_query != terms:
+            raise InvalidCursor("Cursor does not match the search query")
+        matches = matches.filter(Q(score__lt=score) | Q(score=score, task_id__lt=task_id))
+
+    ranked = list(matches.order_by("-score", "-task_id")[:limit + 1])
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    tasks = Task.objects.in_bulk([row["task_id"] for row in ranked])  # pylint: disable=no-member
+    results = []
+    for row in ranked:
+        task = tasks.get(row["task_id"])
+        if task is not None:
+            task.score = row["score"]
+            results.append(task)
+
+    next_cursor = None
+    if has_more:
+        last = ranked[-1]
+        next_cursor = encode_cursor([terms, last["score"], last["task_id"]])
+    return results, next_cursor
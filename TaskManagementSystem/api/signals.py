@@ -1,10 +1,242 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.contrib.auth.models import User
-from django.dispatch import receiver
-from .models import Profile
+from django.dispatch import Signal, receiver
+from .models import Profile, Task, Team, TeamMembership
+from . import auth, changes, conditional, counters, events, membership_cache, response_cache, search
+
+# Sent by the bulk task endpoint, inside its transaction, because
+# bulk_create/bulk_update/QuerySet.update do not send post_save.
+# Arguments: created, updated, deleted (lists of Task instances; updated and
+# deleted tasks still carry their _loaded_values).
+tasks_bulk_written = Signal()
+
+
+def _only_last_login(update_fields):
+    """True for the save a login makes, which records last_login and nothing else"""
+    return update_fields is not None and set(update_fields) == {"last_login"}
 
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)  # pylint: disable=no-member
+
+
+@receiver([post_save, post_delete], sender=TeamMembership)
+def invalidate_membership_cache(sender, instance, **kwargs):
+    membership_cache.invalidate(instance.team_id, instance.user_id)
+
+
+# -----------------------------
+# Access token claims versions
+# -----------------------------
+
+@receiver([post_save, post_delete], sender=TeamMembership)
+def bump_token_version_for_membership(sender, instance, raw=False, **kwargs):
+    if not raw:
+        auth.bump_token_version(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def bump_token_version_for_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # a login changes none of the claims
+    if created or raw or _only_last_login(update_fields):
+        return
+    auth.bump_token_version(instance.id)
+
+
+# -----------------------------
+# Team task counters
+# -----------------------------
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.apply_deltas(counters.task_deltas(created=[instance]))
+    else:
+        counters.apply_deltas(counters.task_deltas(updated=[instance]))
+
+
+@receiver(post_delete, sender=Task)
+def count_deleted_task(sender, instance, **kwargs):
+    counters.apply_deltas(counters.task_deltas(deleted=[instance]))
+
+
+@receiver(tasks_bulk_written)
+def count_bulk_written_tasks(sender, created=(), updated=(), deleted=(), **kwargs):
+    counters.apply_deltas(counters.task_deltas(created, updated, deleted))
+
+
+@receiver(pre_delete, sender=User)
+def recount_teams_of_deleted_user(sender, instance, **kwargs):
+    # deleting a user nulls Task.assigned_to with a plain UPDATE (no signals)
+    # and cascades its counter rows, so recount the affected teams afterwards
+    team_ids = list(Task.objects.filter(  # pylint: disable=no-member
+        Q(assigned_to=instance) | Q(created_by=instance), for_team__isnull=False
+    ).values_list('for_team_id', flat=True).distinct())
+    if team_ids:
+        transaction.on_commit(lambda: counters.rebuild_counters(team_ids))
+
+
+# -----------------------------
+# Team response cache versions
+# -----------------------------
+
+def _task_team_ids(task):
+    loaded = getattr(task, '_loaded_values', {})
+    return {loaded.get('for_team_id'), task.for_team_id}
+
+
+@receiver([post_save, post_delete], sender=Task)
+def bump_version_for_task(sender, instance, raw=False, **kwargs):
+    if not raw:
+        response_cache.bump_team_versions(_task_team_ids(instance))
+
+
+@receiver(tasks_bulk_written)
+def bump_version_for_bulk_tasks(sender, created=(), updated=(), deleted=(), **kwargs):
+    team_ids = set()
+    for task in [*created, *updated, *deleted]:
+        team_ids |= _task_team_ids(task)
+    response_cache.bump_team_versions(team_ids)
+
+
+@receiver([post_save, post_delete], sender=TeamMembership)
+def bump_version_for_membership(sender, instance, raw=False, **kwargs):
+    if not raw:
+        response_cache.bump_team_versions([instance.team_id])
+
+
+@receiver(post_save, sender=Team)
+def bump_version_for_team(sender, instance, raw=False, **kwargs):
+    if not raw:
+        response_cache.bump_team_versions([instance.id])
+
+
+@receiver(post_save, sender=User)
+def bump_version_for_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # usernames/emails are embedded in the cached team payloads; a login
+    # changes neither
+    if created or raw or _only_last_login(update_fields):
+        return
+    response_cache.bump_team_versions(TeamMembership.objects.filter(  # pylint: disable=no-member
+        user=instance).values_list('team_id', flat=True))
+
+
+# -----------------------------
+# Task list versions
+# -----------------------------
+# The task list shows a user's own tasks by id only, so the owners' versions
+# move with every task write, including the column updates Django makes
+# without signals when a team or an assignee is deleted.
+
+@receiver([post_save, post_delete], sender=Task)
+def bump_tasks_version_for_task(sender, instance, raw=False, **kwargs):
+    if not raw:
+        conditional.bump_tasks_versions([instance.created_by_id])
+
+
+@receiver(tasks_bulk_written)
+def bump_tasks_versions_for_bulk_tasks(sender, created=(), updated=(), deleted=(), **kwargs):
+    conditional.bump_tasks_versions(
+        task.created_by_id for task in [*created, *updated, *deleted])
+
+
+@receiver(pre_delete, sender=Team)
+def bump_tasks_versions_for_deleted_team(sender, instance, **kwargs):
+    conditional.bump_tasks_versions(Task.objects.filter(  # pylint: disable=no-member
+        for_team=instance).values_list('created_by_id', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=User)
+def bump_tasks_versions_for_deleted_assignee(sender, instance, **kwargs):
+    conditional.bump_tasks_versions(Task.objects.filter(  # pylint: disable=no-member
+        assigned_to=instance).values_list('created_by_id', flat=True).distinct())
+
+
+# -----------------------------
+# Task change feed
+# -----------------------------
+
+@receiver(post_save, sender=Task)
+def record_saved_task(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        changes.record_changes(created=[instance])
+    else:
+        changes.record_changes(updated=[instance])
+
+
+@receiver(post_delete, sender=Task)
+def record_deleted_task(sender, instance, **kwargs):
+    changes.record_changes(deleted=[instance])
+
+
+@receiver(tasks_bulk_written)
+def record_bulk_written_tasks(sender, created=(), updated=(), deleted=(), **kwargs):
+    changes.record_changes(created, updated, deleted)
+
+
+@receiver(post_delete, sender=TeamMembership)
+def record_left_team(sender, instance, **kwargs):
+    changes.record_left_team(instance.user_id, instance.team_id)
+
+
+@receiver(pre_delete, sender=Team)
+def record_tasks_leaving_deleted_team(sender, instance, **kwargs):
+    # deleting a team nulls Task.for_team with a plain UPDATE (no signals);
+    # the owners still hold those tasks and need the new for_team
+    tasks = list(Task.objects.filter(for_team=instance))  # pylint: disable=no-member
+    for task in tasks:
+        task.for_team_id = None
+    changes.record_changes(updated=tasks)
+
+
+# -----------------------------
+# Live team events
+# -----------------------------
+
+@receiver(post_save, sender=Task)
+def publish_saved_task(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        events.publish_on_commit(events.task_events(created=[instance]))
+    else:
+        events.publish_on_commit(events.task_events(updated=[instance]))
+
+
+@receiver(post_delete, sender=Task)
+def publish_deleted_task(sender, instance, **kwargs):
+    events.publish_on_commit(events.task_events(deleted=[instance]))
+
+
+@receiver(tasks_bulk_written)
+def publish_bulk_written_tasks(sender, created=(), updated=(), deleted=(), **kwargs):
+    events.publish_on_commit(events.task_events(created, updated, deleted))
+
+
+# -----------------------------
+# Task search index
+# -----------------------------
+# Deleting a task cascades to its TaskSearchTerm rows, so only writes
+# need a receiver.
+
+@receiver(post_save, sender=Task)
+def index_saved_task(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        search.index_written_tasks(created=[instance])
+    else:
+        search.index_written_tasks(updated=[instance])
+
+
+@receiver(tasks_bulk_written)
+def index_bulk_written_tasks(sender, created=(), updated=(), **kwargs):
+    search.index_written_tasks(created, updated)
@@ -1,3 +1,1265 @@
-from django.test import TestCase
+import base64
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mongoengine import connection as mongo_connection
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import auth, events, membership_cache, metrics
+from .logs import connection as log_connection
+from .logs.archive import LogArchive
+from .logs.backends import get_backend
+from .logs.backends.local import FileLogBackend, Segment
+from .logs.models import ActivityLog
+from .logs.writer import ActivityLogWriter, get_writer
+from .models import Task, Team, TeamMembership, TeamTaskCounter
+
+
+def make_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+class APITestCase(TestCase):
+    """Activity logs go to a throwaway file store, written inline, so no
+    MongoDB or background writer is needed; every cache starts empty"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.log_dir = tempfile.mkdtemp(prefix="test-activity-logs-")
+        cls.log_settings = override_settings(
+            ACTIVITY_LOG_BACKEND={
+                "ENGINE": "api.logs.backends.local.FileLogBackend",
+                "OPTIONS": {"PATH": cls.log_dir, "FSYNC": False},
+            },
+            ACTIVITY_LOG_WRITER={"ASYNC": False},
+            ACTIVITY_LOG_RETENTION={"ARCHIVE_PATH": os.path.join(cls.log_dir, "archive")},
+        )
+        cls.log_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.log_settings.disable()
+        shutil.rmtree(cls.log_dir, ignore_errors=True)
+
+    def setUp(self):
+        # ids are reused after each test's rollback: cached roles and
+        # versions of an earlier test must not leak into this one
+        for cache in caches.all():
+            cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+# -----------------------------
+# Keyset pagination
+# -----------------------------
+
+class TaskPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.client = self.client_for(self.user)
+        Task.objects.bulk_create(  # pylint: disable=no-member
+            [Task(title=f"Task {n}", created_by=self.user) for n in range(7)])
+
+    def pages(self, ordering):
+        ids, cursor = [], None
+        while True:
+            url = f"/api/tasks/?limit=3&ordering={ordering}"
+            response = self.client.get(url + (f"&cursor={cursor}" if cursor else ""))
+            self.assertEqual(response.status_code, 200)
+            ids += [task["id"] for task in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_pages_cover_every_task_once_in_order(self):
+        # bulk_create gives all tasks (nearly) the same created_at: the pk
+        # breaks the ties
+        expected = list(Task.objects.order_by(  # pylint: disable=no-member
+            "-created_at", "-pk").values_list("id", flat=True))
+        self.assertEqual(self.pages("-created_at"), expected)
+        self.assertEqual(self.pages("created_at"), expected[::-1])
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ["not-base64!", make_cursor({"a": 1}),
+                       make_cursor(["-created_at", "2020-01-01T00:00:00", {}]),
+                       make_cursor(["-created_at", {}, 1]),
+                       make_cursor(["-created_at", "2020-01-01T00:00:00"])]:
+            response = self.client.get(f"/api/tasks/?cursor={cursor}")
+            self.assertEqual(response.status_code, 400, cursor)
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        cursor = make_cursor(["updated_at", "2020-01-01T00:00:00", 1])
+        response = self.client.get(f"/api/tasks/?ordering=-created_at&cursor={cursor}")
+        self.assertEqual(response.status_code, 400)
+
+    def test_later_page_revalidates_from_the_version_until_any_task_changes(self):
+        cursor = self.client.get("/api/tasks/?limit=3").data["next_cursor"]
+        url = f"/api/tasks/?limit=3&cursor={cursor}"
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # no aggregate over the user's tasks
+        self.assertFalse([query for query in queries.captured_queries
+                          if "MAX(" in query["sql"].upper() or "COUNT(" in query["sql"].upper()])
+
+        # a task on the first page
+        task = Task.objects.order_by("-created_at", "-pk").first()  # pylint: disable=no-member
+        task.title = "Renamed"
+        task.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_deleting_a_team_changes_its_task_owners_version(self):
+        team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        Task.objects.filter(pk=Task.objects.first().pk).update(for_team=team)  # pylint: disable=no-member
+        etag = self.client.get("/api/tasks/")["ETag"]
+        team.delete()
+        self.assertEqual(self.client.get("/api/tasks/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# -----------------------------
+# Team membership cache
+# -----------------------------
+
+class MembershipCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        TeamMembership.objects.create(  # pylint: disable=no-member
+            team=self.team, user=self.owner, role_in_team="owner")
+        self.task = Task.objects.create(  # pylint: disable=no-member
+            title="Team task", created_by=self.owner, for_team=self.team)
+
+    def test_removed_owner_cannot_write_through_a_stale_cached_role(self):
+        TeamMembership.objects.filter(team=self.team, user=self.owner).delete()  # pylint: disable=no-member
+        # what another worker, which missed the invalidation, still holds
+        membership_cache._cache().set(  # pylint: disable=protected-access
+            membership_cache._key(self.team.id, self.owner.id), "owner")  # pylint: disable=protected-access
+
+        response = self.client_for(self.owner).delete(
+            f"/api/teams/{self.team.id}/tasks/{self.task.id}/delete/")
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())  # pylint: disable=no-member
+        # the write check refreshed the stale entry
+        self.assertIsNone(membership_cache.get_role(self.team.id, self.owner.id))
+
+
+# -----------------------------
+# Add-member typeahead
+# -----------------------------
+
+class AvailableUsersTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        for user, role in ((self.owner, "owner"), (self.alice, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=self.team, user=user, role_in_team=role)
+        for username, email in (("alfred", "fred@example.com"), ("bob", "Al.Bob@example.com"),
+                                ("carol", "carol@example.com")):
+            User.objects.create_user(username, email, "password-123")
+
+    def available(self, user=None, **params):
+        return self.client_for(user or self.owner).get(
+            f"/api/teams/{self.team.id}/available-users/?" + urlencode(params))
+
+    def usernames(self, **params):
+        response = self.available(**params)
+        self.assertEqual(response.status_code, 200)
+        return [user["username"] for user in response.data["available_users"]]
+
+    def test_prefix_matches_username_or_email_and_skips_members(self):
+        # alice matches too, but is already a member
+        self.assertEqual(self.usernames(q="al"), ["alfred", "bob"])
+        self.assertEqual(self.usernames(q="AL"), ["alfred", "bob"])
+        self.assertEqual(self.usernames(q="fred@"), ["alfred"])
+        # a prefix, not a substring
+        self.assertEqual(self.usernames(q="red"), [])
+        self.assertEqual(self.usernames(), ["alfred", "bob", "carol"])
+
+    def test_results_are_limited(self):
+        for number in range(60):
+            User.objects.create_user(f"user{number:02d}", f"user{number:02d}@example.com")
+        self.assertEqual(len(self.usernames(q="user")), 10)
+        self.assertEqual(self.usernames(q="user", limit=3), ["user00", "user01", "user02"])
+        self.assertEqual(len(self.usernames(q="user", limit=1000)), 50)
+        self.assertEqual(self.available(q="user", limit=3).data["count"], 3)
+
+    def test_non_members_are_refused(self):
+        carol = User.objects.get(username="carol")
+        self.assertEqual(self.available(carol, q="al").status_code, 403)
+
+
+# -----------------------------
+# Bulk task endpoint
+# -----------------------------
+
+class TaskBulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.client = self.client_for(self.user)
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        TeamMembership.objects.create(  # pylint: disable=no-member
+            team=self.team, user=self.user, role_in_team="owner")
+
+    def create(self, count):
+        return self.client.post("/api/tasks/bulk/", [
+            {"title": f"Task {n}", "for_team": self.team.id, "priority": "high"}
+            for n in range(count)], format="json")
+
+    def assert_created(self, response, count):
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), count)
+        stored = dict(Task.objects.filter(  # pylint: disable=no-member
+            created_by=self.user).values_list("id", "title"))
+        # every returned id is the stored row with that title
+        self.assertEqual({task["id"]: task["title"] for task in response.data}, stored)
+        self.assertEqual(TeamTaskCounter.objects.get(  # pylint: disable=no-member
+            team=self.team, status="pending", priority="high").count, count)
+
+    def test_create_returns_the_stored_ids(self):
+        self.assert_created(self.create(5), 5)
+
+    def test_create_reads_the_ids_back_when_the_insert_cannot_return_them(self):
+        # as on MySQL, with SQLite's last_insert_rowid() (the last row's id,
+        # where MySQL's LAST_INSERT_ID() is the first's) in place of MySQL's
+        def inserted_ids(count):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT last_insert_rowid()")
+                last = cursor.fetchone()[0]
+            return list(range(last - count + 1, last + 1))
+
+        self.create(2)
+        features = type(connection.features)
+        with mock.patch.object(features, "can_return_rows_from_bulk_insert", False), \
+                mock.patch("api.views.inserted_ids", side_effect=inserted_ids) as read_ids:
+            response = self.create(5)
+        read_ids.assert_called_once_with(5)
+        self.assertEqual(response.status_code, 201)
+        stored = dict(Task.objects.filter(  # pylint: disable=no-member
+            id__in=[task["id"] for task in response.data]).values_list("id", "title"))
+        self.assertEqual({task["id"]: task["title"] for task in response.data}, stored)
+
+    def test_invalid_item_fails_the_whole_batch(self):
+        response = self.client.post("/api/tasks/bulk/", [
+            {"title": "Fine"}, {"title": "Bad", "status": "unknown"}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["details"][0], {})
+        self.assertIn("status", response.data["details"][1])
+        self.assertFalse(Task.objects.exists())  # pylint: disable=no-member
+
+    def test_update_and_delete(self):
+        ids = [task["id"] for task in self.create(3).data]
+        response = self.client.patch("/api/tasks/bulk/", [
+            {"id": pk, "status": "completed"} for pk in ids[:2]], format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Task.objects.filter(  # pylint: disable=no-member
+            status="completed").count(), 2)
+
+        response = self.client.delete("/api/tasks/bulk/", {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Task.objects.exists())  # pylint: disable=no-member
+        self.assertFalse(TeamTaskCounter.objects.filter(  # pylint: disable=no-member
+            count__gt=0).exists())
+
+
+# -----------------------------
+# Team task counters
+# -----------------------------
+
+class TeamTaskCounterTests(APITestCase):
+    def counters(self):
+        return {tuple(key): count for *key, count in TeamTaskCounter.objects.filter(  # pylint: disable=no-member
+            count__gt=0).values_list("team_id", "assigned_to_id", "status", "priority", "count")}
+
+    def test_counters_match_a_rebuild(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+        team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        for user, role in ((owner, "owner"), (alice, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=team, user=user, role_in_team=role)
+        client = self.client_for(owner)
+
+        ids = [task["id"] for task in client.post("/api/tasks/bulk/", [
+            {"title": f"Task {n}", "for_team": team.id, "priority": ("low", "high")[n % 2]}
+            for n in range(6)], format="json").data]
+        client.patch("/api/tasks/bulk/", [{"id": pk, "status": "in-progress"} for pk in ids[:3]],
+                     format="json")
+        client.patch(f"/api/tasks/{ids[3]}/", {"priority": "medium"}, format="json")
+        client.delete("/api/tasks/bulk/", {"ids": ids[4:]}, format="json")
+        for n in range(2):
+            client.post(f"/api/teams/{team.id}/tasks/create/",
+                        {"title": f"Assigned {n}", "assigned_to": "alice"}, format="json")
+        assigned = Task.objects.filter(assigned_to=alice).first()  # pylint: disable=no-member
+        response = self.client_for(alice).patch(
+            f"/api/teams/{team.id}/tasks/{assigned.id}/update-status/", {"status": "completed"},
+            format="json")
+        self.assertEqual(response.status_code, 200)
+
+        maintained = self.counters()
+        self.assertEqual(sum(maintained.values()), 6)
+        TeamTaskCounter.objects.all().delete()  # pylint: disable=no-member
+        call_command("rebuild_task_counters", stdout=StringIO())
+        self.assertEqual(self.counters(), maintained)
+
+    def test_summary_matches_an_aggregate_of_the_tasks(self):
+        owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+        team, other = (Team.objects.create(name=name) for name in ("Team", "Other"))  # pylint: disable=no-member
+        for user, role in ((owner, "owner"), (alice, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=team, user=user, role_in_team=role)
+        today = timezone.localdate()
+        for number, (assignee, task_status, priority, due) in enumerate((
+                (alice, "pending", "high", today - timedelta(days=2)),  # overdue
+                (alice, "completed", "low", today - timedelta(days=2)),  # late, but done
+                (alice, "in-progress", "medium", today + timedelta(days=1)),
+                (None, "pending", "low", today - timedelta(days=1)),  # unassigned and overdue
+                (None, "in-progress", "high", None),
+                (owner, "pending", "medium", today))):
+            Task.objects.create(  # pylint: disable=no-member
+                title=f"Task {number}", created_by=owner, for_team=team, assigned_to=assignee,
+                status=task_status, priority=priority, due_date=due)
+        Task.objects.create(  # pylint: disable=no-member
+            title="Elsewhere", created_by=owner, for_team=other, assigned_to=alice,
+            due_date=today - timedelta(days=5))
+
+        response = self.client_for(owner).get(f"/api/teams/{team.id}/summary/")
+        self.assertEqual(response.status_code, 200)
+
+        tasks = Task.objects.filter(for_team=team)  # pylint: disable=no-member
+        self.assertEqual(response.data["total_tasks"], tasks.count())
+        self.assertEqual(response.data["overdue_tasks"], tasks.filter(
+            due_date__lt=today).exclude(status="completed").count())
+        self.assertEqual(response.data["overdue_tasks"], 2)
+        for field in ("status", "priority"):
+            expected = {choice: 0 for choice in response.data[f"by_{field}"]}
+            expected.update(tasks.values_list(field).annotate(total=Count("id")))
+            self.assertEqual(response.data[f"by_{field}"], expected)
+        expected = {}
+        for assignee_id, task_status, total in tasks.values_list(
+                "assigned_to_id", "status").annotate(total=Count("id")):
+            expected.setdefault(assignee_id, {})[task_status] = total
+        self.assertEqual(
+            {group["id"]: {key: count for key, count in group["by_status"].items() if count}
+             for group in response.data["by_assignee"]},
+            expected)
+        self.assertEqual({group["id"]: group["total"] for group in response.data["by_assignee"]},
+                         {None: 2, alice.id: 3, owner.id: 1})
+
+
+# -----------------------------
+# Team response cache and conditional GET
+# -----------------------------
+
+class TeamResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        self.client = self.client_for(self.owner)
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        TeamMembership.objects.create(  # pylint: disable=no-member
+            team=self.team, user=self.owner, role_in_team="owner")
+        self.url = f"/api/teams/{self.team.id}/details/"
+
+    def revalidate(self, etag):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_team_revalidates_with_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.revalidate(response["ETag"]).status_code, 304)
+
+    def test_task_write_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        Task.objects.create(  # pylint: disable=no-member
+            title="New", created_by=self.owner, for_team=self.team)
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task["title"] for task in response.data["tasks"]], ["New"])
+
+    def test_write_seen_by_another_process_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        Task.objects.create(  # pylint: disable=no-member
+            title="New", created_by=self.owner, for_team=self.team)
+        # a worker whose response cache never saw any bump
+        for cache in caches.all():
+            cache.clear()
+        self.assertEqual(self.revalidate(etag).status_code, 200)
+
+    def test_saving_a_stale_team_keeps_the_newer_version(self):
+        stale = Team.objects.get(id=self.team.id)  # pylint: disable=no-member
+        Task.objects.create(  # pylint: disable=no-member
+            title="New", created_by=self.owner, for_team=self.team)
+        bumped = Team.objects.get(id=self.team.id).data_version  # pylint: disable=no-member
+        stale.name = "Renamed"
+        stale.save()
+        self.assertGreater(
+            Team.objects.get(id=self.team.id).data_version, bumped)  # pylint: disable=no-member
+
+
+class AsyncTeamViewsTests(APITestCase):
+    """The async team views return what their sync counterparts return"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        for user, role in ((self.owner, "owner"), (self.alice, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=self.team, user=user, role_in_team=role)
+        for n in range(3):
+            Task.objects.create(  # pylint: disable=no-member
+                title=f"Task {n}", created_by=self.owner, for_team=self.team,
+                assigned_to=self.alice if n else None)
+        access = self.client.post(
+            "/api/login/", {"username": "alice", "password": "password-123"}).data["access"]
+        self.headers = {"Authorization": "Bearer " + access}
+
+    async def run_inline(self, queryset):
+        # the test database is only visible to this connection
+        return await sync_to_async(list)(queryset)
+
+    def test_same_payloads_and_etags(self):
+        with mock.patch("api.async_views.run_query", self.run_inline):
+            for path in ("teams/", f"teams/{self.team.id}/details/", f"teams/{self.team.id}/members/",
+                         f"teams/{self.team.id}/tasks/my-tasks/"):
+                sync_response = self.client.get("/api/" + path, headers=self.headers)
+                async_response = async_to_sync(AsyncClient().get)(
+                    "/api/async/" + path, headers=self.headers)
+                self.assertEqual(async_response.status_code, 200, path)
+                self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content), path)
+                self.assertEqual(async_response.get("ETag"), sync_response.get("ETag"), path)
+
+
+# -----------------------------
+# Task change feed
+# -----------------------------
+
+@override_settings(TASK_CHANGES={"SETTLE_SECONDS": 0})
+class TaskChangesTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        self.member = User.objects.create_user("member", "member@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        for user, role in ((self.owner, "owner"), (self.member, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=self.team, user=user, role_in_team=role)
+        self.team_task = Task.objects.create(  # pylint: disable=no-member
+            title="Team task", created_by=self.owner, for_team=self.team)
+        self.own_team_task = Task.objects.create(  # pylint: disable=no-member
+            title="Member's team task", created_by=self.member, for_team=self.team)
+
+    def head(self, user):
+        return self.client_for(user).get("/api/tasks/changes/").data["cursor"]
+
+    def sync(self, user, cursor):
+        response = self.client_for(user).get(f"/api/tasks/changes/?cursor={cursor}")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_writes_since_the_cursor(self):
+        cursor = self.head(self.member)
+        created = Task.objects.create(  # pylint: disable=no-member
+            title="New", created_by=self.owner, for_team=self.team)
+        self.team_task.status = "completed"
+        self.team_task.save()
+        deleted_id = self.own_team_task.id
+        self.own_team_task.delete()
+
+        data = self.sync(self.member, cursor)
+        self.assertEqual(sorted(task["id"] for task in data["results"]),
+                         sorted([created.id, self.team_task.id]))
+        self.assertEqual(data["deleted"], [deleted_id])
+        self.assertEqual(self.sync(self.member, data["cursor"])["results"], [])
+
+    def test_task_moved_out_of_a_team_is_a_tombstone(self):
+        cursor = self.head(self.member)
+        self.team_task.for_team = None
+        self.team_task.save()
+        self.assertEqual(self.sync(self.member, cursor)["deleted"], [self.team_task.id])
+
+    def test_removed_member_gets_tombstones_for_the_team_tasks(self):
+        cursor = self.head(self.member)
+        TeamMembership.objects.filter(  # pylint: disable=no-member
+            team=self.team, user=self.member).delete()
+
+        data = self.sync(self.member, cursor)
+        # their own task stays visible to them
+        self.assertEqual(data["deleted"], [self.team_task.id])
+        # the other members lose nothing
+        self.assertEqual(self.sync(self.owner, cursor)["deleted"], [])
+
+    def test_deleted_team_tombstones_its_tasks_for_members(self):
+        cursor = self.head(self.member)
+        self.team.delete()
+        data = self.sync(self.member, cursor)
+        self.assertEqual(data["deleted"], [self.team_task.id])
+        self.assertEqual([task["id"] for task in data["results"]], [self.own_team_task.id])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client_for(self.member).get(
+            f"/api/tasks/changes/?cursor={make_cursor(['changes', 'x', 'y'])}")
+        self.assertEqual(response.status_code, 400)
+
+
+# -----------------------------
+# Live team events
+# -----------------------------
+
+@override_settings(EVENT_STREAM={"ENABLED": True, "HEARTBEAT_SECONDS": 1})
+class TeamEventsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = User.objects.create_user("member", "member@example.com", "password-123")
+        self.outsider = User.objects.create_user("outsider", "outsider@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        TeamMembership.objects.create(  # pylint: disable=no-member
+            team=self.team, user=self.member, role_in_team="member")
+        self.url = f"/api/teams/{self.team.id}/events/"
+
+    def ticket(self, user):
+        return self.client_for(user).post(self.url + "ticket/")
+
+    async def first_chunk(self, ticket):
+        response = await AsyncClient().get(self.url, {"ticket": ticket})
+        if response.status_code != 200:
+            return response.status_code, None
+        chunks = aiter(response.streaming_content)
+        chunk = await anext(chunks)
+        await chunks.aclose()
+        return response.status_code, chunk
+
+    def test_ticket_needs_membership_and_streaming_enabled(self):
+        self.assertEqual(self.ticket(self.outsider).status_code, 403)
+        with override_settings(EVENT_STREAM={"ENABLED": False}):
+            self.assertEqual(self.ticket(self.member).status_code, 404)
+
+    def test_ticket_opens_one_stream(self):
+        ticket = self.ticket(self.member).data["ticket"]
+        self.assertEqual(async_to_sync(self.first_chunk)(ticket), (200, b"retry: 5000\n\n"))
+        # used
+        self.assertEqual(async_to_sync(self.first_chunk)(ticket), (401, None))
+
+    def test_ticket_is_bound_to_its_team(self):
+        other = Team.objects.create(name="Other")  # pylint: disable=no-member
+        TeamMembership.objects.create(  # pylint: disable=no-member
+            team=other, user=self.member, role_in_team="member")
+        ticket = self.client_for(self.member).post(f"/api/teams/{other.id}/events/ticket/").data["ticket"]
+        self.assertEqual(async_to_sync(self.first_chunk)(ticket), (401, None))
+
+    def test_wsgi_refuses_to_stream(self):
+        ticket = self.ticket(self.member).data["ticket"]
+        response = self.client.get(self.url, {"ticket": ticket})
+        self.assertEqual(response.status_code, 501)
+
+
+    def test_ticket_names_the_stream_url(self):
+        data = self.ticket(self.member).data
+        self.assertEqual(data["url"],
+                         "http://testserver" + self.url + "?" + urlencode({"ticket": data["ticket"]}))
+        with override_settings(EVENT_STREAM={"ENABLED": True,
+                                             "STREAM_URL": "https://events.example.com/api/"}):
+            url = self.ticket(self.member).data["url"]
+        self.assertTrue(url.startswith(f"https://events.example.com/api/teams/{self.team.id}/events/?ticket="))
+
+
+@override_settings(EVENT_STREAM={"CHANNEL_URL": "redis://channel"})
+class EventChannelTests(TestCase):
+    event = {"type": "created", "task_id": 9}
+
+    def test_publish_goes_through_the_channel(self):
+        client = mock.Mock()
+        with mock.patch("api.events._publisher", client):
+            events.publish([(3, self.event)])
+        pipeline = client.pipeline.return_value
+        pipeline.publish.assert_called_once_with(events.CHANNEL, json.dumps([3, self.event]))
+        pipeline.execute.assert_called_once_with()
+
+    def test_failed_publish_is_logged(self):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = ConnectionError("redis down")
+        with mock.patch("api.events._publisher", client), self.assertLogs("api.events", "ERROR"):
+            events.publish([(3, self.event)])
+
+    async def subscribed(self, action):
+        """Run `action` with a stream of team 3 open; the stream's next event"""
+        with mock.patch.object(events.listener, "ensure_started"):
+            subscription = events.broker.subscribe(3)
+        try:
+            action()
+            return await subscription.get(1)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    def test_listener_feeds_the_broker(self):
+        client = mock.Mock()
+        client.pubsub.return_value.listen.return_value = [
+            {"data": b"not json"}, {"data": json.dumps([3, self.event]).encode()}]
+        with self.assertLogs("api.events", "WARNING"):
+            event = async_to_sync(self.subscribed)(lambda: events.listener.listen(client))
+        client.pubsub.return_value.subscribe.assert_called_once_with(events.CHANNEL)
+        self.assertEqual((event["type"], event["task_id"], event["team_id"]), ("created", 9, 3))
+
+    def test_lost_channel_ends_the_streams(self):
+        event = async_to_sync(self.subscribed)(events.broker.overflow_all)
+        self.assertEqual(event["type"], events.OVERFLOW)
+
+
+# -----------------------------
+# Task search
+# -----------------------------
+
+class TaskSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.client = self.client_for(self.user)
+        for title in ("Fix login bug", "Logout button", "Blog post", "Login page redesign"):
+            Task.objects.create(title=title, created_by=self.user)  # pylint: disable=no-member
+
+    def titles(self, query):
+        response = self.client.get("/api/tasks/search/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return sorted(task["title"] for task in response.data["results"])
+
+    def test_last_term_matches_as_a_prefix(self):
+        self.assertEqual(self.titles("log"), ["Fix login bug", "Login page redesign", "Logout button"])
+        self.assertEqual(self.titles("login"), ["Fix login bug", "Login page redesign"])
+        self.assertEqual(self.titles("login pa"), ["Login page redesign"])
+        self.assertEqual(self.titles("lo"), ["Fix login bug", "Login page redesign", "Logout button"])
+
+
+# -----------------------------
+# Metrics across worker processes
+# -----------------------------
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.mkdtemp(prefix="test-metrics-")
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        self.settings_override = override_settings(REQUEST_METRICS={
+            "SAMPLE_RATE": 1, "TOKEN": "secret", "MULTIPROCESS_DIR": self.metrics_dir})
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def exited_pid(self):
+        process = subprocess.Popen(["true"])  # pylint: disable=consider-using-with
+        process.wait()
+        return process.pid
+
+    def write_snapshot(self, pid, requests, pending):
+        labels = [["route", "api/tasks/"], ["method", "GET"]]
+        with open(os.path.join(self.metrics_dir, f"metrics-{pid}.json"), "w", encoding="utf-8") as file:
+            json.dump({
+                "histograms": {"http_request_sql_queries": [[labels, [0, requests] + [0] * 9, requests]]},
+                "samples": [["response_cache_hits_total", "response_cache hits", "counter", requests],
+                            ["activity_log_pending", "Activity log entries waiting", "gauge", pending]],
+            }, file)
+
+    def scrape(self):
+        response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def value(self, text, series):
+        for line in text.splitlines():
+            if line.startswith(series + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return None
+
+    def test_scrape_sums_every_worker(self):
+        own_hits = metrics.registry.snapshot()["samples"]
+        own_hits = dict((name, value) for name, _, _, value in own_hits)["response_cache_hits_total"]
+        self.write_snapshot(os.getppid(), requests=3, pending=2)
+        exited = self.exited_pid()
+        self.write_snapshot(exited, requests=4, pending=5)
+
+        text = self.scrape()
+        count = 'http_request_sql_queries_count{route="api/tasks/",method="GET"}'
+        self.assertEqual(self.value(text, count), 7)
+        self.assertEqual(self.value(text, "response_cache_hits_total"), own_hits + 7)
+        # an exited worker's gauges no longer count
+        self.assertEqual(self.value(text, "activity_log_pending") or 0, 2)
+
+        # folded once: a second scrape counts the exited worker once
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, f"metrics-{exited}.json")))
+        self.assertEqual(self.value(self.scrape(), count), 7)
+
+
+# -----------------------------
+# Activity timelines
+# -----------------------------
+
+class TaskActivityTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password-123")
+        self.carol = User.objects.create_user("carol", "carol@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        for user, role in ((self.alice, "owner"), (self.bob, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=self.team, user=user, role_in_team=role)
+
+    def timeline(self, user, task_id):
+        return self.client_for(user).get(f"/api/tasks/{task_id}/activity/")
+
+    def test_deleted_task_timeline(self):
+        client = self.client_for(self.alice)
+        task_id = client.post("/api/tasks/bulk/", [{"title": "Task", "for_team": self.team.id}],
+                              format="json").data[0]["id"]
+        self.assertEqual(client.delete(f"/api/tasks/{task_id}/").status_code, 204)
+
+        response = self.timeline(self.alice, task_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry["code"] for entry in response.data["results"]],
+                         ["task.deleted", "task.created"])
+        self.assertEqual(self.timeline(self.bob, task_id).status_code, 200)
+        self.assertEqual(self.timeline(self.carol, task_id).status_code, 404)
+        self.assertEqual(self.timeline(self.alice, task_id + 1000).status_code, 404)
+
+        TeamMembership.objects.filter(user=self.bob).delete()  # pylint: disable=no-member
+        self.assertEqual(self.timeline(self.bob, task_id).status_code, 404)
+
+
+class ActivityLogViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password-123")
+        # the log store outlives each test's rollback: a code of its own
+        # keeps this test's entries apart
+        self.code = f"test.{self._testMethodName}"
+        self.start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        get_backend().write([
+            {"user": "alice", "action": f"entry {number}", "code": self.code, "task_id": str(number),
+             "team_id": None, "timestamp": self.start + timedelta(minutes=number)}
+            for number in range(7)])
+
+    def logs(self, **params):
+        return self.client_for(self.admin).get(
+            "/api/logs/?" + urlencode({"code": self.code, **params}))
+
+    def test_pages_follow_next_cursor_newest_first(self):
+        pages, cursor = [], None
+        while True:
+            response = self.logs(limit=3, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            pages.append([entry["task_id"] for entry in response.data["results"]])
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(pages, [["6", "5", "4"], ["3", "2", "1"], ["0"]])
+        self.assertIsNone(self.logs(limit=7).data["next_cursor"])
+
+    def test_since_and_until_bound_the_entries(self):
+        since = (self.start + timedelta(minutes=2)).isoformat()
+        until = (self.start + timedelta(minutes=5)).isoformat()
+        response = self.logs(since=since, until=until)
+        self.assertEqual(response.status_code, 200)
+        # since is inclusive, until exclusive
+        self.assertEqual([entry["task_id"] for entry in response.data["results"]], ["4", "3", "2"])
+
+        # an aware time is converted to UTC first
+        since = (self.start + timedelta(minutes=5, hours=2)).isoformat() + "+02:00"
+        self.assertEqual([entry["task_id"] for entry in self.logs(since=since).data["results"]],
+                         ["6", "5"])
+        self.assertEqual(self.logs(since="yesterday").status_code, 400)
+
+    def test_malformed_cursors_are_rejected(self):
+        timestamp = self.start.isoformat()
+        for cursor in ["not-base64!", make_cursor({"a": 1}), make_cursor([timestamp]),
+                       make_cursor(["not a time", "00000001-000000000000"]),
+                       make_cursor([timestamp, "not-an-id"]), make_cursor([timestamp, 1])]:
+            self.assertEqual(self.logs(cursor=cursor).status_code, 400, cursor)
+
+    def test_only_superusers_list_logs(self):
+        user = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.assertEqual(self.client_for(user).get("/api/logs/").status_code, 403)
+
+
+class FileLogRollupTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="test-rollups-")
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.backend = FileLogBackend({"PATH": self.path, "FSYNC": False, "INDEX_INTERVAL_BYTES": 2048})
+        start = datetime(2024, 1, 1)
+        # a block is indexed (with its rollup) per commit past 2 KiB
+        for first in range(0, 500, 20):
+            self.backend.write([
+                {"user": f"user{number % 3}", "action": "updated task", "code": "task.updated",
+                 "task_id": str(number % 7), "team_id": str(number % 2),
+                 "timestamp": start + timedelta(hours=number)}
+                for number in range(first, first + 20)])
+
+    def scanned(self, group_by, filters, since=None, until=None):
+        with mock.patch.object(Segment, "rollups", return_value={}):
+            return self.backend.aggregate(group_by, filters, since=since, until=until)
+
+    def test_rollups_count_like_a_scan(self):
+        segment = Segment(1, self.path)
+        segment.load()
+        self.assertGreater(len(segment.rollups()), 10)
+        since, until = datetime(2024, 1, 3, 5), datetime(2024, 1, 15, 17)
+        for group_by, filters in (("day", {}), ("user", {"team_id": "1"}), ("task_id", {}),
+                                  ("day", {"task_id": "3"})):
+            expected = self.scanned(group_by, filters, since, until)
+            self.assertTrue(expected)
+            self.assertEqual(self.backend.aggregate(group_by, filters, since=since, until=until),
+                             expected)
+        self.assertEqual(sum(self.backend.aggregate("team_id", {}).values()), 500)
+
+
+class FileLogBackendTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix="test-file-logs-")
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.start = datetime(2024, 1, 1)
+
+    def backend(self, **options):
+        return FileLogBackend({"PATH": self.path, "FSYNC": False, **options})
+
+    def entries(self, first, count, **fields):
+        return [{"user": "alice", "action": f"entry {number}", "code": "task.updated",
+                 "timestamp": self.start + timedelta(minutes=number), **fields}
+                for number in range(first, first + count)]
+
+    def stored(self, number=1):
+        with open(Segment(number, self.path).path, "rb") as segment_file:
+            data = segment_file.read()
+        offsets, records, offset = [], [], 0
+        for line in data.splitlines(keepends=True):
+            offsets.append(offset)
+            records.append(json.loads(line))
+            offset += len(line)
+        return offsets, records
+
+    def test_group_commit_appends_waiting_writers_together_in_order(self):
+        backend = self.backend()
+        commit = backend._commit  # pylint: disable=protected-access
+        leading, release = threading.Event(), threading.Event()
+
+        def slow_commit(entries):
+            if not leading.is_set():
+                leading.set()
+                release.wait(5)
+            commit(entries)
+
+        with mock.patch.object(backend, "_commit", side_effect=slow_commit):
+            threads = [threading.Thread(target=backend.write, args=(self.entries(0, 1),))]
+            threads[0].start()
+            leading.wait(5)
+            # both arrive while the first commit is in progress
+            threads += [threading.Thread(target=backend.write, args=(self.entries(number, 2),))
+                        for number in (1, 3)]
+            for thread in threads[1:]:
+                thread.start()
+            for _ in range(500):
+                with backend._commit_cond:  # pylint: disable=protected-access
+                    if backend._group is not None and len(backend._group.entries) == 4:  # pylint: disable=protected-access
+                        break
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(backend.commits, 2)
+        self.assertEqual(backend.entries_written, 5)
+        offsets, records = self.stored()
+        # ids are the byte offsets, so they follow the file order
+        self.assertEqual([record["id"] for record in records],
+                         [f"00000001-{offset:012d}" for offset in offsets])
+        self.assertEqual(records[0]["action"], "entry 0")
+        # each writer's entries stay together and in order
+        actions = [record["action"] for record in records[1:]]
+        self.assertIn(actions, [["entry 1", "entry 2", "entry 3", "entry 4"],
+                                ["entry 3", "entry 4", "entry 1", "entry 2"]])
+        self.assertEqual([entry["id"] for entry in backend.query({}, limit=10)],
+                         sorted((record["id"] for record in records), reverse=True))
+
+    def test_torn_last_line_is_cut_before_the_next_append(self):
+        self.backend().write(self.entries(0, 2))
+        with open(Segment(1, self.path).path, "ab") as segment_file:
+            segment_file.write(b'{"id":"00000001-0000000')
+        size = os.path.getsize(Segment(1, self.path).path) - len(b'{"id":"00000001-0000000')
+
+        # a restarted process
+        backend = self.backend()
+        backend.write(self.entries(2, 1))
+        offsets, records = self.stored()
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[-1]["id"], f"00000001-{size:012d}")
+        self.assertEqual(offsets[-1], size)
+        self.assertEqual([entry["action"] for entry in backend.query({})],
+                         ["entry 2", "entry 1", "entry 0"])
+
+    def test_query_reads_the_unindexed_tail(self):
+        backend = self.backend(INDEX_INTERVAL_BYTES=1024)
+        for first in range(0, 60, 10):
+            backend.write(self.entries(first, 10))
+        backend.write(self.entries(60, 2))
+        segment = Segment(1, self.path)
+        segment.load()
+        self.assertTrue(segment.blocks)
+        self.assertGreater(segment.size, segment.tail_start)
+
+        since = self.start + timedelta(minutes=55)
+        expected = [f"entry {number}" for number in range(61, 54, -1)]
+        self.assertEqual([entry["action"] for entry in backend.query({}, since=since)], expected)
+        # with the index lost, everything is tail
+        os.remove(segment.index_path)
+        self.assertEqual([entry["action"] for entry in self.backend().query({}, since=since)],
+                         expected)
+        self.assertEqual(len(self.backend().query({}, limit=100)), 62)
+
+    def test_cursor_pages_across_segment_rotation(self):
+        backend = self.backend(MAX_SEGMENT_BYTES=1024, INDEX_INTERVAL_BYTES=512)
+        for number in range(40):
+            backend.write(self.entries(number, 1, team_id=str(number % 2)))
+        self.assertGreater(backend.stats()["segments"], 2)
+
+        for filters, expected in (({}, list(range(39, -1, -1))),
+                                  ({"team_id": "1"}, list(range(39, 0, -2)))):
+            actions, before = [], None
+            while True:
+                page = backend.query(filters, before=before, limit=7)
+                if not page:
+                    break
+                actions += [entry["action"] for entry in page]
+                before = (page[-1]["timestamp"], page[-1]["id"])
+            self.assertEqual(actions, [f"entry {number}" for number in expected])
+
+    def test_expiring_the_last_segment_starts_a_new_number(self):
+        backend = self.backend()
+        backend.write(self.entries(0, 3))
+        backend.apply_ttl(timedelta(days=1))
+        self.assertEqual(sorted(os.listdir(self.path)), [".lock", "segment-00000002.ndjson"])
+
+        backend.write(self.entries(3, 1))
+        self.assertTrue(backend.query({})[0]["id"].startswith("00000002-"))
+
+
+# -----------------------------
+# Activity log writer
+# -----------------------------
+
+class RecordingSink:
+    """Stands in for the log backend: keeps every batch it is given"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.written = threading.Event()
+
+    def __call__(self, batch):
+        if self.fail:
+            raise OSError("store down")
+        self.batches.append(list(batch))
+        self.written.set()
+
+    @property
+    def entries(self):
+        return [entry for batch in self.batches for entry in batch]
+
+
+class ActivityLogWriterTests(TestCase):
+    def writer(self, **options):
+        sink = options.pop("sink", None) or RecordingSink()
+        writer = ActivityLogWriter(sink=sink, **options)
+        self.addCleanup(writer.stop)
+        return writer, sink
+
+    def fill(self, writer, count):
+        # no worker thread: the queue only empties through stop()
+        with mock.patch.object(ActivityLogWriter, "_ensure_started"):
+            return [writer.enqueue(number) for number in range(count)]
+
+    def test_drop_oldest_keeps_the_newest(self):
+        writer, sink = self.writer(max_queue_size=3, overflow_policy="drop_oldest")
+        self.assertEqual(self.fill(writer, 5), [True] * 5)
+        self.assertEqual(writer.stats(),
+                         {"queued": 5, "flushed": 0, "dropped": 2, "failed": 0, "pending": 3})
+        writer.stop()
+        self.assertEqual(sink.entries, [2, 3, 4])
+        self.assertEqual(writer.stats()["flushed"], 3)
+
+    def test_drop_newest_keeps_the_oldest(self):
+        writer, sink = self.writer(max_queue_size=3, overflow_policy="drop_newest")
+        self.assertEqual(self.fill(writer, 5), [True, True, True, False, False])
+        self.assertEqual(writer.stats(),
+                         {"queued": 3, "flushed": 0, "dropped": 2, "failed": 0, "pending": 3})
+        writer.stop()
+        self.assertEqual(sink.entries, [0, 1, 2])
+
+    def test_block_waits_for_room(self):
+        writer, sink = self.writer(max_queue_size=2, overflow_policy="block", block_timeout=0.01)
+        self.assertEqual(self.fill(writer, 3), [True, True, False])
+        self.assertEqual(writer.stats()["dropped"], 1)
+
+        writer.block_timeout = 5
+        # a consumer makes room while the producer waits
+        timer = threading.Timer(0.05, writer._queue.get_nowait)  # pylint: disable=protected-access
+        timer.start()
+        with mock.patch.object(ActivityLogWriter, "_ensure_started"):
+            self.assertTrue(writer.enqueue("late"))
+        timer.join()
+        writer.stop()
+        self.assertEqual(sink.entries, [1, "late"])
+        self.assertEqual(writer.stats()["queued"], 3)
+
+    def test_flushes_a_full_batch(self):
+        writer, sink = self.writer(batch_size=3, flush_interval=60)
+        for number in range(3):
+            writer.enqueue(number)
+        self.assertTrue(sink.written.wait(5))
+        self.assertEqual(sink.batches, [[0, 1, 2]])
+
+    def test_flushes_after_the_interval(self):
+        writer, sink = self.writer(batch_size=100, flush_interval=0.05)
+        writer.enqueue("alone")
+        self.assertTrue(sink.written.wait(5))
+        self.assertEqual(sink.batches, [["alone"]])
+
+    def test_stop_drains_the_queue(self):
+        writer, sink = self.writer(batch_size=2, flush_interval=60)
+        self.fill(writer, 5)
+        writer._ensure_started()  # pylint: disable=protected-access
+        writer.stop()
+        self.assertEqual(sink.entries, [0, 1, 2, 3, 4])
+        self.assertTrue(all(len(batch) <= 2 for batch in sink.batches))
+        self.assertEqual(writer.stats(),
+                         {"queued": 5, "flushed": 5, "dropped": 0, "failed": 0, "pending": 0})
+
+    def test_failed_batches_are_counted(self):
+        writer, _ = self.writer(sink=RecordingSink(fail=True))
+        self.fill(writer, 4)
+        with self.assertLogs("api.logs.writer", "ERROR"):
+            writer.stop()
+        self.assertEqual(writer.stats()["failed"], 4)
+
+    def test_restarts_the_worker_after_fork(self):
+        writer, sink = self.writer(batch_size=100, flush_interval=0.05)
+        writer.enqueue("parent")
+        parent_thread = writer._thread  # pylint: disable=protected-access
+        # the child of a fork has a new pid and none of the parent's threads
+        with mock.patch("api.logs.writer.os.getpid", return_value=os.getpid() + 1):
+            writer.enqueue("child")
+            self.assertIsNot(writer._thread, parent_thread)  # pylint: disable=protected-access
+            self.assertTrue(writer._thread.is_alive())  # pylint: disable=protected-access
+            writer.stop()
+        parent_thread.join(5)
+        self.assertCountEqual(sink.entries, ["parent", "child"])
+
+    @override_settings(ACTIVITY_LOG_WRITER={"ASYNC": True, "MAX_QUEUE_SIZE": 7})
+    def test_process_writer_is_stopped_at_exit(self):
+        with mock.patch("api.logs.writer._writer", None), \
+                mock.patch("api.logs.writer.atexit.register") as register:
+            writer = get_writer()
+            self.assertIs(get_writer(), writer)
+        register.assert_called_once_with(writer.stop)
+        self.assertEqual(writer._queue.maxsize, 7)  # pylint: disable=protected-access
+
+
+# -----------------------------
+# Activity log archive
+# -----------------------------
+
+class LogArchiveTests(TestCase):
+    def setUp(self):
+        path = tempfile.mkdtemp(prefix="test-archive-")
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        self.archive = LogArchive(path)
+
+    def entries(self, day, count):
+        return [{"id": f"{day:%d}-{number:03d}", "action": "update_task", "task_id": number % 2,
+                 "timestamp": day + timedelta(minutes=number)} for number in range(count)]
+
+    def test_add_again_keeps_one_copy(self):
+        entries = self.entries(datetime(2024, 1, 5), 10)
+        self.archive.add(entries)
+        self.archive.add(entries[3:])
+        self.assertEqual(len(self.archive.query({}, limit=100)), 10)
+
+    def test_compaction_interrupted_before_the_dailies_go(self):
+        self.archive.add(self.entries(datetime(2024, 1, 5), 10) + self.entries(datetime(2024, 1, 6), 10))
+        # a compaction that wrote the monthly partition but removed no daily
+        with mock.patch("api.logs.archive.os.remove"):
+            self.assertEqual(self.archive.compact(datetime(2024, 3, 1)), 1)
+        self.assertEqual(len(self.archive.query({}, limit=100)), 20)
+        self.assertEqual(self.archive.aggregate("task_id", {}), {0: 10, 1: 10})
+
+        self.assertEqual(self.archive.compact(datetime(2024, 3, 1)), 1)
+        self.assertEqual([partition.monthly for partition in self.archive.partitions(covered=True)],
+                         [True])
+        self.assertEqual(len(self.archive.query({}, limit=100)), 20)
+
+    def test_query_pages_newest_first(self):
+        self.archive.add(self.entries(datetime(2024, 1, 5), 10) + self.entries(datetime(2024, 1, 6), 10))
+        page = self.archive.query({"task_id": 1}, limit=7)
+        self.assertEqual([entry["id"] for entry in page],
+                         ["06-009", "06-007", "06-005", "06-003", "06-001", "05-009", "05-007"])
+        last = page[-1]
+        page = self.archive.query({"task_id": 1}, before=(last["timestamp"], last["id"]), limit=7)
+        self.assertEqual([entry["id"] for entry in page], ["05-005", "05-003", "05-001"])
+
+
+# -----------------------------
+# Activity log store connection
+# -----------------------------
+
+@override_settings(MONGO_URI="mongodb://localhost:27017", MONGO_DB="test_logs",
+                   MONGO={"MAX_POOL_SIZE": 7, "SERVER_SELECTION_TIMEOUT_MS": 1234})
+class LogConnectionTests(TestCase):
+    def setUp(self):
+        # no connection registered yet; whatever was is back after the test
+        for registry in (mongo_connection._connection_settings,  # pylint: disable=protected-access
+                         mongo_connection._connections,  # pylint: disable=protected-access
+                         mongo_connection._dbs):  # pylint: disable=protected-access
+            patcher = mock.patch.dict(registry, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_clients)
+
+    @staticmethod
+    def close_clients():
+        for client in mongo_connection._connections.values():  # pylint: disable=protected-access
+            client.close()
+
+    def test_importing_settings_does_not_connect(self):
+        with mock.patch("mongoengine.connect") as connect:
+            importlib.reload(importlib.import_module("TaskManagementSystem.settings"))
+        connect.assert_not_called()
+        self.assertEqual(mongo_connection._connection_settings, {})  # pylint: disable=protected-access
+
+    def test_first_use_connects_once_with_the_client_options(self):
+        # pymongo's client is lazy: registering it opens no socket
+        with mock.patch("api.logs.connection.connect", wraps=mongo_connection.connect) as connect:
+            threads = [threading.Thread(target=ActivityLog._get_db)  # pylint: disable=protected-access
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+            self.assertEqual(ActivityLog._get_db().name, "test_logs")  # pylint: disable=protected-access
+        connect.assert_called_once_with(db="test_logs", host="mongodb://localhost:27017",
+                                        alias="default", **log_connection.client_options())
+        options = connect.call_args.kwargs
+        self.assertEqual((options["maxPoolSize"], options["serverSelectionTimeoutMS"]), (7, 1234))
+
+
+# -----------------------------
+# Authentication
+# -----------------------------
+
+class ClaimsAuthTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # token versions are cached per process, not in a cache alias
+        auth._versions.clear()  # pylint: disable=protected-access
+        self.owner = User.objects.create_user("owner", "owner@example.com", "password-123")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+        self.team = Team.objects.create(name="Team")  # pylint: disable=no-member
+        for user, role in ((self.owner, "owner"), (self.alice, "member")):
+            TeamMembership.objects.create(  # pylint: disable=no-member
+                team=self.team, user=user, role_in_team=role)
+        self.task = Task.objects.create(  # pylint: disable=no-member
+            title="Task", created_by=self.owner, assigned_to=self.alice, for_team=self.team)
+
+    def login(self, username):
+        response = self.client.post("/api/login/", {"username": username, "password": "password-123"})
+        self.assertEqual(response.status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + response.data["access"])
+        return client
+
+    def test_assignee_updates_status_from_claims(self):
+        client = self.login("alice")
+        response = client.patch(f"/api/teams/{self.team.id}/tasks/{self.task.id}/update-status/",
+                                {"status": "completed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, "completed")
+
+        members = client.get(f"/api/teams/{self.team.id}/details/").data["members"]
+        self.assertEqual([member["username"] for member in members if member["is_current_user"]],
+                         ["alice"])
+
+    def test_claims_skip_the_user_query_until_the_version_changes(self):
+        client = self.login("alice")
+        url = f"/api/teams/{self.team.id}/details/"
+        self.assertEqual(client.get(url).status_code, 200)
+        # role changes bump the token version: the old token is checked the
+        # usual way, so a removed member loses access at once
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMembership.objects.filter(user=self.alice).delete()  # pylint: disable=no-member
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client = self.login("alice")
+        with mock.patch.object(JWTAuthentication, "get_user") as get_user:
+            self.assertEqual(client.get(url).status_code, 403)
+            self.assertEqual(client.get("/api/tasks/").status_code, 200)
+        get_user.assert_not_called()
+
+
+class BasicAuthTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password-123")
+
+    def get(self, password):
+        credentials = base64.b64encode(f"alice:{password}".encode()).decode()
+        return APIClient().get("/api/tasks/", HTTP_AUTHORIZATION="Basic " + credentials)
+
+    def test_verified_credentials_are_cached(self):
+        with mock.patch("api.auth.BasicAuthentication.authenticate_credentials",
+                        wraps=BasicAuthentication().authenticate_credentials) as verify:
+            self.assertEqual(self.get("password-123").status_code, 200)
+            self.assertEqual(self.get("password-123").status_code, 200)
+            self.assertEqual(verify.call_count, 1)
+            self.assertEqual(self.get("wrong").status_code, 401)
+            self.assertEqual(self.get("wrong").status_code, 401)
+            self.assertEqual(verify.call_count, 3)
+
+    def test_password_change_ends_the_cached_entry(self):
+        self.assertEqual(self.get("password-123").status_code, 200)
+        self.alice.set_password("password-456")
+        self.alice.save()
+        self.assertEqual(self.get("password-123").status_code, 401)
+        self.assertEqual(self.get("password-456").status_code, 200)
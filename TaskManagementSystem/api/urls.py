@@ -1,11 +1,16 @@
 from django.urls import path
-from . import views
-from .logs.utils import ActivityLogView, check_superuser
+from . import async_views, views
+from .logs.utils import (ActivityLogStatsView, ActivityLogView, TaskActivityView,
+                         TeamActivityStatsView, TeamActivityView, check_superuser)
 
 urlpatterns = [
     # Task endpoints
     path('tasks/', views.TaskListAPIView.as_view(), name='get_tasks'),
+    path('tasks/bulk/', views.TaskBulkAPIView.as_view(), name='bulk_tasks'),
+    path('tasks/changes/', views.TaskChangesAPIView.as_view(), name='task_changes'),
+    path('tasks/search/', views.TaskSearchAPIView.as_view(), name='search_tasks'),
     path("tasks/<int:pk>/", views.TaskDetailsAPIView.as_view(), name="create_task"),
+    path("tasks/<int:pk>/activity/", TaskActivityView.as_view(), name="task_activity"),
 
     # User endpoints
     path("register/", views.RegisterView.as_view(), name="register"),
@@ -13,7 +18,9 @@ urlpatterns = [
 
     # Logs endpoints
     path("logs/", ActivityLogView.as_view(), name="activity_logs"),
+    path("logs/stats/", ActivityLogStatsView.as_view(), name="activity_log_stats"),
     path("check-superuser/", check_superuser, name="check_superuser"),
+    path("metrics/", views.metrics, name="metrics"),
 
     # Team endpoints
     path("teams/", views.MyTeamsView.as_view(), name="my_teams"),
@@ -28,6 +35,10 @@ urlpatterns = [
     # Team-based task management endpoints
     path("teams/<int:team_id>/details/",
          views.get_team_details, name="team_details"),
+    path("teams/<int:team_id>/summary/",
+         views.get_team_summary, name="team_summary"),
+    path("teams/<int:team_id>/tasks/",
+         views.get_team_tasks, name="team_tasks"),
     path("teams/<int:team_id>/tasks/create/",
          views.create_team_task, name="create_team_task"),
     path("teams/<int:team_id>/tasks/my-tasks/",
@@ -38,4 +49,21 @@ urlpatterns = [
          views.delete_team_task, name="delete_team_task"),
     path("teams/<int:team_id>/members/<int:user_id>/tasks/",
          views.get_team_member_tasks, name="team_member_tasks"),
+    path("teams/<int:team_id>/events/",
+         views.team_events, name="team_events"),
+    path("teams/<int:team_id>/events/ticket/",
+         views.team_events_ticket, name="team_events_ticket"),
+    path("teams/<int:team_id>/activity/",
+         TeamActivityView.as_view(), name="team_activity"),
+    path("teams/<int:team_id>/activity/stats/",
+         TeamActivityStatsView.as_view(), name="team_activity_stats"),
+
+    # Async (ASGI) versions of the read-heavy team endpoints
+    path("async/teams/", async_views.my_teams, name="async_my_teams"),
+    path("async/teams/<int:team_id>/details/",
+         async_views.team_details, name="async_team_details"),
+    path("async/teams/<int:team_id>/members/",
+         async_views.team_members, name="async_team_members"),
+    path("async/teams/<int:team_id>/tasks/my-tasks/",
+         async_views.my_team_tasks, name="async_my_team_tasks"),
 ]
@@ -1,41 +1,184 @@
+import hmac
+from urllib.parse import urlencode
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from .models import Task, Team, TeamMembership, User
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from django.db import IntegrityError, connection, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Exists, OuterRef, Q
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import Task, Team, TeamMembership, TeamTaskCounter, User
 from .serializer import TaskSerializer, RegisterSerializer, ProfileSerializer, TeamCreateSerializer
-from .logs.utils import log_activity
+from .logs.utils import log_activities, log_activity
+from .logs.utils import TASK_CREATED, TASK_DELETED, TASK_STATUS_CHANGED, TASK_UPDATED
+from .pagination import InvalidCursor, get_page_size, paginate_queryset
+from . import auth, membership_cache, response_cache
+from .auth import ClaimsJWTAuthentication
+from .changes import CursorExpired, changes_since, head_cursor
+from .events import OVERFLOW, broker, format_sse, issue_ticket, redeem_ticket, streaming_enabled
+from .search import search_tasks
+from .metrics import registry
+from .logs.backends import get_backend
+from .logs.writer import get_writer
+from .signals import tasks_bulk_written
+from .conditional import add_validators, latest_of, make_etag, not_modified, tasks_version
 # Create your views here.
 
+# largest list accepted by the bulk task endpoint
+MAX_BULK_TASKS = 500
+
+# typeahead size for the "add member" dialog
+CANDIDATE_USERS_LIMIT = 10
+MAX_CANDIDATE_USERS_LIMIT = 50
+
 
 class TaskListAPIView(APIView):
     permission_classes = [IsAuthenticated]
-# get the tasks created by the logged-in user
+    # orderings a client may request; each one is served by an index on
+    # (created_by, <field>) declared in Task.Meta
+    ordering_fields = ["created_at", "-created_at", "updated_at", "-updated_at"]
+    default_ordering = "-created_at"
+
+# get the tasks created by the logged-in user, one page at a time
 
     def get(self, request):
         tasks = Task.objects.filter(            # pylint: disable=no-member
             created_by=request.user)  # pylint: disable=no-member
 
-        # get the status query parameter from the request if any
-        status_param = request.query_params.get("status", None)
+        params = request.query_params
+
+        # exact-match filters: status, priority
+        for field in ("status", "priority"):
+            value = params.get(field)
+            if value:
+                tasks = tasks.filter(**{field: value})
+
+        # id filters: team, assigned_to
+        for param, field in (("team", "for_team_id"), ("assigned_to", "assigned_to_id")):
+            value = params.get(param)
+            if value:
+                if not value.isdigit():
+                    return Response({"error": f"{param} must be an id"}, status=status.HTTP_400_BAD_REQUEST)
+                tasks = tasks.filter(**{field: int(value)})
+
+        # due date range: due_after <= due_date <= due_before
+        for param, lookup in (("due_after", "due_date__gte"), ("due_before", "due_date__lte")):
+            value = params.get(param)
+            if value:
+                try:
+                    due = parse_date(value)
+                except ValueError:
+                    due = None
+                if due is None:
+                    return Response({"error": f"{param} must be a date (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+                tasks = tasks.filter(**{lookup: due})
+
+        ordering = params.get("ordering", self.default_ordering)
+        if ordering not in self.ordering_fields:
+            return Response(
+                {"error": f"Invalid ordering. Must be one of: {', '.join(self.ordering_fields)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # the version moves with every write to the user's tasks, so a change
+        # on any page invalidates the validators of every page
+        version = tasks_version(request.user.id)
+        etag = None
+        if version is not None:
+            etag = make_etag("tasks", request.user.id, request.get_full_path(), version)
+            cached = not_modified(request, etag, None)
+            if cached is not None:
+                return cached
 
-        if status_param:
-            tasks = tasks.filter(status=status_param)
-        serializer = TaskSerializer(tasks, many=True,)
-        return Response(serializer.data)
+        try:
+            page, next_cursor = paginate_queryset(tasks, request, ordering)
+        except InvalidCursor as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TaskSerializer(page, many=True,)
+        response = Response({
+            "results": serializer.data,
+            "next_cursor": next_cursor,
+        })
+        if etag is None:
+            return response
+        return add_validators(response, etag, None)
 # create a new task
 
     def post(self, request):
         serializer = TaskSerializer(data=request.data)
         if serializer.is_valid():
             task = serializer.save(created_by=request.user)
-            log_activity(self.request.user, "created task", task.id)
+            log_activity(self.request.user, "created task", task.id, TASK_CREATED, task.for_team_id)
             # serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TaskChangesAPIView(APIView):
+    """Delta sync: tasks created/updated and ids deleted since a cursor
+
+    Without a cursor only the current head cursor is returned; fetch it
+    before loading the task lists, then poll with the cursor of each
+    response. Covers the caller's own tasks and their teams' tasks.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        cursor = request.query_params.get("cursor")
+        if not cursor:
+            return Response({"results": [], "deleted": [], "cursor": head_cursor(),
+                             "has_more": False})
+        try:
+            tasks, deleted, next_cursor, has_more = changes_since(
+                request.user, cursor, get_page_size(request, default=200, maximum=1000))
+        except InvalidCursor as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except CursorExpired as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_410_GONE)
+
+        return Response({
+            "results": TaskSerializer(tasks, many=True).data,
+            "deleted": deleted,
+            "cursor": next_cursor,
+            "has_more": has_more,
+        })
+
+
+class TaskSearchAPIView(APIView):
+    """Ranked full-text search over the title and description of visible tasks
+
+    Query params: q, limit and cursor. Covers the caller's own tasks and
+    their teams' tasks.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tasks, next_cursor = search_tasks(
+                request.user, query, get_page_size(request),
+                request.query_params.get("cursor"))
+        except InvalidCursor as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "results": [dict(TaskSerializer(task).data, score=task.score) for task in tasks],
+            "next_cursor": next_cursor,
+        })
+
+
 class TaskDetailsAPIView(APIView):
     permission_classes = [IsAuthenticated]  # optional
 # helper method to get the task object
@@ -63,7 +206,7 @@ class TaskDetailsAPIView(APIView):
         serializer = TaskSerializer(task, data=request.data)
         if serializer.is_valid():
             task2 = serializer.save()
-            log_activity(self.request.user, "updated task", task2.id)
+            log_activity(self.request.user, "updated task", task2.id, TASK_UPDATED, task2.for_team_id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 # partial update
@@ -78,7 +221,7 @@ class TaskDetailsAPIView(APIView):
         serializer = TaskSerializer(task, data=request.data, partial=True)
         if serializer.is_valid():
             task2 = serializer.save()
-            log_activity(self.request.user, "updated task", task2.id)
+            log_activity(self.request.user, "updated task", task2.id, TASK_UPDATED, task2.for_team_id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -88,11 +231,152 @@ class TaskDetailsAPIView(APIView):
         if not task:
             return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        log_activity(self.request.user, "deleted task", task.id)
+        log_activity(self.request.user, "deleted task", task.id, TASK_DELETED, task.for_team_id)
         task.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+def inserted_ids(count):
+    """Ids MySQL gave the `count` rows of this connection's last INSERT"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT LAST_INSERT_ID(), @@SESSION.auto_increment_increment")
+        first, step = cursor.fetchone()
+    return [first + step * number for number in range(count)]
+
+
+class TaskBulkAPIView(APIView):
+    """Create, update or delete many of the user's tasks in one request
+
+    Every item is validated first; if any item fails nothing is written and
+    the response lists the errors per item, in request order ({} for items
+    that were valid). Valid batches are written in a single transaction.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def check_batch(self, items):
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Expected a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BULK_TASKS:
+            return Response({"error": f"At most {MAX_BULK_TASKS} tasks per request"}, status=status.HTTP_400_BAD_REQUEST)
+        return None
+
+    def validation_failed(self, errors):
+        return Response({
+            "error": "Validation failed",
+            "details": errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+# create tasks: body is a list of task objects
+
+    def post(self, request):
+        error = self.check_batch(request.data)
+        if error:
+            return error
+
+        serializer = TaskSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, dict):
+                # some DRF versions report only the failing items, by index
+                errors = [errors.get(index, {})
+                          for index in range(len(request.data))]
+            return self.validation_failed(errors)
+
+        tasks = [Task(created_by=request.user, **item)
+                 for item in serializer.validated_data]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Task.objects.bulk_create(tasks)  # pylint: disable=no-member
+            else:
+                # MySQL cannot return the new ids. One multi-row INSERT
+                # takes a single range of ids, in row order, starting at
+                # LAST_INSERT_ID(): insert everything in one statement
+                Task.objects.bulk_create(tasks, batch_size=len(tasks))  # pylint: disable=no-member
+                for task, pk in zip(tasks, inserted_ids(len(tasks))):
+                    task.pk = pk
+            tasks_bulk_written.send(sender=Task, created=tasks)
+
+        log_activities(request.user, "created task", tasks, TASK_CREATED)
+        return Response(TaskSerializer(tasks, many=True).data, status=status.HTTP_201_CREATED)
+
+# partial update: body is a list of objects with an "id" and the fields to change
+
+    def patch(self, request):
+        error = self.check_batch(request.data)
+        if error:
+            return error
+
+        ids = [item.get("id") if isinstance(item, dict) else None
+               for item in request.data]
+        tasks = Task.objects.filter(  # pylint: disable=no-member
+            created_by=request.user, id__in=[pk for pk in ids if isinstance(pk, int)]
+        ).in_bulk()
+
+        serializers, errors, seen = [], [], set()
+        for item, pk in zip(request.data, ids):
+            if not isinstance(pk, int):
+                errors.append({"id": ["A task id is required"]})
+            elif pk in seen:
+                errors.append({"id": ["Duplicate task id"]})
+            elif pk not in tasks:
+                errors.append({"id": ["Task not found"]})
+            else:
+                item_serializer = TaskSerializer(
+                    tasks[pk], data=item, partial=True)
+                errors.append(
+                    {} if item_serializer.is_valid() else item_serializer.errors)
+                serializers.append(item_serializer)
+            seen.add(pk)
+        if any(errors):
+            return self.validation_failed(errors)
+
+        now = timezone.now()
+        fields = {"updated_at"}
+        updated = []
+        for item_serializer in serializers:
+            task = item_serializer.instance
+            for attr, value in item_serializer.validated_data.items():
+                setattr(task, attr, value)
+                fields.add(attr)
+            task.updated_at = now  # bulk_update skips auto_now
+            updated.append(task)
+
+        with transaction.atomic():
+            Task.objects.bulk_update(  # pylint: disable=no-member
+                updated, sorted(fields))
+            tasks_bulk_written.send(sender=Task, updated=updated)
+        for task in updated:
+            task.reset_loaded_values()
+
+        log_activities(request.user, "updated task", updated, TASK_UPDATED)
+        return Response(TaskSerializer(updated, many=True).data)
+
+# delete tasks: body is {"ids": [...]}
+
+    def delete(self, request):
+        ids = request.data.get("ids") if isinstance(
+            request.data, dict) else None
+        error = self.check_batch(ids)
+        if error:
+            return error
+
+        tasks = Task.objects.filter(  # pylint: disable=no-member
+            created_by=request.user, id__in=[pk for pk in ids if isinstance(pk, int)]
+        ).in_bulk()
+        errors = [{} if pk in tasks else {"id": ["Task not found"]}
+                  for pk in ids]
+        if any(errors):
+            return self.validation_failed(errors)
+
+        with transaction.atomic():
+            # a queryset delete still sends post_delete for every task
+            Task.objects.filter(  # pylint: disable=no-member
+                id__in=list(tasks)).delete()
+
+        log_activities(request.user, "deleted task", tasks.values(), TASK_DELETED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class RegisterView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
@@ -128,13 +412,13 @@ class UserProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-def role_in_team(user, team):
-    try:
-        membership = TeamMembership.objects.get(  # pylint: disable=no-member
-            team=team, user=user)
-        return membership.role_in_team
-    except TeamMembership.DoesNotExist:  # pylint: disable=no-member
-        return None
+def role_in_team(user, team, fresh=False):
+    # fresh=True for checks that guard a write (see membership_cache)
+    return membership_cache.role_of(user, team.id, fresh)
+
+
+def is_team_member(user, team, fresh=False):
+    return role_in_team(user, team, fresh) is not None
 
 
 class MyTeamsView(APIView):
@@ -145,13 +429,7 @@ class MyTeamsView(APIView):
         user = request.user
         teams = Team.objects.filter(  # pylint: disable=no-member
             memberships__user=user)
-        data = [{
-            "id": team.id,
-            "name": team.name,
-            "description": team.description
-        } for team in teams]
-
-        return Response(data)
+        return Response(my_teams_data(teams))
 
 
 def check_superuser(request):
@@ -191,7 +469,7 @@ def add_member_to_team(request, team_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
 # Check if the requesting user is an admin of the team
-    if role_in_team(request.user, team) != "owner":
+    if role_in_team(request.user, team, fresh=True) != "owner":
         return Response({"error": "Only team admins can add members"}, status=status.HTTP_403_FORBIDDEN)
 
     username = request.data.get("username", None)
@@ -206,23 +484,30 @@ def add_member_to_team(request, team_id):
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if the user is already a member
-    if TeamMembership.objects.filter(team=team, user=user_to_add).exists():  # pylint: disable=no-member
+    if is_team_member(user_to_add, team, fresh=True):
         return Response({"error": "User is already a member of the team"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Add the user to the team
-    TeamMembership.objects.create(  # pylint: disable=no-member
-        team=team,
-        user=user_to_add,
-        role_in_team="member"
-    )
+    # Add the user to the team (the unique constraint catches a concurrent add)
+    try:
+        TeamMembership.objects.create(  # pylint: disable=no-member
+            team=team,
+            user=user_to_add,
+            role_in_team="member"
+        )
+    except IntegrityError:
+        return Response({"error": "User is already a member of the team"}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({"message": f"User {username} added to team {team.name}"}, status=status.HTTP_200_OK)
 
 
-# function that gets all users not in a team so they can be added
+# function that searches users not in a team so they can be added
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_users_not_in_team(request, team_id):
+    """Typeahead over users who are not team members
+
+    Query params: q (username/email prefix, case-insensitive) and limit.
+    """
     # Get the team
     try:
         team = Team.objects.get(id=team_id)  # pylint: disable=no-member
@@ -233,26 +518,27 @@ def get_users_not_in_team(request, team_id):
     if role_in_team(request.user, team) not in ["leader", "owner", "member"]:
         return Response({"error": "You must be a team member to view available users"}, status=status.HTTP_403_FORBIDDEN)
 
-    # Get all user IDs that are already in the team
-    members = TeamMembership.objects.filter(team=team).values_list(  # pylint: disable=no-member
-        'user_id', flat=True)
+    query = request.query_params.get("q", "").strip()
+    limit = get_page_size(request, default=CANDIDATE_USERS_LIMIT,
+                          maximum=MAX_CANDIDATE_USERS_LIMIT)
 
-    # Get all users excluding current team members
-    available_users = User.objects.exclude(
-        id__in=members)  # pylint: disable=no-member
+    # NOT EXISTS anti-join instead of materializing every member id
+    membership = TeamMembership.objects.filter(  # pylint: disable=no-member
+        team=team, user=OuterRef('pk'))
+    available_users = User.objects.filter(~Exists(membership))
+    if query:
+        # prefix lookups can use the username and email indexes
+        available_users = available_users.filter(
+            Q(username__istartswith=query) | Q(email__istartswith=query))
+    available_users = available_users.order_by('username').values(
+        'id', 'username', 'email', 'first_name', 'last_name')[:limit]
 
-    # Serialize the user data
-    users_data = [{
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "first_name": user.first_name,
-        "last_name": user.last_name
-    } for user in available_users]
+    users_data = list(available_users)
 
     return Response({
         "team_id": team.id,
         "team_name": team.name,
+        "query": query,
         "available_users": users_data,
         "count": len(users_data)
     }, status=status.HTTP_200_OK)
@@ -268,31 +554,170 @@ def get_team_members(request, team_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if requesting user is a member
-    if not TeamMembership.objects.filter(team=team, user=request.user).exists():  # pylint: disable=no-member
+    if not is_team_member(request.user, team):
         return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
 
     members = TeamMembership.objects.filter(  # pylint: disable=no-member
         team=team).select_related('user')  # pylint: disable=no-member
+    return Response(team_members_data(team, members), status=status.HTTP_200_OK)
+
+
+# ==========================================
+# TEAM-BASED TASK MANAGEMENT VIEWS
+# ==========================================
 
-    members_data = [{
+def team_task_data(task, user):
+    """Team task as returned by the team endpoints (needs created_by/assigned_to selected)"""
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "status": task.status,
+        "priority": task.priority,
+        "due_date": task.due_date,
+        "created_by": {
+            "id": task.created_by.id,
+            "username": task.created_by.username
+        },
+        "assigned_to": {
+            "id": task.assigned_to.id,
+            "username": task.assigned_to.username
+        } if task.assigned_to else None,
+        "created_at": task.created_at,
+        "updated_at": task.updated_at,
+        "is_assigned_to_me": task.assigned_to.id == user.id if task.assigned_to else False
+    }
+
+
+def member_task_data(task):
+    """Task as listed for a single team member (needs created_by selected)"""
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "status": task.status,
+        "priority": task.priority,
+        "due_date": task.due_date,
+        "created_by": {
+            "id": task.created_by.id,
+            "username": task.created_by.username
+        },
+        "created_at": task.created_at,
+        "updated_at": task.updated_at
+    }
+
+
+# Team payloads, built from rows the caller fetched: the sync views below
+# and their async counterparts (async_views.py) differ only in how they
+# query, never in what they return.
+
+def team_header_data(team):
+    return {
+        "id": team.id,
+        "name": team.name,
+        "description": team.description,
+        "created_at": team.created_at
+    }
+
+
+def member_data(membership):
+    """Team member (needs user selected)"""
+    return {
         "id": membership.user.id,
         "username": membership.user.username,
         "email": membership.user.email,
         "role": membership.role_in_team,
         "joined_at": membership.joined_at
-    } for membership in members]
+    }
 
-    return Response({
+
+def my_teams_data(teams):
+    return [{
+        "id": team.id,
+        "name": team.name,
+        "description": team.description
+    } for team in teams]
+
+
+def team_members_data(team, members):
+    members_data = [member_data(membership) for membership in members]
+    return {
         "team_id": team.id,
         "team_name": team.name,
         "members": members_data,
         "count": len(members_data)
-    }, status=status.HTTP_200_OK)
+    }
 
 
-# ==========================================
-# TEAM-BASED TASK MANAGEMENT VIEWS
-# ==========================================
+def team_details_data(team, user, user_role, members, team_tasks):
+    """get_team_details payload and its Last-Modified"""
+    members_data = [dict(member_data(membership), is_current_user=membership.user.id == user.id)
+                    for membership in members]
+    tasks_data = [team_task_data(task, user) for task in team_tasks]
+
+    last_modified = latest_of(
+        team.updated_at,
+        *(task["updated_at"] for task in tasks_data),
+        *(member["joined_at"] for member in members_data))
+    return {
+        "team": team_header_data(team),
+        "current_user_role": user_role,
+        "is_owner": user_role == "owner",
+        "members": members_data,
+        "tasks": tasks_data,
+        "total_tasks": len(tasks_data),
+        "total_members": len(members_data)
+    }, last_modified
+
+
+def my_team_tasks_data(team, my_tasks):
+    """get_my_team_tasks payload and its Last-Modified"""
+    tasks_data = [member_task_data(task) for task in my_tasks]
+    return {
+        "team_id": team.id,
+        "team_name": team.name,
+        "tasks": tasks_data,
+        "count": len(tasks_data)
+    }, latest_of(*(task["updated_at"] for task in tasks_data))
+
+
+def lookup_team_response(request, user, team, endpoint, *key_args):
+    """Look a team payload up in the versioned response cache
+
+    Returns (etag, key, entry, not_modified): `entry` is the cached
+    {"data", "last_modified"} or None, `not_modified` a 304 response when
+    the client's validators still match. The ETag is derived from the
+    team's data_version, so a revalidating client gets its 304 without any
+    query beyond the team row.
+    """
+    version = team.data_version
+    etag = make_etag(endpoint, team.id, user.id, version, *key_args)
+    key = response_cache.response_key(team.id, user.id, endpoint, version, *key_args)
+    entry = response_cache.get_entry(key)
+    return etag, key, entry, not_modified(
+        request, etag, entry["last_modified"] if entry else None)
+
+
+def store_team_response(key, data, last_modified):
+    entry = {"data": data, "last_modified": last_modified}
+    response_cache.set_entry(key, entry)
+    return entry
+
+
+def cached_team_response(request, team, endpoint, build, *key_args):
+    """Serve a team payload from the versioned response cache
+
+    `build` returns (data, last_modified) and only runs on a cache miss.
+    """
+    etag, key, entry, cached = lookup_team_response(
+        request, request.user, team, endpoint, *key_args)
+    if cached is not None:
+        return cached
+    if entry is None:
+        entry = store_team_response(key, *build())
+    return add_validators(Response(entry["data"], status=status.HTTP_200_OK),
+                          etag, entry["last_modified"])
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -308,56 +733,119 @@ def get_team_details(request, team_id):
     if not user_role:
         return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
 
-    # Get all team members with their roles
-    members = TeamMembership.objects.filter(  # pylint: disable=no-member
-        team=team).select_related('user')  # pylint: disable=no-member
-    members_data = [{
-        "id": membership.user.id,
-        "username": membership.user.username,
-        "email": membership.user.email,
-        "role": membership.role_in_team,
-        "joined_at": membership.joined_at,
-        "is_current_user": membership.user.id == request.user.id
-    } for membership in members]
+    def build():
+        # Get all team members with their roles
+        members = TeamMembership.objects.filter(  # pylint: disable=no-member
+            team=team).select_related('user')  # pylint: disable=no-member
 
-    # Get all tasks for this team
-    team_tasks = Task.objects.filter(for_team=team).select_related(  # pylint: disable=no-member
-        'created_by', 'assigned_to'
-    ).order_by('-created_at')
+        # Get all tasks for this team
+        team_tasks = Task.objects.filter(for_team=team).select_related(  # pylint: disable=no-member
+            'created_by', 'assigned_to'
+        ).order_by('-created_at')
 
-    tasks_data = [{
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "status": task.status,
-        "priority": task.priority,
-        "due_date": task.due_date,
-        "created_by": {
-            "id": task.created_by.id,
-            "username": task.created_by.username
-        },
-        "assigned_to": {
-            "id": task.assigned_to.id,
-            "username": task.assigned_to.username
-        } if task.assigned_to else None,
-        "created_at": task.created_at,
-        "updated_at": task.updated_at,
-        "is_assigned_to_me": task.assigned_to.id == request.user.id if task.assigned_to else False
-    } for task in team_tasks]
+        return team_details_data(team, request.user, user_role, members, team_tasks)
+
+    return cached_team_response(request, team, "team-details", build)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_team_summary(request, team_id):
+    """Team header plus task counts by status, priority and assignee, without the task list"""
+    try:
+        team = Team.objects.annotate(  # pylint: disable=no-member
+            total_members=Count('memberships')).get(id=team_id)
+    except Team.DoesNotExist:  # pylint: disable=no-member
+        return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    user_role = role_in_team(request.user, team)
+    if not user_role:
+        return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
+
+    # read the materialized counters (one row per assignee/status/priority)
+    # instead of counting the team's tasks
+    groups = TeamTaskCounter.objects.filter(  # pylint: disable=no-member
+        team=team, count__gt=0
+    ).values('status', 'priority', 'assigned_to_id', 'assigned_to__username', 'count')
+
+    # overdue depends on today's date, so it cannot be kept as a counter;
+    # it is a range count on the (for_team, due_date) index
+    total_overdue = Task.objects.filter(  # pylint: disable=no-member
+        for_team=team, due_date__lt=timezone.localdate()
+    ).exclude(status='completed').count()
+
+    by_status = {choice: 0 for choice, _ in Task.STATUS_CHOICES}
+    by_priority = {choice: 0 for choice, _ in Task.PRIORITY_CHOICES}
+    by_assignee = {}
+    total_tasks = 0
+    for group in groups:
+        count = group["count"]
+        total_tasks += count
+        by_status[group["status"]] = by_status.get(group["status"], 0) + count
+        by_priority[group["priority"]] = by_priority.get(
+            group["priority"], 0) + count
+
+        assignee = by_assignee.setdefault(group["assigned_to_id"], {
+            "id": group["assigned_to_id"],
+            "username": group["assigned_to__username"],
+            "total": 0,
+            "by_status": {choice: 0 for choice, _ in Task.STATUS_CHOICES},
+        })
+        assignee["total"] += count
+        assignee["by_status"][group["status"]] = assignee["by_status"].get(
+            group["status"], 0) + count
 
     return Response({
-        "team": {
-            "id": team.id,
-            "name": team.name,
-            "description": team.description,
-            "created_at": team.created_at
-        },
+        "team": team_header_data(team),
         "current_user_role": user_role,
         "is_owner": user_role == "owner",
-        "members": members_data,
-        "tasks": tasks_data,
-        "total_tasks": len(tasks_data),
-        "total_members": len(members_data)
+        "total_members": team.total_members,
+        "total_tasks": total_tasks,
+        "overdue_tasks": total_overdue,
+        "by_status": by_status,
+        "by_priority": by_priority,
+        # unassigned tasks are reported under id None
+        "by_assignee": list(by_assignee.values()),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_team_tasks(request, team_id):
+    """Team tasks newest first, one cursor page at a time
+
+    Query params: status, assigned_to, limit and cursor.
+    """
+    try:
+        team = Team.objects.get(id=team_id)  # pylint: disable=no-member
+    except Team.DoesNotExist:  # pylint: disable=no-member
+        return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if not is_team_member(request.user, team):
+        return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
+
+    team_tasks = Task.objects.filter(for_team=team).select_related(  # pylint: disable=no-member
+        'created_by', 'assigned_to')
+
+    status_param = request.query_params.get("status")
+    if status_param:
+        team_tasks = team_tasks.filter(status=status_param)
+    assigned_to = request.query_params.get("assigned_to")
+    if assigned_to:
+        if not assigned_to.isdigit():
+            return Response({"error": "assigned_to must be an id"}, status=status.HTTP_400_BAD_REQUEST)
+        team_tasks = team_tasks.filter(assigned_to_id=int(assigned_to))
+
+    try:
+        page, next_cursor = paginate_queryset(
+            team_tasks, request, "-created_at")
+    except InvalidCursor as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "team_id": team.id,
+        "results": [team_task_data(task, request.user) for task in page],
+        "next_cursor": next_cursor,
     }, status=status.HTTP_200_OK)
 
 
@@ -376,7 +864,7 @@ def create_team_task(request, team_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if requesting user is the owner
-    user_role = role_in_team(request.user, team)
+    user_role = role_in_team(request.user, team, fresh=True)
     print(f"User role: {user_role}")
 
     if user_role != "owner":
@@ -407,8 +895,7 @@ def create_team_task(request, team_id):
         )
 
     # Check if assigned user is a member of this team
-    is_member = TeamMembership.objects.filter(  # pylint: disable=no-member
-        team=team, user=assigned_user).exists()  # pylint: disable=no-member
+    is_member = is_team_member(assigned_user, team, fresh=True)
     print(f"Is member of team: {is_member}")
 
     if not is_member:
@@ -437,7 +924,8 @@ def create_team_task(request, team_id):
         )
         print(f"Task created: ID={task.id}")
         log_activity(
-            request.user, f"created team task for {assigned_username}", task.id)
+            request.user, f"created team task for {assigned_username}", task.id,
+            TASK_CREATED, team.id)
 
         return Response({
             "message": f"Task created and assigned to {assigned_username}",
@@ -462,36 +950,19 @@ def get_my_team_tasks(request, team_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if user is a member
-    if not TeamMembership.objects.filter(team=team, user=request.user).exists():  # pylint: disable=no-member
+    if not is_team_member(request.user, team):
         return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
 
-    # Get tasks assigned to this user in this team
-    my_tasks = Task.objects.filter(  # pylint: disable=no-member
-        for_team=team,
-        assigned_to=request.user
-    ).select_related('created_by').order_by('-created_at')
+    def build():
+        # Get tasks assigned to this user in this team
+        my_tasks = Task.objects.filter(  # pylint: disable=no-member
+            for_team=team,
+            assigned_to=request.user
+        ).select_related('created_by').order_by('-created_at')
 
-    tasks_data = [{
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "status": task.status,
-        "priority": task.priority,
-        "due_date": task.due_date,
-        "created_by": {
-            "id": task.created_by.id,
-            "username": task.created_by.username
-        },
-        "created_at": task.created_at,
-        "updated_at": task.updated_at
-    } for task in my_tasks]
+        return my_team_tasks_data(team, my_tasks)
 
-    return Response({
-        "team_id": team.id,
-        "team_name": team.name,
-        "tasks": tasks_data,
-        "count": len(tasks_data)
-    }, status=status.HTTP_200_OK)
+    return cached_team_response(request, team, "my-team-tasks", build)
 
 
 @api_view(['PATCH'])
@@ -504,7 +975,7 @@ def update_team_task_status(request, team_id, task_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if user is a member
-    if not TeamMembership.objects.filter(team=team, user=request.user).exists():  # pylint: disable=no-member
+    if not is_team_member(request.user, team, fresh=True):
         return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
 
     # Get the task
@@ -541,7 +1012,8 @@ def update_team_task_status(request, team_id, task_id):
     task.save()
 
     log_activity(
-        request.user, f"updated task status from '{old_status}' to '{new_status}'", task.id)
+        request.user, f"updated task status from '{old_status}' to '{new_status}'", task.id,
+        TASK_STATUS_CHANGED, task.for_team_id)
 
     return Response({
         "message": f"Task status updated to '{new_status}'",
@@ -559,7 +1031,7 @@ def get_team_member_tasks(request, team_id, user_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if requesting user is a member
-    if not TeamMembership.objects.filter(team=team, user=request.user).exists():  # pylint: disable=no-member
+    if not is_team_member(request.user, team):
         return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
 
     # Get the target user
@@ -569,41 +1041,31 @@ def get_team_member_tasks(request, team_id, user_id):
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if target user is a member of this team
-    if not TeamMembership.objects.filter(team=team, user=target_user).exists():  # pylint: disable=no-member
+    if not is_team_member(target_user, team):
         return Response({"error": "User is not a member of this team"}, status=status.HTTP_404_NOT_FOUND)
 
-    # Get tasks assigned to the target user
-    member_tasks = Task.objects.filter(  # pylint: disable=no-member
-        for_team=team,
-        assigned_to=target_user
-    ).select_related('created_by').order_by('-created_at')
-
-    tasks_data = [{
-        "id": task.id,
-        "title": task.title,
-        "description": task.description,
-        "status": task.status,
-        "priority": task.priority,
-        "due_date": task.due_date,
-        "created_by": {
-            "id": task.created_by.id,
-            "username": task.created_by.username
-        },
-        "created_at": task.created_at,
-        "updated_at": task.updated_at
-    } for task in member_tasks]
-
-    return Response({
-        "team_id": team.id,
-        "team_name": team.name,
-        "user": {
-            "id": target_user.id,
-            "username": target_user.username,
-            "email": target_user.email
-        },
-        "tasks": tasks_data,
-        "count": len(tasks_data)
-    }, status=status.HTTP_200_OK)
+    def build():
+        # Get tasks assigned to the target user
+        member_tasks = Task.objects.filter(  # pylint: disable=no-member
+            for_team=team,
+            assigned_to=target_user
+        ).select_related('created_by').order_by('-created_at')
+
+        tasks_data = [member_task_data(task) for task in member_tasks]
+        return {
+            "team_id": team.id,
+            "team_name": team.name,
+            "user": {
+                "id": target_user.id,
+                "username": target_user.username,
+                "email": target_user.email
+            },
+            "tasks": tasks_data,
+            "count": len(tasks_data)
+        }, latest_of(*(task["updated_at"] for task in tasks_data))
+
+    return cached_team_response(
+        request, team, "team-member-tasks", build, target_user.id)
 
 
 @api_view(['DELETE'])
@@ -616,7 +1078,7 @@ def delete_team_task(request, team_id, task_id):
         return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if requesting user is the owner
-    user_role = role_in_team(request.user, team)
+    user_role = role_in_team(request.user, team, fresh=True)
     if user_role != "owner":
         return Response(
             {"error": "Only team owners can delete tasks"},
@@ -635,8 +1097,158 @@ def delete_team_task(request, team_id, task_id):
     task_title = task.title
     task.delete()
 
-    log_activity(request.user, f"deleted team task '{task_title}'", task_id)
+    log_activity(request.user, f"deleted team task '{task_title}'", task_id,
+                 TASK_DELETED, team.id)
 
     return Response({
         "message": f"Task '{task_title}' deleted successfully"
     }, status=status.HTTP_200_OK)
+
+
+# -----------------------------
+# Live team events (Server-Sent Events)
+# -----------------------------
+# Plain async Django view rather than DRF: DRF views are synchronous, and a
+# stream held open in a sync worker would pin a thread per client. Needs an
+# ASGI server (see asgi.py); under WSGI the view refuses to stream. The
+# stream is opened with a one-time ticket (see events.py), never a token.
+
+def token_user(request):
+    """JWT user (Authorization: Bearer) of a plain (non-DRF) Django request, or None"""
+    header = request.headers.get("Authorization", "")
+    raw_token = header[7:] if header.startswith("Bearer ") else None
+    if not raw_token:
+        return None
+    authentication = ClaimsJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def team_events_ticket(request, team_id):
+    """One-time ticket that opens the team's event stream (?ticket=)"""
+    if not streaming_enabled():
+        return Response({"error": "Live events are not enabled"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        team = Team.objects.get(id=team_id)  # pylint: disable=no-member
+    except Team.DoesNotExist:  # pylint: disable=no-member
+        return Response({"error": "Team not found"}, status=status.HTTP_404_NOT_FOUND)
+    if not is_team_member(request.user, team):
+        return Response({"error": "You are not a member of this team"}, status=status.HTTP_403_FORBIDDEN)
+
+    ticket = issue_ticket(request.user.id, team.id)
+    config = getattr(settings, "EVENT_STREAM", {})
+    # the streams may be served by a separate ASGI server
+    base = config.get("STREAM_URL") or request.build_absolute_uri("/api/")
+    return Response({
+        "ticket": ticket,
+        "url": f"{base}teams/{team.id}/events/?{urlencode({'ticket': ticket})}",
+        "expires_in": config.get("TICKET_SECONDS", 30),
+    })
+
+
+async def team_events(request, team_id):
+    """Stream created / status_changed / assigned / deleted events of a team's tasks"""
+    if not isinstance(request, ASGIRequest):
+        # a WSGI worker would spend a thread on the stream for as long as
+        # the client stays connected
+        return JsonResponse({"error": "Live events are only served by the ASGI server"},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+    user_id = await sync_to_async(redeem_ticket)(request.GET.get("ticket", ""), team_id)
+    if user_id is None:
+        return JsonResponse({"error": "Invalid, expired or used stream ticket"},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    role = await sync_to_async(membership_cache.get_role)(team_id, user_id, True)
+    if not role:
+        return JsonResponse({"error": "You are not a member of this team"},
+                            status=status.HTTP_403_FORBIDDEN)
+
+    heartbeat = getattr(settings, "EVENT_STREAM", {}).get("HEARTBEAT_SECONDS", 15)
+
+    async def stream():
+        subscription = broker.subscribe(team_id)
+        try:
+            # reconnect delay for the browser's EventSource
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscription.get(heartbeat)
+                if event is None:
+                    # comment line: keeps proxies from timing out the connection
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_sse(event)
+                if event["type"] == OVERFLOW:
+                    # the client fell behind; it resyncs and reconnects with a new ticket
+                    return
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# -----------------------------
+# Metrics (Prometheus text format)
+# -----------------------------
+
+def process_metrics():
+    """Cache, activity log and event stream stats of this process"""
+    samples = []
+    for name, cache_stats in (("membership_cache", membership_cache.stats()),
+                              ("token_version_cache", auth.stats()),
+                              ("credentials_cache", auth.credentials_stats()),
+                              ("response_cache", response_cache.stats())):
+        samples.append((f"{name}_hits_total", f"{name} hits", "counter", cache_stats["hits"]))
+        samples.append((f"{name}_misses_total", f"{name} misses", "counter", cache_stats["misses"]))
+
+    writer = get_writer()
+    if writer is not None:
+        writer_stats = writer.stats()
+        for key in ("queued", "flushed", "dropped", "failed"):
+            samples.append((f"activity_log_{key}_total", f"Activity log entries {key}",
+                            "counter", writer_stats[key]))
+        samples.append(("activity_log_pending", "Activity log entries waiting",
+                        "gauge", writer_stats["pending"]))
+    for key, value in get_backend().stats().items():
+        if key.endswith("_total"):
+            samples.append((f"activity_log_store_{key}", f"Activity log store {key}",
+                            "counter", value))
+
+    event_stats = broker.stats()
+    samples.append(("team_events_published_total", "Team events published",
+                    "counter", event_stats["published"]))
+    samples.append(("team_events_overflowed_total", "Event subscribers dropped for falling behind",
+                    "counter", event_stats["overflowed"]))
+    samples.append(("team_events_subscribers", "Open event streams",
+                    "gauge", event_stats["subscribers"]))
+    return samples
+
+
+def store_metrics():
+    """Gauges of the activity log store, the same in every worker"""
+    return [(f"activity_log_store_{key}", f"Activity log store {key}", "gauge", value)
+            for key, value in get_backend().stats().items() if not key.endswith("_total")]
+
+
+registry.add_collector(process_metrics)
+registry.add_collector(store_metrics, shared=True)
+
+
+def metrics(request):
+    """Per-route request histograms plus cache, activity log and event stream stats"""
+    token = getattr(settings, "REQUEST_METRICS", {}).get("TOKEN")
+    if token:
+        header = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    elif not settings.DEBUG:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+    lines = registry.render()
+    return HttpResponse("\n".join(lines) + "\n",
+                        content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,78 @@
+# ============================================================================
+# GUNICORN CONFIGURATION (production serving profile)
+# ============================================================================
+# gunicorn -c gunicorn.conf.py TaskManagementSystem.wsgi
+#
+# Every value can be overridden from the environment. For the async views
+# and the live event stream (ASGI) use the uvicorn worker:
+#   GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \
+#       gunicorn -c gunicorn.conf.py TaskManagementSystem.asgi:application
+# The event broker is per process, so live events need GUNICORN_WORKERS=1
+# under ASGI.
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# CPU-bound Python plus short DB waits: (2 x cores) + 1 sync workers, each
+# with a few threads so a slow query does not idle a whole process
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# recycle workers after a bounded number of requests (jittered, so they do
+# not all restart at once) to cap slow memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# a worker silent for `timeout` seconds is killed; on restart/shutdown,
+# workers get `graceful_timeout` seconds to finish in-flight requests
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# importing the app in the master before forking boots faster and shares
+# memory between workers. It is safe: the MongoDB client (not fork-safe) is
+# only created on the first log read or write, inside a worker. Off by
+# default because a preloaded app is not re-imported when workers reload on
+# HUP; set GUNICORN_PRELOAD=1 to enable it
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # with preload_app, connections opened by the master must not be shared
+    # between forked workers; each worker opens its own. (The activity log
+    # writer thread starts lazily per process and is flushed by its atexit
+    # hook when the worker exits.)
+    from django.db import connections  # pylint: disable=import-outside-toplevel
+    connections.close_all()
+
+
+def on_starting(server):
+    # metric snapshots of a previous run would be counted as exited workers
+    # (see api/metrics.py); their pids may also be reused
+    metrics_dir = os.getenv("METRICS_MULTIPROCESS_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.startswith("metrics-"):
+                os.remove(os.path.join(metrics_dir, name))
+
+    # LocMemCache is private to each worker: with several workers a role
+    # cached by one is not invalidated by a write in another (see the CACHES
+    # notes in settings.py). Point the caches at Redis or Memcached.
+    if server.cfg.workers <= 1:
+        return
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "TaskManagementSystem.settings")
+    from django.conf import settings  # pylint: disable=import-outside-toplevel
+    local = sorted(alias for alias, config in settings.CACHES.items()
+                   if config["BACKEND"].endswith(".LocMemCache"))
+    if local:
+        server.log.warning(
+            "%d workers share no cache: %s use LocMemCache, so each worker keeps "
+            "its own entries and misses the others' invalidations",
+            server.cfg.workers, ", ".join(local))
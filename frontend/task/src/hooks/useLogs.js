@@ -5,8 +5,10 @@ export default function useLogs() {
   const [logs, setLogs] = useState([]);
   const [error, setError] = useState("");
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  const loadLogs = async () => {
+  // logs are paginated by cursor: pass the previous next_cursor to append the next page
+  const loadLogs = async (cursor = null) => {
     try {
       setLoading(true);
       const token = localStorage.getItem("access_token");
@@ -14,9 +16,12 @@ export default function useLogs() {
         headers: {
           Authorization: `Bearer ${token}`,
         },
+        params: cursor ? { cursor } : {},
       });
 
-      setLogs(response.data);
+      const { results, next_cursor } = response.data;
+      setLogs((previous) => (cursor ? [...previous, ...results] : results));
+      setNextCursor(next_cursor);
       console.log("Logs loaded:", response.data);
     } catch (error) {
       setError("Failed to load logs. Please try again.");
@@ -30,10 +35,18 @@ export default function useLogs() {
     loadLogs();
   }, []);
 
+  const loadMoreLogs = () => {
+    if (nextCursor) {
+      loadLogs(nextCursor);
+    }
+  };
+
   return {
     logs,
     error,
     loading,
     loadLogs,
+    loadMoreLogs,
+    hasMore: Boolean(nextCursor),
   };
 }
@@ -105,6 +105,66 @@ export default function useTeamDetails(teamId) {
         loadTeamDetails();
     }, [loadTeamDetails]);
 
+    // Live updates: reload when a team task changes instead of polling.
+    // EventSource cannot send headers, so each connection is opened with a
+    // one-time ticket; the ticket request answers 404 when the server does
+    // not stream events, and then no connection is made.
+    useEffect(() => {
+        const token = localStorage.getItem('access_token');
+        if (!token || typeof EventSource === 'undefined') {
+            return undefined;
+        }
+        let source = null;
+        let stopped = false;
+        let reloadTimer = null;
+        let reconnectTimer = null;
+        const scheduleReload = () => {
+            // coalesce bursts (e.g. bulk edits) into one reload
+            clearTimeout(reloadTimer);
+            reloadTimer = setTimeout(loadTeamDetails, 300);
+        };
+
+        const connect = async () => {
+            let streamUrl;
+            try {
+                const response = await api.post(`teams/${teamId}/events/ticket/`, null, {
+                    headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
+                });
+                // the server names the stream's URL: it may be another origin
+                streamUrl = response.data.url;
+            } catch (err) {
+                // live events not enabled (404) or not allowed: stay on manual reloads
+                return;
+            }
+            if (stopped) {
+                return;
+            }
+            source = new EventSource(streamUrl);
+            ['created', 'status_changed', 'assigned', 'deleted'].forEach((type) => {
+                source.addEventListener(type, scheduleReload);
+            });
+            // the server dropped us for falling behind: resync, then reconnect
+            source.addEventListener('overflow', scheduleReload);
+            // tickets are single-use, so EventSource's own reconnect would be
+            // refused: reconnect with a new ticket instead
+            source.onerror = () => {
+                source.close();
+                clearTimeout(reconnectTimer);
+                reconnectTimer = setTimeout(connect, 5000);
+            };
+        };
+        connect();
+
+        return () => {
+            stopped = true;
+            clearTimeout(reloadTimer);
+            clearTimeout(reconnectTimer);
+            if (source) {
+                source.close();
+            }
+        };
+    }, [teamId, loadTeamDetails]);
+
     return {
         teamData,
         loading,
@@ -38,13 +38,14 @@ export default function useTeamManagement() {
     }
   }, []);
 
-  // Fetch available users for a team
-  const fetchAvailableUsers = useCallback(async (teamId) => {
+  // Fetch available users for a team whose username or email starts with `query`
+  const fetchAvailableUsers = useCallback(async (teamId, query = '') => {
     try {
       setLoadingUsers(true);
       const token = localStorage.getItem('access_token');
       const response = await api.get(`teams/${teamId}/available-users/`, {
-        headers: { Authorization: `Bearer ${token}` }
+        headers: { Authorization: `Bearer ${token}` },
+        params: query ? { q: query } : {}
       });
       setAvailableUsers(response.data.available_users || []);
     } catch (error) {
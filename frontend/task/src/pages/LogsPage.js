@@ -1,5 +1,5 @@
 import React from "react";
-import { Box, CircularProgress, Container, Paper } from "@mui/material";
+import { Box, Button, CircularProgress, Container, Paper } from "@mui/material";
 import Header from "../component/Header";
 import useLogs from "../hooks/useLogs";
 import LogsPageHeader from "../component/logs/LogsPageHeader";
@@ -8,7 +8,7 @@ import EmptyLogsState from "../component/logs/EmptyLogsState";
 import LogsTable from "../component/logs/LogsTable";
 
 export default function LogsPage() {
-  const { logs, error, loading } = useLogs();
+  const { logs, error, loading, loadMoreLogs, hasMore } = useLogs();
 
   return (
     <Box className="min-h-screen bg-gradient-to-br from-gray-50 via-blue-50 to-indigo-50">
@@ -27,7 +27,7 @@ export default function LogsPage() {
 
           {/* Table Section */}
           <Box className="p-8">
-            {loading ? (
+            {loading && logs.length === 0 ? (
               <Box className="flex flex-col justify-center items-center py-20">
                 <CircularProgress size={70} thickness={4} className="mb-4" />
                 <p className="text-gray-600 text-lg font-semibold">Loading activity logs...</p>
@@ -35,7 +35,16 @@ export default function LogsPage() {
             ) : logs.length === 0 && !error ? (
               <EmptyLogsState />
             ) : (
-              <LogsTable logs={logs} />
+              <>
+                <LogsTable logs={logs} />
+                {hasMore && (
+                  <Box className="flex justify-center mt-6">
+                    <Button variant="outlined" onClick={loadMoreLogs} disabled={loading}>
+                      {loading ? "Loading..." : "Load more"}
+                    </Button>
+                  </Box>
+                )}
+              </>
             )}
           </Box>
         </Paper>
@@ -42,21 +42,28 @@ export default function TasksPage() {
     const[statusFilter, setStatusFilter] = useState("");
     const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
     const [taskToDelete, setTaskToDelete] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
     const navigate = useNavigate();
     
-    const loadTasks = async (status='') => {
+    // tasks come back one page at a time; pass the previous next_cursor to append
+    const loadTasks = async (status='', cursor=null) => {
     try {
       const token = localStorage.getItem("access_token");
 
-      const url= status ? `tasks/?status=${status}` : "tasks/";
+      const params = {};
+      if (status) params.status = status;
+      if (cursor) params.cursor = cursor;
 
-      const response = await api.get(url, {
+      const response = await api.get("tasks/", {
         headers: {
           Authorization: `Bearer ${token}`,
         },
+        params,
       });
 
-      setTasks(response.data);
+      const { results, next_cursor } = response.data;
+      setTasks((previous) => (cursor ? [...previous, ...results] : results));
+      setNextCursor(next_cursor);
     } catch (error) {
         setError("Failed to load tasks. Please try again.");
         console.log(error);
@@ -351,6 +358,13 @@ export default function TasksPage() {
             ))}
           </Grid>
         )}
+        {nextCursor && (
+          <Box sx={{ display: "flex", justifyContent: "center", mt: 4 }}>
+            <Button variant="outlined" onClick={() => loadTasks(statusFilter, nextCursor)}>
+              Load more
+            </Button>
+          </Box>
+        )}
       </Container>
 
       {/* Delete Confirmation Dialog */}
@@ -73,9 +73,17 @@ export default function TeamsManagementPage() {
     setSearchQuery('');
     setErrors({});
     setOpenAddMemberDialog(true);
-    fetchAvailableUsers(team.id);
   };
 
+  // Search candidates on the server as the user types (debounced)
+  useEffect(() => {
+    if (!openAddMemberDialog || !selectedTeam) return undefined;
+    const timer = setTimeout(() => {
+      fetchAvailableUsers(selectedTeam.id, searchQuery.trim());
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [openAddMemberDialog, selectedTeam, searchQuery, fetchAvailableUsers]);
+
   const handleCloseAddMemberDialog = () => {
     setOpenAddMemberDialog(false);
     setSelectedTeam(null);
@@ -103,13 +111,8 @@ export default function TeamsManagementPage() {
     navigate(`/teams/${teamId}/details`);
   };
 
-  // Filter users based on search query
-  const filteredUsers = availableUsers.filter(user =>
-    user.username.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    user.email.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    (user.first_name && user.first_name.toLowerCase().includes(searchQuery.toLowerCase())) ||
-    (user.last_name && user.last_name.toLowerCase().includes(searchQuery.toLowerCase()))
-  );
+  // The server already filters by the search prefix
+  const filteredUsers = availableUsers;
 
   if (loading) {
     return (